@@ -3,7 +3,7 @@ from django.contrib import admin
 
 from apps.common.admin import TimeStampedAdmin
 
-from .models import Appointment
+from .models import Appointment, AppointmentOutbox
 
 
 @admin.register(Appointment)
@@ -15,3 +15,13 @@ class AppointmentAdmin(TimeStampedAdmin):
     search_fields = ('title', 'customer__mobile', 'vendor__name')
     ordering = ('-start_time',)
     readonly_fields = TimeStampedAdmin.readonly_fields + ('status_updated_at',)
+
+
+@admin.register(AppointmentOutbox)
+class AppointmentOutboxAdmin(TimeStampedAdmin):
+    """Admin interface for pending and failed booking side effects."""
+
+    list_display = ('id', 'appointment', 'status', 'attempts', 'processed_at', 'created_at')
+    list_filter = ('status',)
+    raw_id_fields = ('appointment',)
+    readonly_fields = TimeStampedAdmin.readonly_fields + ('processed_at', 'last_error')
@@ -0,0 +1,243 @@
+"""Free-slot engine for vendor appointments.
+
+Free time is computed per vendor and local day as the working window minus
+the vendor's active appointments. Booked intervals come from one range query
+over the partial ``appointments_active_vendor`` index, ordered by start time,
+and are merged in a single sorted pass. Each vendor-day's free intervals are cached;
+booking, rescheduling and cancellation invalidate the days they touch.
+Slots are cut from the cached intervals on read, so any slot length is
+served from the same cache entries.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Appointment
+
+Interval = Tuple[datetime, datetime]
+
+FREE_INTERVALS_KEY = 'appointments:free:{vendor_id}:{day}'
+
+
+def _cache():
+    return caches[getattr(settings, 'APPOINTMENT_AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+def _cache_key(vendor_id: int, day: date) -> str:
+    return FREE_INTERVALS_KEY.format(vendor_id=vendor_id, day=day.isoformat())
+
+
+def _parse_time(value) -> time:
+    return value if isinstance(value, time) else time.fromisoformat(value)
+
+
+def slot_length(minutes: Optional[int] = None) -> timedelta:
+    """Return the slot length, defaulting to ``APPOINTMENT_SLOT_MINUTES``."""
+
+    return timedelta(minutes=minutes or getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30))
+
+
+def working_window(day: date) -> Optional[Interval]:
+    """Return the aware working window of a local day, or None on days off."""
+
+    if day.weekday() not in getattr(settings, 'APPOINTMENT_WORKING_WEEKDAYS', (5, 6, 0, 1, 2, 3)):
+        return None
+    opens = _parse_time(getattr(settings, 'APPOINTMENT_DAY_START', '09:00'))
+    closes = _parse_time(getattr(settings, 'APPOINTMENT_DAY_END', '17:00'))
+    return (
+        timezone.make_aware(datetime.combine(day, opens)),
+        timezone.make_aware(datetime.combine(day, closes)),
+    )
+
+
+def days_between(start: date, end: date) -> Iterator[date]:
+    """Yield every day in ``[start, end]``."""
+
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Merge start-sorted intervals in one pass."""
+
+    merged: List[List[datetime]] = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def subtract_intervals(window: Interval, busy: Sequence[Interval]) -> List[Interval]:
+    """Return the gaps of ``window`` not covered by merged, sorted ``busy``."""
+
+    window_start, window_end = window
+    ends = [end for _, end in busy]
+    free = []
+    cursor = window_start
+    for start, end in busy[bisect_right(ends, window_start):]:
+        if start >= window_end:
+            break
+        if start > cursor:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < window_end:
+        free.append((cursor, window_end))
+    return free
+
+
+def split_slots(
+    free: Iterable[Interval], grid_start: datetime, length: timedelta
+) -> Iterator[Interval]:
+    """Cut free intervals into ``length`` slots aligned to ``grid_start``."""
+
+    for start, end in free:
+        offset = (start - grid_start) % length
+        slot_start = start if not offset else start + (length - offset)
+        while slot_start + length <= end:
+            yield slot_start, slot_start + length
+            slot_start += length
+
+
+def booked_appointments(vendor_ids: Sequence[int], start: datetime, end: datetime):
+    """Return active appointments overlapping ``[start, end)``, ordered per vendor."""
+
+    return (
+        Appointment.objects.active()
+        .filter(vendor_id__in=vendor_ids, start_time__lt=end, end_time__gt=start)
+        .order_by('vendor_id', 'start_time')
+    )
+
+
+def _booked_intervals(
+    vendor_ids: Sequence[int], start: datetime, end: datetime
+) -> Dict[int, List[Interval]]:
+    """Return merged active appointments overlapping ``[start, end)`` per vendor."""
+
+    rows = booked_appointments(vendor_ids, start, end).values_list(
+        'vendor_id', 'start_time', 'end_time'
+    )
+    booked: Dict[int, List[Interval]] = {vendor_id: [] for vendor_id in vendor_ids}
+    for vendor_id, start_time, end_time in rows:
+        booked[vendor_id].append((timezone.localtime(start_time), timezone.localtime(end_time)))
+    return {vendor_id: merge_intervals(intervals) for vendor_id, intervals in booked.items()}
+
+
+def free_intervals(
+    vendor_ids: Sequence[int], days: Sequence[date]
+) -> Dict[Tuple[int, date], List[Interval]]:
+    """Return free intervals per (vendor, day), computing cache misses in one query."""
+
+    cache = _cache()
+    keys = {
+        _cache_key(vendor_id, day): (vendor_id, day) for vendor_id in vendor_ids for day in days
+    }
+    cached = cache.get_many(list(keys))
+    result = {keys[key]: value for key, value in cached.items()}
+
+    missing = [pair for key, pair in keys.items() if key not in cached]
+    if not missing:
+        return result
+
+    missing_days = sorted({day for _, day in missing})
+    windows = {day: working_window(day) for day in missing_days}
+    open_windows = [window for window in windows.values() if window]
+    booked = {}
+    if open_windows:
+        booked = _booked_intervals(
+            sorted({vendor_id for vendor_id, _ in missing}),
+            min(start for start, _ in open_windows),
+            max(end for _, end in open_windows),
+        )
+
+    computed = {}
+    for vendor_id, day in missing:
+        window = windows[day]
+        intervals = subtract_intervals(window, booked[vendor_id]) if window else []
+        result[(vendor_id, day)] = intervals
+        computed[_cache_key(vendor_id, day)] = intervals
+    cache.set_many(
+        computed, timeout=getattr(settings, 'APPOINTMENT_AVAILABILITY_CACHE_TTL', 60 * 60)
+    )
+    return result
+
+
+def free_slots(
+    vendor_id: int, start: date, end: date, slot_minutes: Optional[int] = None, now=None
+) -> List[Interval]:
+    """Return a vendor's free slots on the local days ``[start, end]``."""
+
+    now = now or timezone.now()
+    length = slot_length(slot_minutes)
+    days = list(days_between(start, end))
+    intervals = free_intervals([vendor_id], days)
+
+    slots = []
+    for day in days:
+        window = working_window(day)
+        if window:
+            slots.extend(
+                slot for slot in split_slots(intervals[(vendor_id, day)], window[0], length)
+                if slot[0] >= now
+            )
+    return slots
+
+
+def next_available_slots(
+    count: int,
+    vendor_ids: Optional[Sequence[int]] = None,
+    slot_minutes: Optional[int] = None,
+    now=None,
+    horizon_days: Optional[int] = None,
+) -> List[Dict]:
+    """Return the ``count`` earliest free slots across vendors.
+
+    Days are scanned in order and each day is one cache round trip for all
+    vendors, so the scan stops at the first days that fill the request.
+    """
+
+    from apps.vendors.models import Vendor
+
+    now = now or timezone.now()
+    length = slot_length(slot_minutes)
+    horizon_days = horizon_days or getattr(settings, 'APPOINTMENT_AVAILABILITY_HORIZON_DAYS', 30)
+    if vendor_ids is None:
+        vendor_ids = list(Vendor.objects.filter(is_active=True).values_list('id', flat=True))
+    if not vendor_ids:
+        return []
+
+    found: List[Dict] = []
+    first_day = timezone.localdate(now)
+    for day in days_between(first_day, first_day + timedelta(days=horizon_days - 1)):
+        window = working_window(day)
+        if not window:
+            continue
+        intervals = free_intervals(vendor_ids, [day])
+        day_slots = sorted(
+            (slot_start, vendor_id, slot_end)
+            for vendor_id in vendor_ids
+            for slot_start, slot_end in split_slots(intervals[(vendor_id, day)], window[0], length)
+            if slot_start >= now
+        )
+        for slot_start, vendor_id, slot_end in day_slots[:count - len(found)]:
+            found.append({'vendor_id': vendor_id, 'start_time': slot_start, 'end_time': slot_end})
+        if len(found) >= count:
+            break
+    return found
+
+
+def invalidate_vendor_availability(
+    vendor_id: int, start_time: datetime, end_time: datetime
+) -> None:
+    """Drop cached free intervals of every local day an interval touches."""
+
+    days = days_between(timezone.localdate(start_time), timezone.localdate(end_time))
+    _cache().delete_many([_cache_key(vendor_id, day) for day in days])
@@ -0,0 +1,12 @@
+"""Exceptions for appointments."""
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class AppointmentConflict(APIException):
+    """The vendor already has an active appointment overlapping the requested time."""
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('The vendor is already booked for this time.')
+    default_code = 'appointment_conflict'
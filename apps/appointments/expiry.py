@@ -0,0 +1,158 @@
+"""Chunked expiry of past appointments.
+
+Lapsed appointments are expired in bounded chunks, each in its own short
+transaction, so a large backlog (after downtime or an import) never locks
+every row at once. Active appointments are walked in ``(end_time, id)``
+keyset order, a range scan of the partial ``appointments_active_end`` index
+that only holds live rows. Where the database supports it, chunk rows are locked with ``SKIP
+LOCKED`` so expiry never waits on a booking being rescheduled.
+
+The position of a run is kept in the cache. A run that hits its time budget
+stops and the next run resumes from the saved position instead of scanning
+the already expired range again; a run that reaches the end clears it.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Appointment
+
+logger = logging.getLogger(__name__)
+
+# v2: (end_time, id); v1 cursors also carried the status
+CURSOR_KEY = 'appointments:expiry:cursor:v2'
+
+Cursor = Tuple[str, int]
+
+
+@dataclass
+class ExpiryStats:
+    """Counters and timings of one expiry run."""
+
+    expired: int = 0
+    chunk_sizes: List[int] = field(default_factory=list)
+    elapsed: float = 0.0
+    resumed: bool = False
+    finished: bool = False
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.expired / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'expired': self.expired,
+            'chunks': len(self.chunk_sizes),
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'resumed': self.resumed,
+            'finished': self.finished,
+        }
+
+
+def _cache():
+    return caches[getattr(settings, 'APPOINTMENT_EXPIRY_CACHE_ALIAS', 'default')]
+
+
+def load_cursor() -> Optional[Cursor]:
+    """Return the saved ``(end_time, id)`` position, if any."""
+
+    cursor = _cache().get(CURSOR_KEY)
+    if not cursor or len(cursor) != 2:
+        return None
+    return tuple(cursor)
+
+
+def save_cursor(cursor: Cursor) -> None:
+    _cache().set(CURSOR_KEY, list(cursor), timeout=None)
+
+
+def clear_cursor() -> None:
+    _cache().delete(CURSOR_KEY)
+
+
+def lapsed_appointments(reference_time, after=None):
+    """Return lapsed active appointments after an ``(end_time, id)`` position, in keyset order."""
+
+    queryset = Appointment.objects.expired(reference_time)
+    if after:
+        end_time, pk = after
+        queryset = queryset.filter(Q(end_time__gt=end_time) | Q(end_time=end_time, pk__gt=pk))
+    return queryset.order_by('end_time', 'pk')
+
+
+def expire_chunk(reference_time, chunk_size: int, after=None) -> Tuple[List[Tuple], int]:
+    """Expire up to ``chunk_size`` lapsed active appointments.
+
+    ``after`` is an ``(end_time, id)`` keyset position; rows at or before it
+    are skipped. Returns the ``(end_time, id)`` of the rows looked at, in
+    keyset order, and how many of them were expired.
+    """
+
+    queryset = lapsed_appointments(reference_time, after)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        rows = list(queryset.values_list('end_time', 'pk')[:chunk_size])
+        if not rows:
+            return rows, 0
+        updated = Appointment.objects.active().filter(pk__in=[pk for _, pk in rows]).update(
+            status=Appointment.Status.EXPIRED,
+            status_updated_at=reference_time,
+        )
+    return rows, updated
+
+
+def expire_appointments(
+    reference_time=None,
+    chunk_size: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+) -> ExpiryStats:
+    """Expire lapsed active appointments chunk by chunk, resuming a saved run.
+
+    Stops after ``max_seconds`` (``APPOINTMENT_EXPIRY_MAX_SECONDS``) and saves
+    its position so the next run carries on from there.
+    """
+
+    reference_time = reference_time or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'APPOINTMENT_EXPIRY_CHUNK_SIZE', 1000)
+    if max_seconds is None:
+        max_seconds = getattr(settings, 'APPOINTMENT_EXPIRY_MAX_SECONDS', 60)
+
+    stats = ExpiryStats()
+    started = time.monotonic()
+
+    after = None
+    cursor = load_cursor()
+    if cursor:
+        stats.resumed = True
+        after = (parse_datetime(cursor[0]), cursor[1])
+
+    while True:
+        rows, updated = expire_chunk(reference_time, chunk_size, after)
+        if not rows:
+            break
+
+        stats.chunk_sizes.append(updated)
+        stats.expired += updated
+        after = rows[-1]
+        save_cursor((after[0].isoformat(), after[1]))
+
+        if len(rows) < chunk_size:
+            break
+        if time.monotonic() - started >= max_seconds:
+            stats.elapsed = time.monotonic() - started
+            return stats
+
+    clear_cursor()
+    stats.finished = True
+    stats.elapsed = time.monotonic() - started
+    return stats
@@ -0,0 +1,95 @@
+"""Exclusion constraint preventing overlapping active appointments per vendor.
+
+PostgreSQL only: other databases take the per-vendor locking path in
+``apps.appointments.services``.
+
+Deploy prerequisite: the ``btree_gist`` extension. ``BtreeGistExtension``
+skips creating it when it is already installed, so on managed PostgreSQL
+where the migration role may not create extensions, run
+``CREATE EXTENSION btree_gist;`` as an administrator first.
+
+Active appointments that already overlap are resolved before the constraint
+is added: per vendor, the earliest-starting appointment keeps its time and
+the ones overlapping it are cancelled and logged.
+"""
+import logging
+
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+from django.utils import timezone
+
+logger = logging.getLogger('apps.appointments')
+
+CONSTRAINT_NAME = 'appointments_vendor_no_overlap'
+ACTIVE_STATUSES = ('scheduled', 'in_progress')
+
+CREATE_SQL = f"""
+ALTER TABLE appointments ADD CONSTRAINT {CONSTRAINT_NAME}
+    EXCLUDE USING gist (
+        vendor_id WITH =,
+        tstzrange(start_time, end_time, '[)') WITH &&
+    )
+    WHERE (status IN ('scheduled', 'in_progress'));
+"""
+
+DROP_SQL = f'ALTER TABLE appointments DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME};'
+
+
+def overlapping_ids(rows):
+    """Return ids to cancel from ``(id, vendor_id, start, end)`` rows sorted by vendor and start."""
+    overlapping = []
+    vendor_id = busy_until = None
+    for pk, row_vendor_id, start_time, end_time in rows:
+        if row_vendor_id != vendor_id:
+            vendor_id, busy_until = row_vendor_id, None
+        if busy_until is not None and start_time < busy_until:
+            overlapping.append(pk)
+        else:
+            busy_until = end_time
+    return overlapping
+
+
+def cancel_overlapping(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Appointment = apps.get_model('appointments', 'Appointment')
+    rows = (
+        Appointment.objects.filter(status__in=ACTIVE_STATUSES)
+        .order_by('vendor_id', 'start_time', 'id')
+        .values_list('id', 'vendor_id', 'start_time', 'end_time')
+    )
+    overlapping = overlapping_ids(rows.iterator())
+    if overlapping:
+        logger.warning(
+            'Cancelling %s overlapping appointment(s) before adding %s: %s',
+            len(overlapping), CONSTRAINT_NAME, overlapping,
+        )
+        for offset in range(0, len(overlapping), 1000):
+            Appointment.objects.filter(pk__in=overlapping[offset:offset + 1000]).update(
+                status='cancelled',
+                status_updated_at=timezone.now(),
+            )
+
+
+def add_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def remove_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0002_initial"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(cancel_overlapping, migrations.RunPython.noop),
+        migrations.RunPython(add_constraint, remove_constraint),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0003_appointment_no_overlap"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppointmentOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="Updated at")),
+                ("intents", models.JSONField(default=list, verbose_name="Intents")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Pending"), ("done", "Done"), ("failed", "Failed")],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")),
+                ("last_error", models.TextField(blank=True, verbose_name="Last error")),
+                (
+                    "processed_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Processed at"),
+                ),
+                (
+                    "appointment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbox_entries",
+                        to="appointments.appointment",
+                        verbose_name="Appointment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Appointment outbox entry",
+                "verbose_name_plural": "Appointment outbox entries",
+                "db_table": "appointment_outbox",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(fields=["status", "id"], name="appointment_outbox_status")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0004_appointment_outbox"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="appointment",
+            name="appointments_status_end",
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["scheduled", "in_progress"])),
+                fields=["end_time"],
+                name="appointments_active_end",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["scheduled", "in_progress"])),
+                fields=["vendor", "start_time"],
+                name="appointments_active_vendor",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0005_appointment_active_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointmentoutbox",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Next attempt at"),
+        ),
+    ]
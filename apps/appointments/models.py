@@ -11,13 +11,13 @@ class AppointmentQuerySet(models.QuerySet):
     """Custom queryset helpers for appointments."""
 
     def active(self):
-        """Return appointments that are not completed, cancelled, or expired."""
+        """Return appointments that are scheduled or in progress.
 
-        return self.exclude(status__in=[
-            self.model.Status.COMPLETED,
-            self.model.Status.CANCELLED,
-            self.model.Status.EXPIRED,
-        ])
+        Written as a positive filter so it matches the partial indexes on
+        live appointments.
+        """
+
+        return self.filter(status__in=self.model.ACTIVE_STATUSES)
 
     def expired(self, reference_time=None):
         """Return active appointments whose end time has passed."""
@@ -36,6 +36,9 @@ class Appointment(TimeStampedModel):
         CANCELLED = 'cancelled', _('Cancelled')
         EXPIRED = 'expired', _('Expired')
 
+    ACTIVE_STATUSES = (Status.SCHEDULED, Status.IN_PROGRESS)
+    INACTIVE_STATUSES = (Status.COMPLETED, Status.CANCELLED, Status.EXPIRED)
+
     customer = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -68,8 +71,18 @@ class Appointment(TimeStampedModel):
         db_table = 'appointments'
         ordering = ['-start_time']
         indexes = [
-            models.Index(fields=['status', 'end_time'], name='appointments_status_end'),
             models.Index(fields=['vendor', 'start_time'], name='appointments_vendor_start'),
+            # Partial indexes over ACTIVE_STATUSES, matched by active()
+            models.Index(
+                fields=['end_time'],
+                name='appointments_active_end',
+                condition=models.Q(status__in=['scheduled', 'in_progress']),
+            ),
+            models.Index(
+                fields=['vendor', 'start_time'],
+                name='appointments_active_vendor',
+                condition=models.Q(status__in=['scheduled', 'in_progress']),
+            ),
         ]
 
     def __str__(self):
@@ -79,7 +92,56 @@ class Appointment(TimeStampedModel):
         """Mark the appointment as expired if its end time has passed."""
 
         reference_time = reference_time or timezone.now()
-        if self.status not in {self.Status.CANCELLED, self.Status.COMPLETED, self.Status.EXPIRED} and self.end_time < reference_time:
+        finished = {self.Status.CANCELLED, self.Status.COMPLETED, self.Status.EXPIRED}
+        if self.status not in finished and self.end_time < reference_time:
             self.status = self.Status.EXPIRED
             self.save(update_fields=['status', 'status_updated_at'])
         return self
+
+
+class AppointmentOutbox(TimeStampedModel):
+    """Side effects of a booking, recorded in the booking transaction.
+
+    ``intents`` lists what has to happen after commit (notifications, a
+    delivery order); :mod:`apps.appointments.outbox` carries them out in
+    batches from a Celery task.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    class Intent(models.TextChoices):
+        NOTIFY_BOOKED = 'notify_booked', _('Notify customer and vendor')
+        SCHEDULE_DELIVERY = 'schedule_delivery', _('Schedule delivery')
+
+    appointment = models.ForeignKey(
+        Appointment,
+        on_delete=models.CASCADE,
+        related_name='outbox_entries',
+        verbose_name=_('Appointment'),
+    )
+    intents = models.JSONField(_('Intents'), default=list)
+    status = models.CharField(
+        _('Status'),
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(_('Attempts'), default=0)
+    last_error = models.TextField(_('Last error'), blank=True)
+    next_attempt_at = models.DateTimeField(_('Next attempt at'), null=True, blank=True)
+    processed_at = models.DateTimeField(_('Processed at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Appointment outbox entry')
+        verbose_name_plural = _('Appointment outbox entries')
+        db_table = 'appointment_outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='appointment_outbox_status'),
+        ]
+
+    def __str__(self):
+        return f"Outbox #{self.pk} for appointment {self.appointment_id} ({self.status})"
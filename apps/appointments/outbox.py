@@ -0,0 +1,177 @@
+"""Outbox for booking side effects.
+
+The booking transaction only records an :class:`AppointmentOutbox` row
+listing its intents. Once the booking commits, ``transaction.on_commit``
+queues :func:`~apps.appointments.tasks.dispatch_appointment_outbox`, which
+claims pending rows in batches and carries out all their intents with one
+batched insert per kind. Because a batch's side effects and the status change
+commit together, an entry is applied at most once even if the task runs
+twice. A beat schedule sweeps entries whose dispatch was lost, for example
+while the broker was down. A failed entry waits ``APPOINTMENT_OUTBOX_RETRY_DELAY``
+seconds, doubled per attempt, before it is claimed again.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.delivery.services import schedule_deliveries
+from apps.notifications.models import Notification
+from apps.notifications.services import send_notifications
+
+from .models import Appointment, AppointmentOutbox
+
+logger = logging.getLogger(__name__)
+
+Intent = AppointmentOutbox.Intent
+
+
+def record_booking_intents(
+    appointment: Appointment, delivery_address: Optional[str] = None
+) -> AppointmentOutbox:
+    """Record a booking's side effects and dispatch them after commit."""
+
+    intents: List[Dict] = [{'kind': Intent.NOTIFY_BOOKED}]
+    if delivery_address:
+        intents.append({
+            'kind': Intent.SCHEDULE_DELIVERY,
+            'address': delivery_address,
+            'scheduled_for': appointment.end_time.isoformat(),
+        })
+
+    entry = AppointmentOutbox.objects.create(appointment=appointment, intents=intents)
+    transaction.on_commit(_queue_dispatch)
+    return entry
+
+
+def _queue_dispatch() -> None:
+    from .tasks import dispatch_appointment_outbox
+
+    try:
+        dispatch_appointment_outbox.delay()
+    except Exception as exc:  # pragma: no cover - broker outage
+        # The booking is committed; the beat sweep picks the entry up later
+        logger.warning('Could not queue appointment outbox dispatch: %s', exc)
+
+
+def _claim(batch_size: int) -> List[AppointmentOutbox]:
+    queryset = AppointmentOutbox.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()),
+        status=AppointmentOutbox.Status.PENDING,
+    ).order_by('id')
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True, of=('self',))
+    queryset = queryset.select_related('appointment__customer', 'appointment__vendor__user')
+    return list(queryset[:batch_size])
+
+
+def _apply(entries: List[AppointmentOutbox]) -> None:
+    notifications, deliveries = [], []
+    for entry in entries:
+        appointment = entry.appointment
+        for intent in entry.intents:
+            if intent['kind'] == Intent.NOTIFY_BOOKED:
+                notifications.append({
+                    'recipient_id': appointment.customer_id,
+                    'title': 'Appointment scheduled',
+                    'message': (
+                        f'Your appointment "{appointment.title}" with '
+                        f'{appointment.vendor.name} is scheduled.'
+                    ),
+                    'notification_type': Notification.NotificationType.APPOINTMENT,
+                })
+                notifications.append({
+                    'recipient_id': appointment.vendor.user_id,
+                    'title': 'New appointment booked',
+                    'message': f'{appointment.customer.mobile} booked "{appointment.title}".',
+                    'notification_type': Notification.NotificationType.APPOINTMENT,
+                })
+            elif intent['kind'] == Intent.SCHEDULE_DELIVERY:
+                deliveries.append({
+                    'appointment_id': appointment.pk,
+                    'address': intent['address'],
+                    'scheduled_for': parse_datetime(intent['scheduled_for']),
+                })
+            else:
+                raise ValueError(f"Unknown outbox intent: {intent['kind']}")
+
+    send_notifications(notifications)
+    schedule_deliveries(deliveries)
+
+
+def _record_failure(entry: AppointmentOutbox, exc: Exception) -> None:
+    max_attempts = getattr(settings, 'APPOINTMENT_OUTBOX_MAX_ATTEMPTS', 5)
+    retry_delay = getattr(settings, 'APPOINTMENT_OUTBOX_RETRY_DELAY', 60)
+    entry.attempts += 1
+    entry.last_error = str(exc)
+    if entry.attempts >= max_attempts:
+        entry.status = AppointmentOutbox.Status.FAILED
+    else:
+        # Back off so later batches of this run and the next sweeps skip it
+        delay = retry_delay * 2 ** (entry.attempts - 1)
+        entry.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'updated_at'])
+
+
+def _mark_done(entries: List[AppointmentOutbox]) -> None:
+    now = timezone.now()
+    AppointmentOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+        status=AppointmentOutbox.Status.DONE,
+        attempts=F('attempts') + 1,
+        processed_at=now,
+        updated_at=now,
+    )
+
+
+def dispatch_batch(batch_size: Optional[int] = None) -> int:
+    """Apply one batch of pending entries; return how many were applied.
+
+    A failing batch is retried entry by entry so one bad entry cannot hold
+    back the others. A failing entry is not claimed again until its backoff
+    has passed, so the following batches dispatch in bulk; it is retried by
+    later runs until ``APPOINTMENT_OUTBOX_MAX_ATTEMPTS``.
+    """
+
+    batch_size = batch_size or getattr(settings, 'APPOINTMENT_OUTBOX_BATCH_SIZE', 200)
+    with transaction.atomic():
+        entries = _claim(batch_size)
+        if not entries:
+            return 0
+        try:
+            with transaction.atomic():
+                _apply(entries)
+                _mark_done(entries)
+            return len(entries)
+        except Exception as exc:
+            logger.warning(
+                'Appointment outbox batch failed, retrying entries one by one: %s', exc
+            )
+
+        applied = 0
+        for entry in entries:
+            try:
+                with transaction.atomic():
+                    _apply([entry])
+                    _mark_done([entry])
+                applied += 1
+            except Exception as exc:
+                logger.exception('Appointment outbox entry %s failed: %s', entry.pk, exc)
+                _record_failure(entry, exc)
+    return applied
+
+
+def dispatch_pending(batch_size: Optional[int] = None, max_batches: int = 50) -> int:
+    """Drain pending entries batch by batch; return how many were applied."""
+
+    applied = 0
+    for _ in range(max_batches):
+        count = dispatch_batch(batch_size)
+        applied += count
+        if not count:
+            break
+    return applied
@@ -57,3 +57,37 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if attrs['end_time'] <= attrs['start_time']:
             raise serializers.ValidationError(error_msg)
         return super().validate(attrs)
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """Query parameters for a vendor's free slots."""
+
+    vendor = serializers.IntegerField(min_value=1)
+    start = serializers.DateField()
+    end = serializers.DateField(required=False)
+    slot_minutes = serializers.IntegerField(required=False, min_value=5, max_value=480)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', attrs['start'])
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError('End date must not be before start date.')
+        if (attrs['end'] - attrs['start']).days >= 31:
+            raise serializers.ValidationError('Date range must not exceed 31 days.')
+        return attrs
+
+
+class NextSlotsQuerySerializer(serializers.Serializer):
+    """Query parameters for the earliest free slots across vendors."""
+
+    count = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+    vendor = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    vendor_type = serializers.CharField(required=False)
+    slot_minutes = serializers.IntegerField(required=False, min_value=5, max_value=480)
+
+
+class SlotSerializer(serializers.Serializer):
+    """A free appointment slot."""
+
+    vendor = serializers.IntegerField(source='vendor_id')
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
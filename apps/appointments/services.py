@@ -1,46 +1,143 @@
-"""Service layer for appointment scheduling."""
-from typing import Optional
+"""Service layer for appointment scheduling.
 
-from django.db import transaction
+Overlapping active appointments of one vendor are rejected by the database.
+On PostgreSQL the ``appointments_vendor_no_overlap`` exclusion constraint
+(migration 0003) checks every insert and update without any application
+lock, so bookings for different vendors, or for free time of the same vendor,
+never wait on each other. Other databases lock the vendor row and check for
+overlaps inside the booking transaction; on SQLite that lock is the database
+write lock, which already serializes writers.
+"""
+from contextlib import contextmanager
+from typing import Optional
 
-from apps.delivery.services import schedule_delivery
-from apps.notifications.services import send_notification
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
 
+from .availability import invalidate_vendor_availability
+from .exceptions import AppointmentConflict
 from .models import Appointment
+from .outbox import record_booking_intents
+
+OVERLAP_CONSTRAINT = 'appointments_vendor_no_overlap'
+EXCLUSION_VIOLATION = '23P01'
 
 
 @transaction.atomic
-def schedule_appointment(*, customer, vendor, title: str, start_time, end_time, notes: str = '', delivery_address: Optional[str] = None) -> Appointment:
-    """Create an appointment and trigger the associated side effects."""
-
-    appointment = Appointment.objects.create(
-        customer=customer,
-        vendor=vendor,
-        title=title,
-        start_time=start_time,
-        end_time=end_time,
-        notes=notes,
-    )
+def schedule_appointment(
+    *,
+    customer,
+    vendor,
+    title: str,
+    start_time,
+    end_time,
+    notes: str = '',
+    delivery_address: Optional[str] = None,
+) -> Appointment:
+    """Create an appointment and record its side effects.
 
-    send_notification(
-        recipient=customer,
-        title='Appointment scheduled',
-        message=f'Your appointment "{title}" with {vendor.name} is scheduled.',
-        notification_type='appointment',
-    )
-    send_notification(
-        recipient=vendor.user,
-        title='New appointment booked',
-        message=f'{customer.mobile} booked "{title}".',
-        notification_type='appointment',
-    )
+    Notifications and the delivery order are created by the outbox dispatcher
+    after the booking commits (see :mod:`apps.appointments.outbox`).
+
+    Raises:
+        AppointmentConflict: If the vendor is already booked for the time.
+    """
 
-    if delivery_address:
-        schedule_delivery(
-            appointment=appointment,
-            address=delivery_address,
-            scheduled_for=end_time,
+    guard_vendor_overlap(vendor.pk, start_time, end_time)
+    with translate_overlap_violation():
+        appointment = Appointment.objects.create(
+            customer=customer,
+            vendor=vendor,
+            title=title,
+            start_time=start_time,
+            end_time=end_time,
+            notes=notes,
         )
+    record_booking_intents(appointment, delivery_address=delivery_address)
+    invalidate_availability_on_commit(appointment)
+    return appointment
+
+
+def invalidate_availability_on_commit(appointment: Appointment, previous_interval=None) -> None:
+    """Drop cached free slots for the appointment's days once the change commits."""
+
+    intervals = [(appointment.start_time, appointment.end_time)]
+    if previous_interval:
+        intervals.append(previous_interval)
+
+    def invalidate():
+        for start_time, end_time in intervals:
+            invalidate_vendor_availability(appointment.vendor_id, start_time, end_time)
+
+    transaction.on_commit(invalidate)
+
+
+@transaction.atomic
+def cancel_appointment(appointment: Appointment) -> Appointment:
+    """Cancel an active appointment and free its time."""
+
+    if appointment.status in Appointment.INACTIVE_STATUSES:
+        return appointment
 
-    appointment.refresh_from_db()
+    appointment.status = Appointment.Status.CANCELLED
+    appointment.save(update_fields=['status', 'status_updated_at', 'updated_at'])
+    invalidate_availability_on_commit(appointment)
     return appointment
+
+
+def enforces_overlap_in_database() -> bool:
+    """Return whether the exclusion constraint guards this database."""
+
+    return connection.vendor == 'postgresql'
+
+
+def guard_vendor_overlap(
+    vendor_id: int, start_time, end_time, exclude_id: Optional[int] = None
+) -> None:
+    """Serialize bookings of a vendor and reject overlaps where no constraint exists.
+
+    Must run inside the transaction that writes the appointment.
+    """
+
+    if enforces_overlap_in_database():
+        return
+
+    from apps.vendors.models import Vendor
+
+    if connection.vendor == 'sqlite':
+        # A write takes SQLite's database lock up front, so the check below
+        # cannot interleave with another booking
+        Vendor.objects.filter(pk=vendor_id).update(is_active=F('is_active'))
+    else:
+        list(Vendor.objects.select_for_update().filter(pk=vendor_id).values_list('pk', flat=True))
+
+    overlapping = Appointment.objects.active().filter(
+        vendor_id=vendor_id,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+    )
+    if exclude_id is not None:
+        overlapping = overlapping.exclude(pk=exclude_id)
+    if overlapping.exists():
+        raise AppointmentConflict()
+
+
+def is_overlap_violation(exc: IntegrityError) -> bool:
+    """Return whether an IntegrityError comes from the overlap constraint."""
+
+    cause = exc.__cause__
+    if getattr(cause, 'pgcode', None) == EXCLUSION_VIOLATION:
+        return True
+    return OVERLAP_CONSTRAINT in str(exc)
+
+
+@contextmanager
+def translate_overlap_violation():
+    """Turn overlap constraint violations into AppointmentConflict."""
+
+    try:
+        yield
+    except IntegrityError as exc:
+        if is_overlap_violation(exc):
+            raise AppointmentConflict() from exc
+        raise
@@ -4,37 +4,37 @@ from datetime import datetime
 from typing import Optional
 
 from celery import shared_task
-from django.apps import apps
-from django.db import transaction
-from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
 
 def mark_expired_appointments(reference_time: Optional[datetime] = None) -> int:
-    """Mark appointments whose end time has passed as expired."""
+    """Mark appointments whose end time has passed as expired.
 
-    Appointment = apps.get_model('appointments', 'Appointment')
-    reference_time = reference_time or timezone.now()
-    expired_qs = Appointment.objects.active().expired(reference_time)
+    Expires in bounded chunks (see :mod:`apps.appointments.expiry`); a run
+    that hits its time budget is resumed by the next one.
+    """
 
-    if not expired_qs.exists():
-        return 0
+    from .expiry import expire_appointments
 
-    with transaction.atomic():
-        updated = expired_qs.update(
-            status=Appointment.Status.EXPIRED,
-            status_updated_at=reference_time,
+    stats = expire_appointments(reference_time)
+    if stats.expired:
+        logger.info(
+            'Marked %s appointment(s) as expired in %s chunk(s), %.1f rows/s%s.',
+            stats.expired,
+            len(stats.chunk_sizes),
+            stats.rows_per_second,
+            '' if stats.finished else ', resuming next run',
         )
-    return updated
+    return stats.expired
 
 
 @shared_task(bind=True, ignore_result=False)
 def cleanup_expired_appointments(self):
     """Cleanup expired appointments.
 
-    This task runs daily via Celery Beat to ensure old appointments are marked
-    as expired. It logs the outcome so operators can monitor the cleanup.
+    This task runs every few minutes via Celery Beat so expiry keeps up in
+    small batches. It logs the outcome so operators can monitor the cleanup.
     """
 
     try:
@@ -43,8 +43,22 @@ def cleanup_expired_appointments(self):
         logger.exception('Failed to cleanup expired appointments: %s', exc)
         raise
 
-    if updated:
-        logger.info('Marked %s appointment(s) as expired.', updated)
-    else:
+    if not updated:
         logger.info('No expired appointments found during cleanup.')
     return updated
+
+
+@shared_task(bind=True, ignore_result=False)
+def dispatch_appointment_outbox(self):
+    """Carry out pending booking side effects in batches.
+
+    Queued after every booking commits and run by Celery Beat as a sweep for
+    entries whose dispatch was lost.
+    """
+
+    from .outbox import dispatch_pending
+
+    applied = dispatch_pending()
+    if applied:
+        logger.info('Dispatched %s appointment outbox entries.', applied)
+    return applied
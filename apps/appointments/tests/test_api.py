@@ -41,3 +41,24 @@ def test_vendor_sees_their_appointments(api_client, appointment_factory, vendor_
     payload = response.data
     assert payload['count'] == 1
     assert payload['results'][0]['vendor'] == vendor.id
+
+
+@pytest.mark.django_db
+def test_double_booking_returns_conflict(api_client, user_factory, vendor_factory):
+    vendor = vendor_factory()
+    start = timezone.now() + timedelta(days=2)
+    payload = {
+        'vendor': vendor.id,
+        'title': 'Dental checkup',
+        'start_time': start.isoformat(),
+        'end_time': (start + timedelta(hours=1)).isoformat(),
+    }
+    url = reverse('appointment-list')
+
+    api_client.force_authenticate(user=user_factory())
+    assert api_client.post(url, payload, format='json').status_code == 201
+
+    api_client.force_authenticate(user=user_factory())
+    response = api_client.post(url, payload, format='json')
+    assert response.status_code == 409
+    assert response.data['error']['status_code'] == 409
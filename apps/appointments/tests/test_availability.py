@@ -0,0 +1,147 @@
+"""Availability and free-slot tests for appointments."""
+from datetime import date, datetime, timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.reverse import reverse
+
+from apps.appointments.availability import (
+    free_slots,
+    merge_intervals,
+    next_available_slots,
+    subtract_intervals,
+)
+from apps.appointments.models import Appointment
+from apps.appointments.services import cancel_appointment, schedule_appointment
+
+SATURDAY = date(2030, 1, 5)
+FRIDAY = date(2030, 1, 4)
+BEFORE = timezone.make_aware(datetime(2030, 1, 1))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime(day.year, day.month, day.day, hour, minute))
+
+
+def test_merge_and_subtract_intervals():
+    busy = merge_intervals([
+        (at(SATURDAY, 9), at(SATURDAY, 10)),
+        (at(SATURDAY, 9, 30), at(SATURDAY, 11)),
+        (at(SATURDAY, 11), at(SATURDAY, 12)),
+        (at(SATURDAY, 14), at(SATURDAY, 15)),
+    ])
+
+    assert busy == [(at(SATURDAY, 9), at(SATURDAY, 12)), (at(SATURDAY, 14), at(SATURDAY, 15))]
+    assert subtract_intervals((at(SATURDAY, 9), at(SATURDAY, 17)), busy) == [
+        (at(SATURDAY, 12), at(SATURDAY, 14)),
+        (at(SATURDAY, 15), at(SATURDAY, 17)),
+    ]
+
+
+@pytest.mark.django_db
+def test_free_slots_skip_booked_and_days_off(appointment_factory, vendor_factory):
+    vendor = vendor_factory()
+    appointment_factory(
+        vendor=vendor, start_time=at(SATURDAY, 9, 45), end_time=at(SATURDAY, 10, 15)
+    )
+    appointment_factory(
+        vendor=vendor,
+        start_time=at(SATURDAY, 13),
+        end_time=at(SATURDAY, 14),
+        status=Appointment.Status.CANCELLED,
+    )
+
+    slots = free_slots(vendor.id, FRIDAY, SATURDAY, slot_minutes=60, now=BEFORE)
+
+    assert [start.hour for start, _ in slots] == [11, 12, 13, 14, 15, 16]
+    assert slots[0] == (at(SATURDAY, 11), at(SATURDAY, 12))
+
+
+@pytest.mark.django_db
+def test_free_slots_served_from_cache_and_invalidated(
+    user_factory, vendor_factory, django_capture_on_commit_callbacks
+):
+    vendor = vendor_factory()
+    free_slots(vendor.id, SATURDAY, SATURDAY, now=BEFORE)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert len(free_slots(vendor.id, SATURDAY, SATURDAY, now=BEFORE)) == 16
+    assert len(queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        appointment = schedule_appointment(
+            customer=user_factory(),
+            vendor=vendor,
+            title='Checkup',
+            start_time=at(SATURDAY, 9),
+            end_time=at(SATURDAY, 10),
+        )
+    assert len(free_slots(vendor.id, SATURDAY, SATURDAY, now=BEFORE)) == 14
+
+    with django_capture_on_commit_callbacks(execute=True):
+        cancel_appointment(appointment)
+    assert len(free_slots(vendor.id, SATURDAY, SATURDAY, now=BEFORE)) == 16
+
+
+def test_deleted_appointment_frees_slot(
+    api_client, appointment_factory, vendor_factory, django_capture_on_commit_callbacks
+):
+    vendor = vendor_factory()
+    appointment = appointment_factory(
+        vendor=vendor, start_time=at(SATURDAY, 9), end_time=at(SATURDAY, 10)
+    )
+    assert len(free_slots(vendor.id, SATURDAY, SATURDAY, now=BEFORE)) == 14
+    api_client.force_authenticate(user=appointment.customer)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.delete(reverse('appointment-detail', args=[appointment.pk]))
+
+    assert response.status_code == 204
+    assert len(free_slots(vendor.id, SATURDAY, SATURDAY, now=BEFORE)) == 16
+
+
+@pytest.mark.django_db
+def test_next_available_slots_across_vendors(appointment_factory, vendor_factory):
+    first = vendor_factory()
+    second = vendor_factory(name='Second Clinic')
+    appointment_factory(vendor=first, start_time=at(SATURDAY, 9), end_time=at(SATURDAY, 11))
+
+    slots = next_available_slots(
+        3, vendor_ids=[first.id, second.id], slot_minutes=60, now=at(FRIDAY, 12)
+    )
+
+    assert [(slot['vendor_id'], slot['start_time'].hour) for slot in slots] == [
+        (second.id, 9), (second.id, 10), (first.id, 11),
+    ]
+
+
+@pytest.mark.django_db
+def test_availability_api(api_client, user_factory, vendor_factory):
+    vendor = vendor_factory()
+    api_client.force_authenticate(user=user_factory())
+    day = timezone.localdate() + timedelta(days=1)
+    while day.weekday() == 4:
+        day += timedelta(days=1)
+
+    response = api_client.get(reverse('appointment-availability'), {
+        'vendor': vendor.id, 'start': day.isoformat(), 'slot_minutes': 60,
+    })
+    assert response.status_code == 200
+    assert len(response.data) == 8
+    assert response.data[0]['vendor'] == vendor.id
+
+    response = api_client.get(
+        reverse('appointment-next-slots'), {'count': 2, 'vendor': [vendor.id]}
+    )
+    assert response.status_code == 200
+    assert len(response.data) == 2
@@ -0,0 +1,87 @@
+"""Chunked expiry tests for appointments."""
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.appointments.expiry import CURSOR_KEY, expire_appointments, load_cursor
+from apps.appointments.models import Appointment
+from apps.appointments.tasks import mark_expired_appointments
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def make_lapsed(appointment_factory, count, status=Appointment.Status.SCHEDULED):
+    now = timezone.now()
+    return [
+        appointment_factory(
+            start_time=now - timedelta(days=2, hours=index + 1),
+            end_time=now - timedelta(days=2, hours=index),
+            status=status,
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_expires_active_appointments_in_chunks(appointment_factory):
+    make_lapsed(appointment_factory, 3)
+    make_lapsed(appointment_factory, 2, status=Appointment.Status.IN_PROGRESS)
+    cancelled = make_lapsed(appointment_factory, 1, status=Appointment.Status.CANCELLED)[0]
+    upcoming = appointment_factory()
+
+    stats = expire_appointments(chunk_size=2)
+
+    assert stats.expired == 5
+    assert stats.chunk_sizes == [2, 2, 1]
+    assert stats.finished
+    assert stats.as_dict()['rows_per_second'] >= 0
+    assert load_cursor() is None
+    assert Appointment.objects.filter(status=Appointment.Status.EXPIRED).count() == 5
+    cancelled.refresh_from_db()
+    upcoming.refresh_from_db()
+    assert cancelled.status == Appointment.Status.CANCELLED
+    assert upcoming.status == Appointment.Status.SCHEDULED
+
+
+@pytest.mark.django_db
+def test_run_over_budget_is_resumed(appointment_factory):
+    lapsed = make_lapsed(appointment_factory, 5)
+
+    first = expire_appointments(chunk_size=2, max_seconds=0)
+
+    assert first.expired == 2
+    assert not first.finished
+    cursor = load_cursor()
+    assert cursor[1] in {appointment.pk for appointment in lapsed}
+
+    second = expire_appointments(chunk_size=2)
+
+    assert second.resumed and second.finished
+    assert second.expired == 3
+    assert load_cursor() is None
+
+
+@pytest.mark.django_db
+def test_mark_expired_appointments_returns_count(appointment_factory):
+    make_lapsed(appointment_factory, 2)
+
+    assert mark_expired_appointments() == 2
+    assert mark_expired_appointments() == 0
+
+
+@pytest.mark.django_db
+def test_malformed_cursor_is_ignored(appointment_factory):
+    make_lapsed(appointment_factory, 2)
+    cache.set(CURSOR_KEY, ['scheduled', timezone.now().isoformat(), 1], timeout=None)
+
+    stats = expire_appointments()
+
+    assert not stats.resumed
+    assert stats.expired == 2
@@ -11,7 +11,9 @@ from apps.notifications.models import Notification
 
 @pytest.mark.django_db
 @pytest.mark.integration
-def test_booking_appointment_triggers_notification_and_delivery(api_client, user_factory, vendor_factory):
+def test_booking_appointment_triggers_notification_and_delivery(
+    api_client, user_factory, vendor_factory, django_capture_on_commit_callbacks
+):
     customer = user_factory()
     vendor = vendor_factory()
     api_client.force_authenticate(user=customer)
@@ -24,7 +26,8 @@ def test_booking_appointment_triggers_notification_and_delivery(api_client, user
         'end_time': (timezone.now() + timedelta(days=1, hours=1)).isoformat(),
         'delivery_address': 'Abadeh, Therapy Center',
     }
-    response = api_client.post(url, payload, format='json')
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post(url, payload, format='json')
     assert response.status_code == 201
 
     assert Notification.objects.filter(recipient=customer, title__icontains='scheduled').exists()
@@ -2,8 +2,13 @@
 from datetime import timedelta
 
 import pytest
+from django.db import connection
 from django.utils import timezone
 
+from apps.appointments.availability import booked_appointments
+from apps.appointments.expiry import lapsed_appointments
+from apps.appointments.models import Appointment
+
 
 @pytest.mark.django_db
 def test_mark_expired_changes_status(appointment_factory):
@@ -14,3 +19,52 @@ def test_mark_expired_changes_status(appointment_factory):
     appointment.mark_expired(reference_time=timezone.now())
     appointment.refresh_from_db()
     assert appointment.status == appointment.Status.EXPIRED
+
+
+def query_plan(queryset):
+    """Return the plan of a queryset as the database sees it in production.
+
+    psycopg2 interpolates parameters on the client, so PostgreSQL plans
+    literal values; on SQLite they are inlined the same way, since a bound
+    parameter never matches a partial index there.
+    """
+
+    with connection.cursor() as cursor:
+        if connection.vendor != 'sqlite':
+            # Tiny test tables would otherwise always be scanned
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+        sql, params = queryset.query.sql_with_params()
+        if params:
+            cursor.execute('SELECT ' + ', '.join(['QUOTE(%s)'] * len(params)), params)
+            sql = sql % cursor.fetchone()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+@pytest.mark.django_db
+def test_active_is_a_positive_status_filter(appointment_factory):
+    live = appointment_factory()
+    appointment_factory(status=Appointment.Status.CANCELLED)
+    where = str(Appointment.objects.active().query).split('WHERE')[1]
+
+    assert 'NOT' not in where
+    assert list(Appointment.objects.active()) == [live]
+
+
+@pytest.mark.django_db
+def test_expiry_walks_partial_end_time_index():
+    now = timezone.now()
+
+    plan = query_plan(lapsed_appointments(now, after=(now - timedelta(days=1), 10))[:100])
+
+    assert 'appointments_active_end' in plan
+
+
+@pytest.mark.django_db
+def test_vendor_listing_uses_partial_vendor_index():
+    now = timezone.now()
+
+    plan = query_plan(booked_appointments([1, 2], now, now + timedelta(days=1)))
+
+    assert 'appointments_active_vendor' in plan
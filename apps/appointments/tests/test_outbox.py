@@ -0,0 +1,119 @@
+"""Outbox tests for booking side effects."""
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.appointments.models import AppointmentOutbox
+from apps.appointments import outbox
+from apps.appointments.outbox import dispatch_pending
+from apps.appointments.services import schedule_appointment
+from apps.delivery.models import DeliveryOrder
+from apps.notifications.models import Notification
+
+
+def book(customer, vendor, offset_hours=1, **kwargs):
+    start = timezone.now() + timedelta(days=1, hours=offset_hours)
+    return schedule_appointment(
+        customer=customer,
+        vendor=vendor,
+        title='Consultation',
+        start_time=start,
+        end_time=start + timedelta(hours=1),
+        **kwargs,
+    )
+
+
+@pytest.mark.django_db
+def test_booking_records_intents_without_side_effects(user_factory, vendor_factory):
+    customer = user_factory()
+
+    appointment = book(customer, vendor_factory(), delivery_address='Abadeh, Main street')
+
+    entry = AppointmentOutbox.objects.get(appointment=appointment)
+    assert entry.status == AppointmentOutbox.Status.PENDING
+    assert [intent['kind'] for intent in entry.intents] == ['notify_booked', 'schedule_delivery']
+    assert not Notification.objects.exists()
+    assert not DeliveryOrder.objects.exists()
+
+
+@pytest.mark.django_db
+def test_commit_dispatches_outbox(user_factory, vendor_factory, django_capture_on_commit_callbacks):
+    customer = user_factory()
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        appointment = book(customer, vendor_factory(), delivery_address='Abadeh, Main street')
+
+    assert callbacks
+    entry = AppointmentOutbox.objects.get(appointment=appointment)
+    assert entry.status == AppointmentOutbox.Status.DONE
+    notifications = Notification.objects.filter(recipient=customer, notification_type='appointment')
+    assert notifications.count() == 1
+    assert DeliveryOrder.objects.get(appointment=appointment).address == 'Abadeh, Main street'
+
+
+@pytest.mark.django_db
+def test_dispatch_is_batched_and_idempotent(user_factory, vendor_factory):
+    vendors = [vendor_factory(name=f'Vendor {i}') for i in range(5)]
+    for vendor in vendors:
+        book(user_factory(), vendor, delivery_address='Abadeh')
+
+    with CaptureQueriesContext(connection) as queries:
+        assert dispatch_pending(batch_size=100) == 5
+    # Claim, batched inserts and one status update, not a round per entry
+    assert len(queries) <= 12
+    assert dispatch_pending() == 0
+
+    assert Notification.objects.count() == 10
+    assert DeliveryOrder.objects.count() == 5
+    assert not AppointmentOutbox.objects.exclude(status=AppointmentOutbox.Status.DONE).exists()
+
+
+@pytest.mark.django_db
+def test_bad_entry_does_not_block_batch(user_factory, vendor_factory, settings):
+    settings.APPOINTMENT_OUTBOX_MAX_ATTEMPTS = 1
+    good = book(user_factory(), vendor_factory())
+    bad = book(user_factory(), vendor_factory(name='Other'))
+    AppointmentOutbox.objects.filter(appointment=bad).update(intents=[{'kind': 'unknown'}])
+
+    assert dispatch_pending() == 1
+
+    assert AppointmentOutbox.objects.get(appointment=good).status == AppointmentOutbox.Status.DONE
+    failed = AppointmentOutbox.objects.get(appointment=bad)
+    assert failed.status == AppointmentOutbox.Status.FAILED
+    assert 'Unknown outbox intent' in failed.last_error
+
+
+@pytest.mark.django_db
+def test_failed_entry_backs_off_and_later_batches_stay_bulk(
+    user_factory, vendor_factory, monkeypatch
+):
+    bad = book(user_factory(), vendor_factory(name='Bad'))
+    AppointmentOutbox.objects.filter(appointment=bad).update(intents=[{'kind': 'unknown'}])
+    for i in range(4):
+        book(user_factory(), vendor_factory(name=f'Vendor {i}'))
+    applied_sizes = []
+    apply = outbox._apply
+
+    def spy(entries):
+        applied_sizes.append(len(entries))
+        apply(entries)
+
+    monkeypatch.setattr(outbox, '_apply', spy)
+
+    assert dispatch_pending(batch_size=2) == 4
+
+    # Only the first batch falls back to one by one; the bad entry is not re-picked
+    assert applied_sizes == [2, 1, 1, 2, 1]
+    failed = AppointmentOutbox.objects.get(appointment=bad)
+    assert failed.status == AppointmentOutbox.Status.PENDING
+    assert failed.attempts == 1
+    assert failed.next_attempt_at > timezone.now()
+    assert dispatch_pending(batch_size=2) == 0
+
+    AppointmentOutbox.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+    assert dispatch_pending(batch_size=2) == 0
+    failed.refresh_from_db()
+    assert failed.attempts == 2
@@ -1,29 +1,42 @@
 """Service tests for appointments."""
 from datetime import timedelta
+from importlib import import_module
 
 import pytest
+from django.db import IntegrityError
 from django.utils import timezone
 
-from apps.appointments.services import schedule_appointment
+from apps.appointments.exceptions import AppointmentConflict
+from apps.appointments.models import Appointment
+from apps.appointments.services import (
+    cancel_appointment,
+    is_overlap_violation,
+    schedule_appointment,
+    translate_overlap_violation,
+)
 from apps.notifications.models import Notification
 
 
 @pytest.mark.django_db
-def test_schedule_appointment_creates_notifications_and_delivery(user_factory, vendor_factory):
+def test_schedule_appointment_creates_notifications_and_delivery(
+    user_factory, vendor_factory, django_capture_on_commit_callbacks
+):
     customer = user_factory()
     vendor = vendor_factory()
     start = timezone.now() + timedelta(hours=2)
     end = start + timedelta(hours=1)
 
-    appointment = schedule_appointment(
-        customer=customer,
-        vendor=vendor,
-        title='Follow up',
-        start_time=start,
-        end_time=end,
-        notes='Discuss lab results.',
-        delivery_address='Abadeh, Main street',
-    )
+    with django_capture_on_commit_callbacks(execute=True):
+        appointment = schedule_appointment(
+            customer=customer,
+            vendor=vendor,
+            title='Follow up',
+            start_time=start,
+            end_time=end,
+            notes='Discuss lab results.',
+            delivery_address='Abadeh, Main street',
+        )
+    appointment.refresh_from_db()
 
     assert appointment.customer == customer
     assert appointment.vendor == vendor
@@ -31,3 +44,77 @@ def test_schedule_appointment_creates_notifications_and_delivery(user_factory, v
     assert Notification.objects.filter(recipient=vendor.user).exists()
     assert hasattr(appointment, 'delivery_order')
     assert appointment.delivery_order.address == 'Abadeh, Main street'
+
+
+@pytest.mark.django_db
+def test_schedule_appointment_rejects_overlap(user_factory, vendor_factory):
+    vendor = vendor_factory()
+    start = timezone.now() + timedelta(days=1)
+    schedule_appointment(
+        customer=user_factory(), vendor=vendor, title='First',
+        start_time=start, end_time=start + timedelta(hours=1),
+    )
+
+    with pytest.raises(AppointmentConflict):
+        schedule_appointment(
+            customer=user_factory(), vendor=vendor, title='Overlap',
+            start_time=start + timedelta(minutes=30), end_time=start + timedelta(hours=2),
+        )
+
+    adjacent = schedule_appointment(
+        customer=user_factory(), vendor=vendor, title='Adjacent',
+        start_time=start + timedelta(hours=1), end_time=start + timedelta(hours=2),
+    )
+    other_vendor = schedule_appointment(
+        customer=user_factory(), vendor=vendor_factory(name='Other'), title='Other vendor',
+        start_time=start, end_time=start + timedelta(hours=1),
+    )
+    assert adjacent.pk and other_vendor.pk
+    assert Appointment.objects.filter(vendor=vendor).count() == 2
+
+
+@pytest.mark.django_db
+def test_cancelled_appointment_frees_time(user_factory, vendor_factory):
+    vendor = vendor_factory()
+    start = timezone.now() + timedelta(days=1)
+    first = schedule_appointment(
+        customer=user_factory(), vendor=vendor, title='First',
+        start_time=start, end_time=start + timedelta(hours=1),
+    )
+    cancel_appointment(first)
+
+    second = schedule_appointment(
+        customer=user_factory(), vendor=vendor, title='Second',
+        start_time=start, end_time=start + timedelta(hours=1),
+    )
+
+    assert second.status == Appointment.Status.SCHEDULED
+
+
+def test_exclusion_violation_maps_to_conflict():
+    class PgError(Exception):
+        pgcode = '23P01'
+
+    violation = IntegrityError('conflicting key value violates exclusion constraint')
+    violation.__cause__ = PgError()
+
+    assert is_overlap_violation(violation)
+    duplicate = IntegrityError('duplicate key value violates unique constraint')
+    assert not is_overlap_violation(duplicate)
+    with pytest.raises(AppointmentConflict):
+        with translate_overlap_violation():
+            raise violation
+
+
+def test_no_overlap_migration_cancels_later_overlaps():
+    migration = import_module('apps.appointments.migrations.0003_appointment_no_overlap')
+    start = timezone.now()
+    hour = timedelta(hours=1)
+    rows = [
+        (1, 1, start, start + 2 * hour),
+        (2, 1, start + hour, start + 3 * hour),
+        (3, 1, start + 2 * hour, start + 4 * hour),
+        (4, 2, start + hour, start + 2 * hour),
+    ]
+
+    assert migration.overlapping_ids(rows) == [2]
@@ -2,11 +2,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import AppointmentViewSet
+from .views import AppointmentViewSet, NextAvailableSlotsView, VendorAvailabilityView
 
 router = DefaultRouter()
 router.register(r'', AppointmentViewSet, basename='appointment')
 
 urlpatterns = [
+    path('availability/', VendorAvailabilityView.as_view(), name='appointment-availability'),
+    path('availability/next/', NextAvailableSlotsView.as_view(), name='appointment-next-slots'),
     path('', include(router.urls)),
 ]
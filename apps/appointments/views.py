@@ -1,8 +1,26 @@
 """ViewSets for appointments."""
-from rest_framework import permissions, viewsets
+from django.db import transaction
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from apps.vendors.models import Vendor
+
+from .availability import free_slots, next_available_slots
 from .models import Appointment
-from .serializers import AppointmentSerializer
+from .serializers import (
+    AppointmentSerializer,
+    AvailabilityQuerySerializer,
+    NextSlotsQuerySerializer,
+    SlotSerializer,
+)
+from .services import (
+    cancel_appointment,
+    guard_vendor_overlap,
+    invalidate_availability_on_commit,
+    translate_overlap_violation,
+)
 
 
 class AppointmentViewSet(viewsets.ModelViewSet):
@@ -22,3 +40,77 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(customer=self.request.user)
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        previous = (instance.start_time, instance.end_time)
+        data = serializer.validated_data
+        with transaction.atomic(), translate_overlap_violation():
+            if instance.status not in Appointment.INACTIVE_STATUSES:
+                guard_vendor_overlap(
+                    data.get('vendor', instance.vendor).pk,
+                    data.get('start_time', instance.start_time),
+                    data.get('end_time', instance.end_time),
+                    exclude_id=instance.pk,
+                )
+            appointment = serializer.save()
+        invalidate_availability_on_commit(appointment, previous_interval=previous)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+        invalidate_availability_on_commit(instance)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        appointment = cancel_appointment(self.get_object())
+        return Response(self.get_serializer(appointment).data)
+
+
+class VendorAvailabilityView(APIView):
+    """Free slots of one vendor over a date range."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        if not Vendor.objects.filter(id=params['vendor'], is_active=True).exists():
+            return Response({'detail': 'Vendor not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        slots = [
+            {'vendor_id': params['vendor'], 'start_time': start, 'end_time': end}
+            for start, end in free_slots(
+                params['vendor'],
+                params['start'],
+                params['end'],
+                slot_minutes=params.get('slot_minutes'),
+            )
+        ]
+        return Response(SlotSerializer(slots, many=True).data)
+
+
+class NextAvailableSlotsView(APIView):
+    """Earliest free slots across vendors."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = NextSlotsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        vendors = Vendor.objects.filter(is_active=True)
+        if params.get('vendor'):
+            vendors = vendors.filter(id__in=params['vendor'])
+        if params.get('vendor_type'):
+            vendors = vendors.filter(vendor_type=params['vendor_type'])
+
+        slots = next_available_slots(
+            params['count'],
+            vendor_ids=list(vendors.values_list('id', flat=True)),
+            slot_minutes=params.get('slot_minutes'),
+        )
+        return Response(SlotSerializer(slots, many=True).data)
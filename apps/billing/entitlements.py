@@ -0,0 +1,175 @@
+"""
+Business Plan Boost entitlement cache.
+
+An entitlement answers "does this user/vendor currently have an active
+subscription" and is computed from active, unexpired subscriptions. Positive
+entries live until the subscription's ``expires_at`` (capped at
+``BILLING_ENTITLEMENT_MAX_TTL``), so they lapse on their own when the
+subscription runs out; negative entries live for
+``BILLING_ENTITLEMENT_NEGATIVE_TTL``. Subscription state transitions
+(activate, extend, expire, cancel), saves and deletes invalidate the affected
+keys once their transaction commits.
+"""
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+USER = 'user'
+VENDOR = 'vendor'
+
+
+class EntitlementCache:
+    """Read-through cache of entitlements keyed by user_id and vendor_id."""
+
+    KEY = 'billing:entitlement:{kind}:{owner_id}'
+
+    def __init__(self, alias: Optional[str] = None):
+        alias = alias or getattr(settings, 'BILLING_ENTITLEMENT_CACHE_ALIAS', 'default')
+        self.cache = caches[alias]
+        self.max_ttl = getattr(settings, 'BILLING_ENTITLEMENT_MAX_TTL', 24 * 60 * 60)
+        self.negative_ttl = getattr(settings, 'BILLING_ENTITLEMENT_NEGATIVE_TTL', 5 * 60)
+
+    def get(self, kind: str, owner_id: int) -> Dict[str, Any]:
+        """Return the entitlement of a single user or vendor."""
+        return self.get_many(kind, [owner_id])[owner_id]
+
+    def get_many(self, kind: str, owner_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Resolve entitlements for many users or vendors.
+
+        Cached entries are read in one cache round trip; misses are computed
+        with one query.
+
+        Args:
+            kind: ``USER`` or ``VENDOR``
+            owner_ids: User or vendor ids
+
+        Returns:
+            Mapping of id to entitlement dict
+        """
+        owner_ids = list(dict.fromkeys(owner_ids))
+        keys = {owner_id: self.KEY.format(kind=kind, owner_id=owner_id) for owner_id in owner_ids}
+        cached = self.cache.get_many(list(keys.values()))
+
+        entitlements = {}
+        missing = []
+        for owner_id, key in keys.items():
+            if key in cached:
+                entitlements[owner_id] = cached[key]
+            else:
+                missing.append(owner_id)
+
+        if missing:
+            computed = compute_entitlements(kind, missing)
+            for owner_id, entitlement in computed.items():
+                self.cache.set(keys[owner_id], entitlement, self._ttl(entitlement))
+            entitlements.update(computed)
+
+        return entitlements
+
+    def invalidate(self, user_ids: Iterable[int] = (), vendor_ids: Iterable[int] = ()) -> None:
+        keys = [self.KEY.format(kind=USER, owner_id=owner_id) for owner_id in user_ids if owner_id]
+        keys += [
+            self.KEY.format(kind=VENDOR, owner_id=owner_id) for owner_id in vendor_ids if owner_id
+        ]
+        if keys:
+            self.cache.delete_many(keys)
+
+    def _ttl(self, entitlement: Dict[str, Any]) -> int:
+        if not entitlement['active']:
+            return self.negative_ttl
+        if entitlement['expires_at'] is None:
+            return self.max_ttl
+        remaining = int((entitlement['expires_at'] - timezone.now()).total_seconds())
+        return max(1, min(remaining, self.max_ttl))
+
+
+def compute_entitlements(kind: str, owner_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Compute entitlements from the database, bypassing the cache."""
+    from .models import Subscription
+
+    owner_ids = list(owner_ids)
+    field = 'user_id' if kind == USER else 'vendor_id'
+    entitlements = {owner_id: _entitlement(None) for owner_id in owner_ids}
+
+    rows = Subscription.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+        **{f'{field}__in': owner_ids},
+        status=Subscription.SubscriptionStatus.ACTIVE
+    ).values(field, 'id', 'plan_type', 'expires_at')
+
+    for row in rows:
+        current = entitlements[row[field]]
+        # Prefer the subscription that runs longest
+        if not current['active'] or _runs_longer(row['expires_at'], current['expires_at']):
+            entitlements[row[field]] = _entitlement(row)
+
+    return entitlements
+
+
+def _entitlement(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if row is None:
+        return {'active': False, 'subscription_id': None, 'plan_type': None, 'expires_at': None}
+    return {
+        'active': True,
+        'subscription_id': row['id'],
+        'plan_type': row['plan_type'],
+        'expires_at': row['expires_at'],
+    }
+
+
+def _runs_longer(expires_at, other_expires_at) -> bool:
+    if other_expires_at is None:
+        return False
+    return expires_at is None or expires_at > other_expires_at
+
+
+def get_user_entitlement(user_id: int) -> Dict[str, Any]:
+    return EntitlementCache().get(USER, user_id)
+
+
+def get_vendor_entitlement(vendor_id: int) -> Dict[str, Any]:
+    return EntitlementCache().get(VENDOR, vendor_id)
+
+
+def get_vendor_entitlements(vendor_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Resolve entitlements for a page of vendors in one round trip."""
+    return EntitlementCache().get_many(VENDOR, vendor_ids)
+
+
+def is_vendor_boosted(vendor_id: int) -> bool:
+    """Return True if the vendor has an active Business Plan Boost."""
+    return get_vendor_entitlement(vendor_id)['active']
+
+
+def invalidate_entitlements(user_ids: Iterable[int] = (), vendor_ids: Iterable[int] = ()) -> None:
+    """
+    Drop cached entitlements of the given users and vendors after commit.
+
+    Invalidating inside the writing transaction would let a lookup between
+    the invalidation and the commit cache the old state again. Outside a
+    transaction the keys are dropped immediately.
+    """
+    user_ids, vendor_ids = list(user_ids), list(vendor_ids)
+    transaction.on_commit(
+        lambda: EntitlementCache().invalidate(user_ids=user_ids, vendor_ids=vendor_ids)
+    )
+
+
+def invalidate_subscription_entitlements(subscription_ids: Iterable[int]) -> None:
+    """Drop cached entitlements of the owners of the given subscriptions."""
+    from .models import Subscription
+
+    owners = list(
+        Subscription.objects.filter(
+            id__in=list(subscription_ids)
+        ).values_list('user_id', 'vendor_id')
+    )
+    invalidate_entitlements(
+        user_ids={user_id for user_id, _ in owners},
+        vendor_ids={vendor_id for _, vendor_id in owners}
+    )
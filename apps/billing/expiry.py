@@ -0,0 +1,154 @@
+"""
+Set-based subscription expiry.
+
+Subscriptions are expired in bounded chunks. On PostgreSQL each chunk is a
+single ``UPDATE ... RETURNING`` statement over rows picked with
+``FOR UPDATE SKIP LOCKED``, so a large expiry day never holds long locks and
+never blocks on rows a concurrent activation is touching. Other databases
+(SQLite in tests) select then update each chunk inside a short transaction.
+
+Expired rows are handed to downstream consumers (entitlement invalidation,
+user notifications) chunk by chunk.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .entitlements import invalidate_entitlements
+from .models import Subscription
+
+logger = logging.getLogger(__name__)
+
+ExpiredRow = Dict[str, Optional[int]]
+Consumer = Callable[[List[ExpiredRow]], None]
+
+
+@dataclass
+class ExpiryStats:
+    """Counters and per-chunk timings of one expiry run."""
+
+    expired: int = 0
+    chunk_sizes: List[int] = field(default_factory=list)
+    chunk_timings: List[float] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'expired': self.expired,
+            'chunks': len(self.chunk_sizes),
+            'chunk_sizes': self.chunk_sizes,
+            'chunk_ms': [round(timing * 1000, 1) for timing in self.chunk_timings],
+            'max_chunk_ms': round(max(self.chunk_timings, default=0) * 1000, 1),
+            'elapsed_seconds': round(self.elapsed, 3),
+        }
+
+
+_EXPIRE_SQL = """
+    WITH batch AS (
+        SELECT id FROM {table}
+        WHERE status = %s AND expires_at < %s
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE {table} AS s
+    SET status = %s, updated_at = %s
+    FROM batch
+    WHERE s.id = batch.id AND s.status = %s
+    RETURNING s.id, s.user_id, s.vendor_id
+"""
+
+
+def expire_chunk(now, chunk_size: int) -> List[ExpiredRow]:
+    """Expire up to ``chunk_size`` lapsed subscriptions and return their rows."""
+    active = Subscription.SubscriptionStatus.ACTIVE
+    expired = Subscription.SubscriptionStatus.EXPIRED
+
+    if connection.vendor == 'postgresql':
+        sql = _EXPIRE_SQL.format(table=connection.ops.quote_name(Subscription._meta.db_table))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [active, now, chunk_size, expired, now, active])
+            rows = cursor.fetchall()
+    else:
+        with transaction.atomic():
+            rows = list(
+                Subscription.objects.filter(status=active, expires_at__lt=now)
+                .order_by('id')
+                .values_list('id', 'user_id', 'vendor_id')[:chunk_size]
+            )
+            Subscription.objects.filter(
+                id__in=[row[0] for row in rows],
+                status=active
+            ).update(status=expired, updated_at=now)
+
+    return [{'id': row[0], 'user_id': row[1], 'vendor_id': row[2]} for row in rows]
+
+
+def invalidate_expired_entitlements(rows: List[ExpiredRow]) -> None:
+    invalidate_entitlements(
+        user_ids={row['user_id'] for row in rows},
+        vendor_ids={row['vendor_id'] for row in rows}
+    )
+
+
+def notify_expired_subscriptions(rows: List[ExpiredRow]) -> None:
+    from apps.notifications.services import send_bulk_notifications
+
+    send_bulk_notifications(
+        recipient_ids=[row['user_id'] for row in rows],
+        title='اشتراک شما به پایان رسید',
+        message='اشتراک پلن تجاری شما منقضی شد. برای ادامه استفاده، اشتراک خود را تمدید کنید.'
+    )
+
+
+DEFAULT_CONSUMERS = (invalidate_expired_entitlements, notify_expired_subscriptions)
+
+
+def expire_subscriptions(
+    now=None,
+    chunk_size: Optional[int] = None,
+    consumers: Iterable[Consumer] = DEFAULT_CONSUMERS
+) -> ExpiryStats:
+    """
+    Expire every lapsed active subscription in bounded chunks.
+
+    Args:
+        now: Expiry cut-off (default: now)
+        chunk_size: Rows per UPDATE (default: ``BILLING_EXPIRY_CHUNK_SIZE``)
+        consumers: Callables receiving each chunk of expired rows
+
+    Returns:
+        Run statistics with per-chunk timings
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'BILLING_EXPIRY_CHUNK_SIZE', 500)
+    stats = ExpiryStats()
+    started = time.monotonic()
+
+    while True:
+        chunk_started = time.monotonic()
+        rows = expire_chunk(now, chunk_size)
+        if not rows:
+            break
+
+        stats.chunk_timings.append(time.monotonic() - chunk_started)
+        stats.chunk_sizes.append(len(rows))
+        stats.expired += len(rows)
+
+        for consumer in consumers:
+            try:
+                consumer(rows)
+            except Exception as e:
+                # Expiry is already committed; a failing consumer must not stop the run
+                logger.error(f'Expiry consumer {consumer.__name__} failed: {str(e)}', exc_info=True)
+
+        if len(rows) < chunk_size:
+            break
+
+    stats.elapsed = time.monotonic() - started
+    return stats
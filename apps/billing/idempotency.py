@@ -0,0 +1,125 @@
+"""
+Request-level idempotency for billing endpoints.
+
+Clients send an ``Idempotency-Key`` header. The first request with a key
+runs; its response is stored in the cache for ``BILLING_IDEMPOTENCY_TTL``
+and replayed for retries with the same key without touching the database or
+the gateway. A duplicate that arrives while the first request is still
+running waits for its result, like concurrent gateway callbacks do.
+Server errors are not stored, so a retry after a 5xx runs again.
+"""
+import hashlib
+import json
+import logging
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_KEY = 'billing:idempotency:{scope}:{user_id}:{key}'
+MAX_KEY_LENGTH = 255
+
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+
+def request_fingerprint(data) -> str:
+    """Hash the request payload so a key cannot be reused for another request."""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def run_idempotent(request, scope: str, handler: Callable[[], Response]) -> Response:
+    """
+    Run ``handler`` at most once per ``Idempotency-Key`` and user.
+
+    Requests without the header run normally.
+
+    Args:
+        request: DRF request
+        scope: Endpoint name, keeps keys of different endpoints apart
+        handler: Produces the response for the first request
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'error': 'کلید یکتایی درخواست بیش از حد طولانی است'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    cache_key = IDEMPOTENCY_KEY.format(scope=scope, user_id=request.user.id, key=key)
+    fingerprint = request_fingerprint(request.data)
+    lock_ttl = getattr(settings, 'BILLING_IDEMPOTENCY_LOCK_TTL', 60)
+
+    if not cache.add(cache_key, {'state': IN_FLIGHT, 'fingerprint': fingerprint}, timeout=lock_ttl):
+        return _replay(cache_key, fingerprint)
+
+    try:
+        response = handler()
+    except Exception:
+        cache.delete(cache_key)
+        raise
+
+    if response.status_code >= 500:
+        # Let the client retry server errors
+        cache.delete(cache_key)
+        return response
+
+    cache.set(
+        cache_key,
+        {
+            'state': DONE,
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'data': response.data,
+        },
+        timeout=getattr(settings, 'BILLING_IDEMPOTENCY_TTL', 60 * 60)
+    )
+    return response
+
+
+def _replay(cache_key: str, fingerprint: str) -> Response:
+    """Return the stored response, waiting for an in-flight original."""
+    entry = cache.get(cache_key)
+    if entry is not None and entry['fingerprint'] != fingerprint:
+        return Response(
+            {'error': 'این کلید یکتایی برای درخواست دیگری استفاده شده است'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    entry = _wait_for_result(cache_key, entry)
+    if entry is None:
+        # Original failed or its lock expired before it finished
+        return Response(
+            {'error': 'درخواست مشابه ناموفق بود، دوباره تلاش کنید'},
+            status=status.HTTP_409_CONFLICT
+        )
+    if entry['state'] != DONE:
+        return Response(
+            {'error': 'درخواست مشابه در حال پردازش است'},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    logger.info(f'Replaying idempotent response for {cache_key}')
+    response = Response(entry['data'], status=entry['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _wait_for_result(cache_key: str, entry: Optional[dict]) -> Optional[dict]:
+    wait_timeout = getattr(settings, 'BILLING_IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    deadline = time.monotonic() + wait_timeout
+
+    while entry is not None and entry['state'] == IN_FLIGHT and time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(cache_key)
+    return entry
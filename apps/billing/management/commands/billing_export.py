@@ -0,0 +1,80 @@
+"""
+Management command for streaming billing exports to a file.
+
+Usage:
+    python manage.py billing_export transactions --output=transactions.csv
+    python manage.py billing_export subscriptions --format=jsonl --status=active
+    python manage.py billing_export transactions --start=2025-01-01 --end=2025-02-01 --status=paid
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.exports import EXPORTS, FORMATS, ExportError, write_export
+
+
+class Command(BaseCommand):
+    help = 'Stream payment transactions or subscriptions as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'export',
+            choices=sorted(EXPORTS),
+            help='What to export',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='csv',
+            help='Output format (default: csv)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Output file path (default: stdout)',
+        )
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            help='Only rows created on or after this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            help='Only rows created before this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--status',
+            action='append',
+            default=[],
+            help='Only rows with this status (repeatable)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Rows fetched per cursor round trip (default: BILLING_EXPORT_CHUNK_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        filters = {
+            'start': options['start'],
+            'end': options['end'],
+            'statuses': options['status'],
+            'chunk_size': options['chunk_size'],
+        }
+        output = options['output']
+
+        try:
+            if output:
+                with open(output, 'w', encoding='utf-8', newline='') as fileobj:
+                    rows = write_export(options['export'], fileobj, options['format'], **filters)
+            else:
+                rows = write_export(options['export'], self.stdout, options['format'], **filters)
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        # Keep the summary off stdout when stdout carries the export itself
+        summary = f'Exported {rows} {options["export"]} rows'
+        if output:
+            self.stdout.write(self.style.SUCCESS(f'{summary} to {output}'))
+        else:
+            self.stderr.write(summary)
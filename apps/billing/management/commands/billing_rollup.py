@@ -0,0 +1,53 @@
+"""
+Management command for daily revenue rollups.
+
+Usage:
+    python manage.py billing_rollup
+    python manage.py billing_rollup --rebuild --start=2025-01-01 --end=2025-02-01
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.billing.rollups import rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refresh or rebuild daily revenue rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every day in [--start, --end) from scratch',
+        )
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            help='First day to rebuild (YYYY-MM-DD, default: 30 days ago)',
+        )
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            help='Day after the last day to rebuild (YYYY-MM-DD, default: tomorrow)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['rebuild']:
+            result = refresh_rollups()
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed {result['days']} days ({result['rows']} rollup rows)"
+            ))
+            return
+
+        today = timezone.localdate()
+        start = options['start'] or today - timedelta(days=30)
+        end = options['end'] or today + timedelta(days=1)
+        if end <= start:
+            raise CommandError('--end must be after --start')
+
+        rows = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {(end - start).days} days from {start} ({rows} rollup rows)'
+        ))
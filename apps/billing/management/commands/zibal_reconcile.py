@@ -4,16 +4,31 @@ Management command for reconciling pending Zibal payments.
 Usage:
     python manage.py zibal_reconcile --since=1
     python manage.py zibal_reconcile --hours=24
+    python manage.py zibal_reconcile --workers=16 --batch-size=200
+    python manage.py zibal_reconcile --due
 """
 import logging
 from datetime import timedelta
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.db import transaction
 
 from apps.billing.models import PaymentTransaction
-from apps.billing.payments.zibal_client import get_zibal_client, ZibalError
+from apps.billing.payments.reconciliation import (
+    ACTION_ALREADY_PROCESSED,
+    ACTION_CANCELLED,
+    ACTION_DRY_RUN,
+    ACTION_ERROR,
+    ACTION_EXPIRED,
+    ACTION_PAID,
+    ACTION_PENDING,
+    ACTION_VERIFY_FAILED,
+    ReconciliationEngine,
+    ReconciliationOutcome,
+    admit_new_transactions,
+    due_zibal_transactions,
+    pending_zibal_transactions,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +58,21 @@ class Command(BaseCommand):
             type=int,
             help='Reconcile specific transaction by track_id',
         )
+        parser.add_argument(
+            '--due',
+            action='store_true',
+            help='Incremental mode: only reconcile transactions whose next check is due',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Number of concurrent gateway workers (default: ZIBAL_RECONCILE_WORKERS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Transactions applied per DB transaction (default: ZIBAL_RECONCILE_BATCH_SIZE)',
+        )
     
     def handle(self, *args, **options):
         since_days = options['since']
@@ -68,16 +98,13 @@ class Command(BaseCommand):
                 gateway=PaymentTransaction.PaymentGateway.ZIBAL
             )
             self.stdout.write(f'Reconciling specific transaction: track_id={specific_track_id}')
+        elif options['due']:
+            if not dry_run:
+                admitted = admit_new_transactions()
+                self.stdout.write(f'Admitted {admitted} new transactions to the schedule')
+            transactions = due_zibal_transactions()
         else:
-            transactions = PaymentTransaction.objects.filter(
-                gateway=PaymentTransaction.PaymentGateway.ZIBAL,
-                status__in=[
-                    PaymentTransaction.PaymentStatus.INITIATED,
-                    PaymentTransaction.PaymentStatus.PENDING
-                ],
-                created_at__gte=time_threshold,
-                track_id__isnull=False
-            ).order_by('created_at')
+            transactions = pending_zibal_transactions(time_threshold)
         
         total = transactions.count()
         self.stdout.write(f'Found {total} pending transactions to reconcile')
@@ -86,138 +113,66 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('No transactions to reconcile'))
             return
         
-        zibal_client = get_zibal_client()
-        
-        reconciled = 0
-        failed = 0
-        already_processed = 0
-        
-        for txn in transactions:
-            self.stdout.write(f'\nProcessing: {txn.order_id} (track_id={txn.track_id})')
-            
-            try:
-                # Inquiry payment status
-                inquiry_result = zibal_client.inquiry(txn.track_id)
-                
-                result_code = inquiry_result.get('result')
-                status_code = inquiry_result.get('status')
-                
-                self.stdout.write(
-                    f'  Result: {result_code}, Status: {status_code}, '
-                    f'Message: {inquiry_result.get("message", "N/A")}'
-                )
-                
-                if not dry_run:
-                    with transaction.atomic():
-                        # Check current status
-                        txn.refresh_from_db()
-                        
-                        if txn.status == PaymentTransaction.PaymentStatus.PAID:
-                            self.stdout.write(
-                                self.style.WARNING(f'  Already processed: {txn.order_id}')
-                            )
-                            already_processed += 1
-                            continue
-                        
-                        # Status 1 = Paid
-                        if status_code == 1:
-                            # Verify the payment
-                            verify_result = zibal_client.verify_payment(txn.track_id)
-                            
-                            if verify_result['success']:
-                                txn.mark_as_paid(
-                                    result_code=verify_result['result'],
-                                    ref_number=verify_result['ref_number'],
-                                    card_pan=verify_result['card_number']
-                                )
-                                
-                                # Activate subscription if applicable
-                                if txn.purpose == PaymentTransaction.PaymentPurpose.SUBSCRIPTION:
-                                    from apps.billing.models import Subscription
-                                    subscription_id = txn.meta.get('subscription_id')
-                                    if subscription_id:
-                                        try:
-                                            subscription = Subscription.objects.get(id=subscription_id)
-                                            subscription.payment_transaction = txn
-                                            subscription.amount_paid = txn.amount_irr
-                                            subscription.activate(
-                                                duration_months=txn.meta.get('months', 1)
-                                            )
-                                            self.stdout.write(
-                                                self.style.SUCCESS(
-                                                    f'  ✓ Subscription {subscription.id} activated'
-                                                )
-                                            )
-                                        except Subscription.DoesNotExist:
-                                            self.stdout.write(
-                                                self.style.WARNING(
-                                                    f'  Subscription {subscription_id} not found'
-                                                )
-                                            )
-                                
-                                self.stdout.write(self.style.SUCCESS(f'  ✓ Paid: {txn.order_id}'))
-                                reconciled += 1
-                            else:
-                                self.stdout.write(
-                                    self.style.WARNING(f'  Verify failed: {verify_result}')
-                                )
-                                failed += 1
-                        
-                        # Status -2 = Cancelled
-                        elif status_code == -2:
-                            txn.mark_as_failed(
-                                result_code=result_code,
-                                message='پرداخت لغو شد'
-                            )
-                            self.stdout.write(self.style.WARNING(f'  ✗ Cancelled: {txn.order_id}'))
-                            reconciled += 1
-                        
-                        # Still pending
-                        elif status_code == -1:
-                            # Check if too old (more than 30 minutes)
-                            age = timezone.now() - txn.created_at
-                            if age > timedelta(minutes=30):
-                                txn.status = PaymentTransaction.PaymentStatus.EXPIRED
-                                txn.message = 'منقضی شده'
-                                txn.save()
-                                self.stdout.write(
-                                    self.style.WARNING(f'  ⏱ Expired: {txn.order_id}')
-                                )
-                                reconciled += 1
-                            else:
-                                self.stdout.write(f'  ⏳ Still pending: {txn.order_id}')
-                        
-                        else:
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f'  Unknown status: {status_code} for {txn.order_id}'
-                                )
-                            )
-                else:
-                    self.stdout.write(self.style.NOTICE('  (Dry run - no changes made)'))
-                    reconciled += 1
-                
-            except ZibalError as e:
-                self.stdout.write(self.style.ERROR(f'  Error: {str(e)}'))
-                failed += 1
-                logger.error(f'Reconcile error for {txn.order_id}: {str(e)}', exc_info=True)
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'  Unexpected error: {str(e)}'))
-                failed += 1
-                logger.error(
-                    f'Unexpected reconcile error for {txn.order_id}: {str(e)}',
-                    exc_info=True
-                )
+        engine = ReconciliationEngine(
+            max_workers=options.get('workers'),
+            batch_size=options.get('batch_size'),
+            dry_run=dry_run,
+            on_outcome=self._report_outcome,
+        )
+        stats = engine.run(transactions)
+        summary = stats.as_dict()
         
         # Summary
         self.stdout.write('\n' + '=' * 50)
         self.stdout.write(self.style.SUCCESS(f'\nReconciliation Summary:'))
-        self.stdout.write(f'  Total processed: {total}')
-        self.stdout.write(f'  Reconciled: {reconciled}')
-        self.stdout.write(f'  Already processed: {already_processed}')
-        self.stdout.write(f'  Failed: {failed}')
+        self.stdout.write(f'  Total processed: {stats.total}')
+        self.stdout.write(f'  Reconciled: {stats.reconciled}')
+        self.stdout.write(f'  Already processed: {stats.already_processed}')
+        self.stdout.write(f'  Still pending: {stats.still_pending}')
+        self.stdout.write(f'  Failed: {stats.failed}')
+        self.stdout.write(f'  Elapsed: {summary["elapsed_ms"]} ms')
+        self.stdout.write(f'  Throughput: {summary["throughput_per_sec"]} txn/s')
+        self.stdout.write(
+            '  Gateway latency (ms): p50={p50} p95={p95} p99={p99} max={max}'.format(
+                **summary['gateway_latency_ms']
+            )
+        )
         
         if dry_run:
             self.stdout.write(self.style.WARNING('\nDRY RUN - No changes were saved'))
         else:
             self.stdout.write(self.style.SUCCESS('\n✓ Reconciliation complete'))
+
+    def _report_outcome(self, outcome: ReconciliationOutcome):
+        """Print the result for a single transaction."""
+        item = outcome.item
+        self.stdout.write(f'\nProcessing: {item.order_id} (track_id={item.track_id})')
+
+        if outcome.inquiry is not None:
+            self.stdout.write(
+                f'  Result: {outcome.inquiry.get("result")}, '
+                f'Status: {outcome.inquiry.get("status")}, '
+                f'Message: {outcome.inquiry.get("message", "N/A")}'
+            )
+
+        if outcome.action == ACTION_PAID:
+            self.stdout.write(self.style.SUCCESS(f'  ✓ Paid: {item.order_id}'))
+        elif outcome.action == ACTION_CANCELLED:
+            self.stdout.write(self.style.WARNING(f'  ✗ Cancelled: {item.order_id}'))
+        elif outcome.action == ACTION_EXPIRED:
+            self.stdout.write(self.style.WARNING(f'  ⏱ Expired: {item.order_id}'))
+        elif outcome.action == ACTION_PENDING:
+            self.stdout.write(f'  ⏳ Still pending: {item.order_id}')
+        elif outcome.action == ACTION_ALREADY_PROCESSED:
+            self.stdout.write(self.style.WARNING(f'  Already processed: {item.order_id}'))
+        elif outcome.action == ACTION_VERIFY_FAILED:
+            self.stdout.write(self.style.WARNING(f'  Verify failed: {outcome.verify}'))
+        elif outcome.action == ACTION_DRY_RUN:
+            self.stdout.write(self.style.NOTICE('  (Dry run - no changes made)'))
+        elif outcome.action == ACTION_ERROR:
+            self.stdout.write(self.style.ERROR(f'  Error: {outcome.error}'))
+        else:
+            status_code = outcome.inquiry.get('status') if outcome.inquiry else None
+            self.stdout.write(
+                self.style.WARNING(f'  Unknown status: {status_code} for {item.order_id}')
+            )
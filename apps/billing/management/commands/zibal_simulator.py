@@ -0,0 +1,84 @@
+"""
+Management command that serves the Zibal gateway simulator over HTTP.
+
+Point the app at it for load tests:
+    ZIBAL_API_BASE=http://127.0.0.1:8900 ZIBAL_GATEWAY_BASE=http://127.0.0.1:8900
+
+Usage:
+    python manage.py zibal_simulator
+    python manage.py zibal_simulator --port=8900 --latency=lognormal:0.08:0.5 --error-rate=0.01
+"""
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.payments.simulator import LatencyProfile, ZibalSimulator
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Serve a local Zibal gateway simulator for load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8900)
+        parser.add_argument(
+            '--latency',
+            default='fixed:0',
+            help='Latency distribution[:mean[:spread]] in seconds (fixed, uniform, lognormal)',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Share of calls answered with HTTP 500',
+        )
+        parser.add_argument(
+            '--pay-rate',
+            type=float,
+            default=1.0,
+            help='Share of settled payments that succeed',
+        )
+        parser.add_argument('--track-id-start', type=int, help='First track_id to hand out')
+        parser.add_argument('--seed', type=int, help='Random seed for repeatable runs')
+        parser.add_argument('--access-log', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        try:
+            latency = LatencyProfile.parse(options['latency'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        simulator = ZibalSimulator(
+            latency=latency,
+            error_rate=options['error_rate'],
+            pay_rate=options['pay_rate'],
+            track_id_start=options['track_id_start'],
+            seed=options['seed'],
+        )
+        handler = WSGIRequestHandler if options['access_log'] else QuietHandler
+        server = make_server(
+            options['host'], options['port'], simulator,
+            server_class=ThreadingWSGIServer, handler_class=handler
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Zibal simulator on http://{options['host']}:{options['port']} "
+            f"(latency={options['latency']}, error_rate={options['error_rate']}, "
+            f"pay_rate={options['pay_rate']})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,13 +1,179 @@
 """
 Billing models for Apatye project.
 """
-from django.db import models
+from typing import Dict, List, Optional
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
 from apps.common.models import TimeStampedModel
 
+from .entitlements import invalidate_entitlements, invalidate_subscription_entitlements
+
+
+class SubscriptionQuerySet(models.QuerySet):
+    """
+    Set-based state transitions for subscriptions.
+
+    Bulk methods touch only the columns they change and return the ids of
+    the rows that actually transitioned.
+    """
+
+    def _transition_ids(self, from_statuses) -> List[int]:
+        """Lock and return ids in this queryset currently in ``from_statuses``."""
+        return list(
+            self.filter(status__in=from_statuses)
+            .select_for_update()
+            .values_list('id', flat=True)
+        )
+
+    def bulk_activate_subscriptions(
+        self,
+        payments: Optional[Dict[int, 'PaymentTransaction']] = None,
+        now=None
+    ) -> List[int]:
+        """
+        Activate pending or expired subscriptions starting now.
+
+        Args:
+            payments: Optional mapping of subscription id to the paid
+                transaction; sets payment_transaction, amount_paid and the
+                duration from the payment's ``meta['months']``
+            now: Activation time (default: now)
+
+        Returns:
+            Ids of activated subscriptions
+        """
+        from dateutil.relativedelta import relativedelta
+
+        payments = payments or {}
+        now = now or timezone.now()
+        fields = ['status', 'starts_at', 'expires_at', 'duration_months', 'updated_at']
+        if payments:
+            fields += ['payment_transaction', 'amount_paid']
+
+        with transaction.atomic(using=self.db):
+            ids = self._transition_ids(Subscription.ACTIVATABLE_STATUSES)
+            subscriptions = list(
+                self.model.objects.filter(id__in=ids).only('id', 'duration_months', 'amount_paid')
+            )
+
+            for subscription in subscriptions:
+                payment = payments.get(subscription.id)
+                if payment is not None:
+                    subscription.duration_months = payment.meta.get('months', 1)
+                    subscription.payment_transaction = payment
+                    subscription.amount_paid = payment.amount_irr
+                subscription.status = Subscription.SubscriptionStatus.ACTIVE
+                subscription.starts_at = now
+                subscription.expires_at = now + relativedelta(months=subscription.duration_months)
+                subscription.updated_at = now
+
+            self.model.objects.bulk_update(subscriptions, fields)
+
+        ids = [subscription.id for subscription in subscriptions]
+        invalidate_subscription_entitlements(ids)
+        return ids
+
+    def bulk_expire(self, now=None) -> List[int]:
+        """Mark active subscriptions in this queryset as expired."""
+        now = now or timezone.now()
+
+        with transaction.atomic(using=self.db):
+            ids = self._transition_ids([Subscription.SubscriptionStatus.ACTIVE])
+            self.model.objects.filter(
+                id__in=ids,
+                status=Subscription.SubscriptionStatus.ACTIVE
+            ).update(status=Subscription.SubscriptionStatus.EXPIRED, updated_at=now)
+
+        invalidate_subscription_entitlements(ids)
+        return ids
+
+
+class PaymentTransactionQuerySet(models.QuerySet):
+    """
+    Set-based state transitions for payment transactions.
+
+    Bulk methods touch only the columns they change and return the ids of
+    the rows that actually transitioned.
+    """
+
+    def pending(self):
+        """Transactions still waiting for a gateway result."""
+        return self.filter(status__in=PaymentTransaction.PENDING_STATUSES)
+
+    def _transition_ids(self, from_statuses) -> List[int]:
+        return list(
+            self.filter(status__in=from_statuses)
+            .select_for_update()
+            .values_list('id', flat=True)
+        )
+
+    def bulk_mark_paid(self, results: Dict[int, Dict], now=None) -> List[int]:
+        """
+        Mark transactions as paid with per-row verify data.
+
+        Args:
+            results: Mapping of transaction id to a dict with ``result_code``,
+                ``ref_number`` and ``card_pan``
+            now: Payment time (default: now)
+
+        Returns:
+            Ids of transactions marked as paid
+        """
+        now = now or timezone.now()
+
+        with transaction.atomic(using=self.db):
+            ids = self.filter(id__in=list(results))._transition_ids(
+                PaymentTransaction.PAYABLE_STATUSES
+            )
+            payments = []
+            for payment_id in ids:
+                result = results[payment_id]
+                payments.append(PaymentTransaction(
+                    id=payment_id,
+                    status=PaymentTransaction.PaymentStatus.PAID,
+                    paid_at=now,
+                    result_code=result.get('result_code'),
+                    ref_number=result.get('ref_number') or '',
+                    card_pan_masked=result.get('card_pan') or '',
+                    updated_at=now,
+                ))
+
+            self.model.objects.bulk_update(payments, [
+                'status', 'paid_at', 'result_code', 'ref_number', 'card_pan_masked', 'updated_at'
+            ])
+
+        return ids
+
+    def bulk_mark_failed(self, message: str = '', result_code=None, now=None) -> List[int]:
+        """Mark pending transactions in this queryset as failed."""
+        return self._bulk_close(
+            PaymentTransaction.PaymentStatus.FAILED, message, result_code, now
+        )
+
+    def bulk_expire(self, message: str = '', now=None) -> List[int]:
+        """Mark pending transactions in this queryset as expired."""
+        return self._bulk_close(PaymentTransaction.PaymentStatus.EXPIRED, message, None, now)
+
+    def _bulk_close(self, to_status, message, result_code, now) -> List[int]:
+        now = now or timezone.now()
+        values = {'status': to_status, 'message': message[:500], 'updated_at': now}
+        if result_code is not None:
+            values['result_code'] = result_code
+
+        with transaction.atomic(using=self.db):
+            ids = self._transition_ids(PaymentTransaction.PENDING_STATUSES)
+            self.model.objects.filter(
+                id__in=ids,
+                status__in=PaymentTransaction.PENDING_STATUSES
+            ).update(**values)
+
+        return ids
+
 
 class Subscription(TimeStampedModel):
     """
@@ -68,6 +234,8 @@ class Subscription(TimeStampedModel):
     )
     
     notes = models.TextField(_('Notes'), blank=True)
+
+    objects = SubscriptionQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('Subscription')
@@ -78,11 +246,18 @@ class Subscription(TimeStampedModel):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['vendor', 'status']),
             models.Index(fields=['expires_at']),
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(
+                fields=['user', '-created_at', '-id'], name='billing_sub_user_created_idx'
+            ),
         ]
 
     def __str__(self):
         return f'{self.user.mobile} - {self.plan_type} ({self.status})'
 
+    # Statuses a subscription may be (re)activated from
+    ACTIVATABLE_STATUSES = (SubscriptionStatus.PENDING, SubscriptionStatus.EXPIRED)
+
     def is_active(self):
         """Check if subscription is currently active."""
         if self.status != self.SubscriptionStatus.ACTIVE:
@@ -91,35 +266,104 @@ class Subscription(TimeStampedModel):
             return False
         return True
 
-    def activate(self, duration_months=None):
-        """Activate subscription and set expiry date."""
-        if duration_months:
-            self.duration_months = duration_months
-        
-        now = timezone.now()
-        self.status = self.SubscriptionStatus.ACTIVE
-        self.starts_at = now
-        
-        # Calculate expiry date
+    def activate(self, duration_months=None, payment=None):
+        """
+        Activate subscription and set expiry date.
+
+        Compare-and-set on ``status``: only pending or expired subscriptions
+        are activated.
+
+        Args:
+            duration_months: Override the stored duration
+            payment: Paid transaction to link; also sets ``amount_paid``
+
+        Returns:
+            True if this call activated the subscription
+        """
         from dateutil.relativedelta import relativedelta
-        self.expires_at = now + relativedelta(months=self.duration_months)
-        self.save()
+
+        duration_months = duration_months or self.duration_months
+        now = timezone.now()
+        values = {
+            'status': self.SubscriptionStatus.ACTIVE,
+            'starts_at': now,
+            'expires_at': now + relativedelta(months=duration_months),
+            'duration_months': duration_months,
+            'updated_at': now,
+        }
+        if payment is not None:
+            values['payment_transaction'] = payment
+            values['amount_paid'] = payment.amount_irr
+
+        updated = Subscription.objects.filter(
+            pk=self.pk,
+            status__in=self.ACTIVATABLE_STATUSES
+        ).update(**values)
+
+        if updated:
+            for name, value in values.items():
+                setattr(self, name, value)
+            self._invalidate_entitlements()
+        return bool(updated)
 
     def extend(self, months):
-        """Extend subscription duration."""
+        """
+        Extend subscription duration.
+
+        Compare-and-set on the observed ``status`` and ``expires_at`` so two
+        concurrent extensions cannot overwrite each other.
+
+        Returns:
+            True if the subscription was extended
+        """
         from dateutil.relativedelta import relativedelta
-        
-        if self.expires_at and self.expires_at > timezone.now():
+
+        now = timezone.now()
+        if self.expires_at and self.expires_at > now:
             # Extend from current expiry
-            self.expires_at = self.expires_at + relativedelta(months=months)
+            values = {'expires_at': self.expires_at + relativedelta(months=months)}
         else:
             # Restart from now
-            now = timezone.now()
-            self.starts_at = now
-            self.expires_at = now + relativedelta(months=months)
-            self.status = self.SubscriptionStatus.ACTIVE
-        
-        self.save()
+            values = {
+                'starts_at': now,
+                'expires_at': now + relativedelta(months=months),
+                'status': self.SubscriptionStatus.ACTIVE,
+            }
+        values['updated_at'] = now
+
+        updated = Subscription.objects.filter(
+            pk=self.pk,
+            status=self.status,
+            expires_at=self.expires_at
+        ).update(**values)
+
+        if updated:
+            for name, value in values.items():
+                setattr(self, name, value)
+            self._invalidate_entitlements()
+        return bool(updated)
+
+    def cancel(self):
+        """
+        Cancel a pending or active subscription.
+
+        Returns:
+            True if this call cancelled the subscription
+        """
+        now = timezone.now()
+        updated = Subscription.objects.filter(
+            pk=self.pk,
+            status__in=[self.SubscriptionStatus.PENDING, self.SubscriptionStatus.ACTIVE]
+        ).update(status=self.SubscriptionStatus.CANCELLED, updated_at=now)
+
+        if updated:
+            self.status = self.SubscriptionStatus.CANCELLED
+            self.updated_at = now
+            self._invalidate_entitlements()
+        return bool(updated)
+
+    def _invalidate_entitlements(self):
+        invalidate_entitlements(user_ids=[self.user_id], vendor_ids=[self.vendor_id])
 
 
 class PaymentTransaction(TimeStampedModel):
@@ -211,6 +455,17 @@ class PaymentTransaction(TimeStampedModel):
     meta = models.JSONField(_('Metadata'), default=dict, blank=True)
     callback_url = models.URLField(_('Callback URL'), max_length=500, blank=True)
     
+    # Reconciliation schedule
+    next_check_at = models.DateTimeField(
+        _('Next reconciliation check'),
+        null=True,
+        blank=True,
+        help_text=_('When reconciliation should next inquire this transaction')
+    )
+    check_attempts = models.PositiveSmallIntegerField(_('Reconciliation attempts'), default=0)
+
+    objects = PaymentTransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Payment Transaction')
         verbose_name_plural = _('Payment Transactions')
@@ -221,6 +476,10 @@ class PaymentTransaction(TimeStampedModel):
             models.Index(fields=['gateway', 'track_id']),
             models.Index(fields=['user', 'status']),
             models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'next_check_at']),
+            models.Index(fields=['user', '-created_at', '-id'], name='billing_tx_user_created_idx'),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -233,21 +492,66 @@ class PaymentTransaction(TimeStampedModel):
     def __str__(self):
         return f'{self.order_id} - {self.gateway} - {self.status} - {self.amount_irr} IRR'
 
-    def mark_as_paid(self, result_code=None, ref_number='', card_pan=''):
-        """Mark transaction as paid."""
-        self.status = self.PaymentStatus.PAID
-        self.paid_at = timezone.now()
-        self.result_code = result_code
-        self.ref_number = ref_number
-        self.card_pan_masked = card_pan
-        self.save()
+    # Statuses still waiting for a gateway result
+    PENDING_STATUSES = (PaymentStatus.INITIATED, PaymentStatus.PENDING)
+    # A verified payment wins over a locally failed or expired state
+    PAYABLE_STATUSES = (
+        PaymentStatus.INITIATED,
+        PaymentStatus.PENDING,
+        PaymentStatus.FAILED,
+        PaymentStatus.EXPIRED,
+    )
+
+    def mark_as_paid(self, result_code=None, ref_number='', card_pan='', meta=None):
+        """
+        Mark transaction as paid, optionally merging extra metadata.
+
+        Compare-and-set on ``status``: a transaction that is already paid or
+        refunded is left untouched. ``meta`` is only written when given.
+
+        Returns:
+            True if this call marked the transaction as paid
+        """
+        now = timezone.now()
+        values = {
+            'status': self.PaymentStatus.PAID,
+            'paid_at': now,
+            'result_code': result_code,
+            'ref_number': ref_number,
+            'card_pan_masked': card_pan,
+            'updated_at': now,
+        }
+        if meta:
+            values['meta'] = {**self.meta, **meta}
+
+        return self._transition(self.PAYABLE_STATUSES, values)
 
     def mark_as_failed(self, result_code=None, message=''):
-        """Mark transaction as failed."""
-        self.status = self.PaymentStatus.FAILED
-        self.result_code = result_code
-        self.message = message
-        self.save()
+        """
+        Mark transaction as failed.
+
+        Compare-and-set on ``status``: only pending transactions fail.
+
+        Returns:
+            True if this call marked the transaction as failed
+        """
+        return self._transition(self.PENDING_STATUSES, {
+            'status': self.PaymentStatus.FAILED,
+            'result_code': result_code,
+            'message': message,
+            'updated_at': timezone.now(),
+        })
+
+    def _transition(self, from_statuses, values) -> bool:
+        updated = PaymentTransaction.objects.filter(
+            pk=self.pk,
+            status__in=from_statuses
+        ).update(**values)
+
+        if updated:
+            for name, value in values.items():
+                setattr(self, name, value)
+        return bool(updated)
 
     def is_pending(self):
         """Check if transaction is pending."""
@@ -259,3 +563,129 @@ class PaymentTransaction(TimeStampedModel):
     def is_successful(self):
         """Check if transaction was successful."""
         return self.status == self.PaymentStatus.PAID
+
+
+class ReconciliationCursor(models.Model):
+    """
+    Persisted high-water mark for incremental reconciliation.
+
+    Transactions created after ``(last_created_at, last_id)`` have not yet
+    been admitted into the reconciliation schedule.
+    """
+    name = models.CharField(_('Name'), max_length=50, unique=True)
+    last_created_at = models.DateTimeField(_('Last created at'), null=True, blank=True)
+    last_id = models.BigIntegerField(_('Last ID'), default=0)
+    updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Reconciliation Cursor')
+        verbose_name_plural = _('Reconciliation Cursors')
+        db_table = 'billing_reconciliation_cursors'
+
+    def __str__(self):
+        return f'{self.name} @ {self.last_created_at} #{self.last_id}'
+
+
+class SubscriptionReminder(models.Model):
+    """
+    Record of an expiry reminder sent for a subscription.
+
+    One row per subscription and reminder kind, so reruns of the reminder
+    task never notify twice.
+    """
+    class ReminderKind(models.TextChoices):
+        SEVEN_DAYS = '7d', _('7 days before expiry')
+        ONE_DAY = '1d', _('1 day before expiry')
+
+    subscription = models.ForeignKey(
+        Subscription,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name=_('Subscription')
+    )
+    kind = models.CharField(_('Kind'), max_length=5, choices=ReminderKind.choices)
+    sent_at = models.DateTimeField(_('Sent at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Subscription Reminder')
+        verbose_name_plural = _('Subscription Reminders')
+        db_table = 'billing_subscription_reminders'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscription', 'kind'],
+                name='billing_reminder_subscription_kind_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.subscription_id} - {self.kind}'
+
+
+class DailyRevenueRollup(models.Model):
+    """
+    Daily payment aggregates per vendor, purpose and status.
+
+    Days are local calendar days of ``PaymentTransaction.created_at``. Rows
+    are recomputed per day by :mod:`apps.billing.rollups`; readers always
+    ``SUM`` over the dimensions they do not group by.
+    """
+    day = models.DateField(_('Day'))
+    vendor = models.ForeignKey(
+        'vendors.Vendor',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Vendor')
+    )
+    purpose = models.CharField(
+        _('Purpose'),
+        max_length=30,
+        choices=PaymentTransaction.PaymentPurpose.choices
+    )
+    status = models.CharField(
+        _('Status'),
+        max_length=20,
+        choices=PaymentTransaction.PaymentStatus.choices
+    )
+    transaction_count = models.PositiveIntegerField(_('Transactions'), default=0)
+    amount_irr = models.BigIntegerField(_('Amount (IRR)'), default=0)
+    updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Daily Revenue Rollup')
+        verbose_name_plural = _('Daily Revenue Rollups')
+        db_table = 'billing_daily_revenue_rollups'
+        ordering = ['-day']
+        constraints = [
+            # One row per group; COALESCE makes rows without a vendor one group too
+            models.UniqueConstraint(
+                models.F('day'),
+                Coalesce('vendor', 0),
+                models.F('purpose'),
+                models.F('status'),
+                name='billing_rollup_day_group_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'status']),
+            models.Index(fields=['vendor', 'day']),
+        ]
+
+    def __str__(self):
+        return f'{self.day} - {self.vendor_id} - {self.purpose} - {self.status}'
+
+
+class RollupWatermark(models.Model):
+    """Transactions updated after ``last_updated_at`` are not yet rolled up."""
+    name = models.CharField(_('Name'), max_length=50, unique=True)
+    last_updated_at = models.DateTimeField(_('Last updated at'), null=True, blank=True)
+    updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Rollup Watermark')
+        verbose_name_plural = _('Rollup Watermarks')
+        db_table = 'billing_rollup_watermarks'
+
+    def __str__(self):
+        return f'{self.name} @ {self.last_updated_at}'
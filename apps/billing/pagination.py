@@ -0,0 +1,17 @@
+"""
+Billing pagination classes.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class BillingCursorPagination(CursorPagination):
+    """
+    Keyset pagination on ``(created_at, id)``, newest first.
+
+    Each page is a range scan on the ``(user, created_at, id)`` indexes and
+    no COUNT query is issued, so deep pages cost the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,459 @@
+"""
+Concurrent reconciliation engine for pending Zibal payments.
+
+Gateway round trips (inquiry and, for paid transactions, verify) run on a
+bounded thread pool. Database state changes are then applied per chunk in a
+single short transaction, so row locks are never held across network I/O.
+
+Scheduled runs are incremental (:func:`run_incremental_reconciliation`):
+new transactions are admitted past a persisted high-water mark, and each run
+only checks transactions whose ``next_check_at`` is due. Transactions that
+are still pending are rescheduled with exponential backoff.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .result_cache import cached_inquiry, cached_verify
+from .zibal_client import ZibalClient, ZibalError, get_zibal_client
+
+logger = logging.getLogger(__name__)
+
+
+# Outcome actions
+ACTION_PAID = 'paid'
+ACTION_CANCELLED = 'cancelled'
+ACTION_EXPIRED = 'expired'
+ACTION_PENDING = 'pending'
+ACTION_VERIFY_FAILED = 'verify_failed'
+ACTION_UNKNOWN = 'unknown'
+ACTION_ALREADY_PROCESSED = 'already_processed'
+ACTION_DRY_RUN = 'dry_run'
+ACTION_ERROR = 'error'
+
+# Log wording of the per-transaction reconciliation outcomes
+LOGGED_TRANSITIONS = {
+    ACTION_PAID: 'reconciled as PAID',
+    ACTION_CANCELLED: 'reconciled as FAILED',
+    ACTION_EXPIRED: 'marked as EXPIRED',
+}
+
+
+@dataclass
+class ReconciliationItem:
+    """Minimal snapshot of a transaction handed to gateway workers."""
+    id: int
+    track_id: int
+    order_id: str
+    created_at: Any
+    check_attempts: int = 0
+
+
+@dataclass
+class ReconciliationOutcome:
+    """Result of checking one transaction against the gateway."""
+    item: ReconciliationItem
+    action: str
+    inquiry: Optional[Dict[str, Any]] = None
+    verify: Optional[Dict[str, Any]] = None
+    error: str = ''
+    latency: float = 0.0
+
+
+@dataclass
+class ReconciliationStats:
+    """Per-run counters and gateway latency samples."""
+    total: int = 0
+    reconciled: int = 0
+    failed: int = 0
+    already_processed: int = 0
+    still_pending: int = 0
+    admitted: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    @staticmethod
+    def _percentile(samples: List[float], pct: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+    @property
+    def throughput(self) -> float:
+        """Transactions processed per second."""
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return JSON-serialisable stats for task results."""
+        return {
+            'total': self.total,
+            'reconciled': self.reconciled,
+            'failed': self.failed,
+            'already_processed': self.already_processed,
+            'still_pending': self.still_pending,
+            'admitted': self.admitted,
+            'batches': self.batches,
+            'elapsed_ms': round(self.elapsed * 1000, 2),
+            'throughput_per_sec': round(self.throughput, 2),
+            'gateway_latency_ms': {
+                'p50': round(self._percentile(self.latencies, 50) * 1000, 2),
+                'p95': round(self._percentile(self.latencies, 95) * 1000, 2),
+                'p99': round(self._percentile(self.latencies, 99) * 1000, 2),
+                'max': round(max(self.latencies, default=0.0) * 1000, 2),
+            },
+        }
+
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ReconciliationEngine:
+    """
+    Reconcile pending transactions with a bounded gateway worker pool.
+
+    Usage:
+        engine = ReconciliationEngine()
+        stats = engine.run(PaymentTransaction.objects.filter(...))
+    """
+
+    def __init__(
+        self,
+        client: Optional[ZibalClient] = None,
+        max_workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        dry_run: bool = False,
+        expire_after: timedelta = timedelta(minutes=30),
+        on_outcome: Optional[Callable[[ReconciliationOutcome], None]] = None,
+    ):
+        self.client = client or get_zibal_client()
+        self.max_workers = max_workers or getattr(settings, 'ZIBAL_RECONCILE_WORKERS', 8)
+        self.batch_size = batch_size or getattr(settings, 'ZIBAL_RECONCILE_BATCH_SIZE', 100)
+        self.dry_run = dry_run
+        self.expire_after = expire_after
+        self.on_outcome = on_outcome
+
+    def run(self, queryset) -> ReconciliationStats:
+        """
+        Reconcile every transaction in ``queryset``.
+
+        Args:
+            queryset: PaymentTransaction queryset to reconcile
+
+        Returns:
+            ReconciliationStats for the run
+        """
+        stats = ReconciliationStats()
+        started = time.monotonic()
+
+        rows = queryset.values_list(
+            'id', 'track_id', 'order_id', 'created_at', 'check_attempts'
+        ).iterator(chunk_size=self.batch_size)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for chunk in _chunked(rows, self.batch_size):
+                items = [ReconciliationItem(*row) for row in chunk]
+                outcomes = list(pool.map(self._check, items))
+                stats.batches += 1
+                stats.total += len(outcomes)
+                stats.latencies.extend(outcome.latency for outcome in outcomes)
+
+                if not self.dry_run:
+                    self._apply(outcomes)
+                    self._reschedule(outcomes)
+
+                for outcome in outcomes:
+                    self._count(outcome, stats)
+                    if self.on_outcome:
+                        self.on_outcome(outcome)
+
+        stats.elapsed = time.monotonic() - started
+        return stats
+
+    def _check(self, item: ReconciliationItem) -> ReconciliationOutcome:
+        """Run gateway calls for one transaction. Executes on a worker thread."""
+        started = time.monotonic()
+        outcome = ReconciliationOutcome(item=item, action=ACTION_UNKNOWN)
+
+        try:
+            outcome.inquiry = cached_inquiry(item.track_id, client=self.client)
+            status_code = outcome.inquiry.get('status')
+
+            if self.dry_run:
+                outcome.action = ACTION_DRY_RUN
+            elif status_code == ZibalClient.STATUS_PAID:
+                outcome.verify = cached_verify(item.track_id, client=self.client)
+                outcome.action = ACTION_PAID if outcome.verify['success'] else ACTION_VERIFY_FAILED
+            elif status_code == ZibalClient.STATUS_CANCELLED:
+                outcome.action = ACTION_CANCELLED
+            elif status_code == ZibalClient.STATUS_PENDING:
+                age = timezone.now() - item.created_at
+                outcome.action = ACTION_EXPIRED if age > self.expire_after else ACTION_PENDING
+        except ZibalError as e:
+            outcome.action = ACTION_ERROR
+            outcome.error = str(e)
+            logger.error(f'Reconciliation error for {item.order_id}: {str(e)}')
+        except Exception as e:
+            outcome.action = ACTION_ERROR
+            outcome.error = str(e)
+            logger.error(
+                f'Unexpected reconciliation error for {item.order_id}: {str(e)}',
+                exc_info=True
+            )
+
+        outcome.latency = time.monotonic() - started
+        return outcome
+
+    def _apply(self, outcomes: List[ReconciliationOutcome]) -> None:
+        """Apply one chunk of gateway outcomes as a few set-based statements."""
+        from apps.billing.models import PaymentTransaction
+
+        by_action = {ACTION_PAID: {}, ACTION_CANCELLED: {}, ACTION_EXPIRED: {}}
+        for outcome in outcomes:
+            if outcome.action in by_action:
+                by_action[outcome.action][outcome.item.id] = outcome
+        if not any(by_action.values()):
+            return
+
+        paid = by_action[ACTION_PAID]
+        cancelled = by_action[ACTION_CANCELLED]
+        expired = by_action[ACTION_EXPIRED]
+        transitioned = set()
+
+        try:
+            with transaction.atomic():
+                if paid:
+                    paid_ids = PaymentTransaction.objects.bulk_mark_paid({
+                        payment_id: {
+                            'result_code': outcome.verify['result'],
+                            'ref_number': outcome.verify['ref_number'],
+                            'card_pan': outcome.verify['card_number'],
+                        }
+                        for payment_id, outcome in paid.items()
+                    })
+                    transitioned.update(paid_ids)
+                    self._activate_subscriptions(paid_ids)
+
+                # Cancelled transactions share the inquiry result code (100)
+                by_result_code = {}
+                for payment_id, outcome in cancelled.items():
+                    by_result_code.setdefault(outcome.inquiry.get('result'), []).append(payment_id)
+                for result_code, payment_ids in by_result_code.items():
+                    transitioned.update(
+                        PaymentTransaction.objects.filter(id__in=payment_ids).bulk_mark_failed(
+                            message='Payment cancelled',
+                            result_code=result_code
+                        )
+                    )
+
+                if expired:
+                    transitioned.update(
+                        PaymentTransaction.objects.filter(id__in=list(expired)).bulk_expire(
+                            message='Payment expired'
+                        )
+                    )
+        except Exception as e:
+            logger.error(f'Failed to apply reconciliation batch: {str(e)}', exc_info=True)
+            for group in (paid, cancelled, expired):
+                for outcome in group.values():
+                    outcome.action = ACTION_ERROR
+                    outcome.error = str(e)
+            return
+
+        for group in (paid, cancelled, expired):
+            for payment_id, outcome in group.items():
+                if payment_id not in transitioned:
+                    # Skip if already processed (callback may have won the race)
+                    outcome.action = ACTION_ALREADY_PROCESSED
+                else:
+                    transition = LOGGED_TRANSITIONS[outcome.action]
+                    logger.info(f'Payment {outcome.item.order_id} {transition}')
+
+    @staticmethod
+    def _activate_subscriptions(paid_ids: List[int]) -> None:
+        from apps.billing.models import PaymentTransaction, Subscription
+
+        payments_by_subscription = {}
+        for payment in PaymentTransaction.objects.filter(
+            id__in=paid_ids,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION
+        ).only('id', 'meta', 'amount_irr'):
+            subscription_id = payment.meta.get('subscription_id')
+            if subscription_id:
+                payments_by_subscription[subscription_id] = payment
+
+        if not payments_by_subscription:
+            return
+
+        activated = Subscription.objects.filter(
+            id__in=list(payments_by_subscription)
+        ).bulk_activate_subscriptions(payments_by_subscription)
+
+        for subscription_id in activated:
+            logger.info(f'Subscription {subscription_id} activated via reconciliation')
+        for subscription_id in set(payments_by_subscription) - set(activated):
+            logger.warning(f'Subscription {subscription_id} not found or not activatable')
+
+    def _reschedule(self, outcomes: List[ReconciliationOutcome]) -> None:
+        """Push the next check of still-open transactions out with backoff."""
+        from apps.billing.models import PaymentTransaction
+
+        now = timezone.now()
+        updates = []
+        for outcome in outcomes:
+            if outcome.action not in (
+                ACTION_PENDING, ACTION_UNKNOWN, ACTION_ERROR, ACTION_VERIFY_FAILED
+            ):
+                continue
+            attempts = outcome.item.check_attempts + 1
+            delay = next_check_delay(now - outcome.item.created_at, attempts)
+            updates.append(PaymentTransaction(
+                id=outcome.item.id,
+                next_check_at=now + delay,
+                check_attempts=min(attempts, 32767),
+            ))
+
+        if updates:
+            PaymentTransaction.objects.bulk_update(updates, ['next_check_at', 'check_attempts'])
+
+    @staticmethod
+    def _count(outcome: ReconciliationOutcome, stats: ReconciliationStats) -> None:
+        if outcome.action in (ACTION_PAID, ACTION_CANCELLED, ACTION_EXPIRED, ACTION_DRY_RUN):
+            stats.reconciled += 1
+        elif outcome.action in (ACTION_ERROR, ACTION_VERIFY_FAILED):
+            stats.failed += 1
+        elif outcome.action == ACTION_ALREADY_PROCESSED:
+            stats.already_processed += 1
+        elif outcome.action in (ACTION_PENDING, ACTION_UNKNOWN):
+            stats.still_pending += 1
+
+
+def pending_zibal_transactions(since):
+    """Return pending Zibal transactions created after ``since``."""
+    from apps.billing.models import PaymentTransaction
+
+    return PaymentTransaction.objects.filter(
+        gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+        status__in=[
+            PaymentTransaction.PaymentStatus.INITIATED,
+            PaymentTransaction.PaymentStatus.PENDING
+        ],
+        created_at__gte=since,
+        track_id__isnull=False
+    ).order_by('created_at')
+
+
+def next_check_delay(age: timedelta, attempts: int) -> timedelta:
+    """
+    Backoff for the next inquiry of a transaction.
+
+    Grows exponentially with the number of inconclusive checks and is never
+    shorter than a quarter of the transaction's age, capped at
+    ``ZIBAL_RECONCILE_MAX_BACKOFF`` seconds.
+    """
+    base = getattr(settings, 'ZIBAL_RECONCILE_BASE_BACKOFF', 120)
+    cap = getattr(settings, 'ZIBAL_RECONCILE_MAX_BACKOFF', 6 * 60 * 60)
+    seconds = max(base * (2 ** min(attempts - 1, 16)), age.total_seconds() / 4)
+    return timedelta(seconds=min(seconds, cap))
+
+
+def admit_new_transactions(cursor_name: str = 'zibal') -> int:
+    """
+    Schedule transactions created past the high-water mark for their first check.
+
+    The mark only advances to rows older than ``ZIBAL_RECONCILE_ADMIT_LAG``
+    seconds so transactions still registering with the gateway are not skipped.
+
+    Returns:
+        Number of transactions admitted
+    """
+    from apps.billing.models import PaymentTransaction, ReconciliationCursor
+
+    now = timezone.now()
+    lag = timedelta(seconds=getattr(settings, 'ZIBAL_RECONCILE_ADMIT_LAG', 15 * 60))
+    first_check = timedelta(seconds=getattr(settings, 'ZIBAL_RECONCILE_FIRST_CHECK', 5 * 60))
+    admitted = 0
+
+    with transaction.atomic():
+        cursor, _ = ReconciliationCursor.objects.select_for_update().get_or_create(
+            name=cursor_name
+        )
+
+        candidates = PaymentTransaction.objects.filter(
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            created_at__lt=now - lag,
+        )
+        if cursor.last_created_at is not None:
+            candidates = candidates.filter(
+                Q(created_at__gt=cursor.last_created_at)
+                | Q(created_at=cursor.last_created_at, id__gt=cursor.last_id)
+            )
+        else:
+            # First run: start from the classic 24-hour window
+            candidates = candidates.filter(created_at__gte=now - timedelta(hours=24))
+
+        last = candidates.order_by('-created_at', '-id').values_list('created_at', 'id').first()
+        if last is None:
+            return 0
+
+        admitted = candidates.filter(
+            status__in=[
+                PaymentTransaction.PaymentStatus.INITIATED,
+                PaymentTransaction.PaymentStatus.PENDING
+            ],
+            track_id__isnull=False,
+            next_check_at__isnull=True,
+        ).update(next_check_at=now + first_check)
+
+        cursor.last_created_at, cursor.last_id = last
+        cursor.save(update_fields=['last_created_at', 'last_id', 'updated_at'])
+
+    return admitted
+
+
+def due_zibal_transactions(now=None, limit: Optional[int] = None):
+    """Return pending transactions whose next check is due, earliest first."""
+    from apps.billing.models import PaymentTransaction
+
+    now = now or timezone.now()
+    limit = limit or getattr(settings, 'ZIBAL_RECONCILE_MAX_PER_RUN', 5000)
+
+    due_ids = list(PaymentTransaction.objects.filter(
+        status__in=[
+            PaymentTransaction.PaymentStatus.INITIATED,
+            PaymentTransaction.PaymentStatus.PENDING
+        ],
+        next_check_at__lte=now,
+        gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+        track_id__isnull=False,
+    ).order_by('next_check_at').values_list('id', flat=True)[:limit])
+
+    return PaymentTransaction.objects.filter(id__in=due_ids).order_by('next_check_at')
+
+
+def run_incremental_reconciliation(
+    engine: Optional[ReconciliationEngine] = None
+) -> ReconciliationStats:
+    """Admit new transactions, then reconcile only those that are due."""
+    admitted = admit_new_transactions()
+    stats = (engine or ReconciliationEngine()).run(due_zibal_transactions())
+    stats.admitted = admitted
+    return stats
@@ -0,0 +1,258 @@
+"""
+Fail-fast protection for gateway calls.
+
+- :class:`CircuitBreaker` opens after ``ZIBAL_BREAKER_FAILURE_THRESHOLD``
+  failures within ``ZIBAL_BREAKER_WINDOW`` seconds and rejects calls for
+  ``ZIBAL_BREAKER_RECOVERY_TIMEOUT`` seconds; then a single half-open probe
+  decides whether it closes again. State lives in the Django cache
+  (django-redis in deployments), so every worker sees the same circuit.
+- :class:`AdaptiveTimeout` derives the per-attempt timeout from recent
+  latency percentiles, capped by ``ZIBAL_TIMEOUT``. Timed-out attempts count
+  as samples at the timeout, so the timeout grows when the gateway slows
+  down, and half-open probes always get the full ``ZIBAL_TIMEOUT``.
+- :class:`RetryBudget` allows retries only while they stay under a share of
+  the calls made in the current window, so retries cannot multiply load
+  during an incident.
+
+:class:`ResiliencePolicy` combines the three for a client's request loop.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit rejects a call."""
+
+
+def _cache():
+    return caches[getattr(settings, 'ZIBAL_RESILIENCE_CACHE_ALIAS', 'default')]
+
+
+def _incr(cache, key: str, timeout: int) -> int:
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:  # pragma: no cover - evicted between add and incr
+        cache.set(key, 1, timeout=timeout)
+        return 1
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit shared through the cache."""
+
+    STATE_KEY = 'billing:breaker:{name}:opened_at'
+    PROBE_KEY = 'billing:breaker:{name}:probe'
+    FAILURES_KEY = 'billing:breaker:{name}:failures:{bucket}'
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        window: Optional[int] = None,
+        recovery_timeout: Optional[int] = None
+    ):
+        self.name = name
+        self.failure_threshold = (
+            failure_threshold or getattr(settings, 'ZIBAL_BREAKER_FAILURE_THRESHOLD', 5)
+        )
+        self.window = window or getattr(settings, 'ZIBAL_BREAKER_WINDOW', 30)
+        self.recovery_timeout = (
+            recovery_timeout or getattr(settings, 'ZIBAL_BREAKER_RECOVERY_TIMEOUT', 30)
+        )
+        self.cache = _cache()
+        self.state_key = self.STATE_KEY.format(name=name)
+        self.probe_key = self.PROBE_KEY.format(name=name)
+
+    @property
+    def state(self) -> str:
+        opened_at = self.cache.get(self.state_key)
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.recovery_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def allow(self) -> str:
+        """
+        Admit a call and return the state it was admitted in.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with the
+                probe already taken by another caller
+        """
+        opened_at = self.cache.get(self.state_key)
+        if opened_at is None:
+            return CLOSED
+
+        if time.time() - opened_at >= self.recovery_timeout:
+            if self.cache.add(self.probe_key, 1, timeout=self.recovery_timeout):
+                return HALF_OPEN
+
+        raise CircuitOpenError(f'Circuit {self.name} is open')
+
+    def record_success(self, admitted_in: str) -> None:
+        if admitted_in != CLOSED:
+            self.cache.delete_many([self.state_key, self.probe_key])
+            logger.info(f'Circuit {self.name} closed')
+
+    def record_failure(self, admitted_in: str) -> None:
+        if admitted_in == HALF_OPEN:
+            self._open()
+            return
+
+        bucket = int(time.time() // self.window)
+        key = self.FAILURES_KEY.format(name=self.name, bucket=bucket)
+        if _incr(self.cache, key, self.window * 2) >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.cache.set(self.state_key, time.time(), timeout=None)
+        self.cache.delete(self.probe_key)
+        logger.warning(f'Circuit {self.name} opened for {self.recovery_timeout}s')
+
+
+class AdaptiveTimeout:
+    """
+    Per-process timeout from a latency percentile of recent calls.
+
+    ``timeout = clamp(percentile(latencies) * multiplier, minimum, maximum)``;
+    until ``min_samples`` calls were observed the maximum is used.
+    """
+
+    def __init__(
+        self,
+        maximum: float,
+        minimum: Optional[float] = None,
+        percentile: Optional[float] = None,
+        multiplier: Optional[float] = None,
+        samples: int = 200,
+        min_samples: int = 20
+    ):
+        self.maximum = maximum
+        self.minimum = min(maximum, minimum or getattr(settings, 'ZIBAL_ADAPTIVE_TIMEOUT_MIN', 2.0))
+        self.percentile = percentile or getattr(settings, 'ZIBAL_ADAPTIVE_TIMEOUT_PERCENTILE', 0.99)
+        self.multiplier = multiplier or getattr(settings, 'ZIBAL_ADAPTIVE_TIMEOUT_MULTIPLIER', 2.0)
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def current(self) -> float:
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.maximum
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return max(self.minimum, min(self.maximum, ordered[index] * self.multiplier))
+
+
+class RetryBudget:
+    """Cap retries at a share of calls per time window, shared through the cache."""
+
+    CALLS_KEY = 'billing:retry_budget:{name}:calls:{bucket}'
+    RETRIES_KEY = 'billing:retry_budget:{name}:retries:{bucket}'
+
+    def __init__(
+        self,
+        name: str,
+        ratio: Optional[float] = None,
+        min_retries: Optional[int] = None,
+        window: Optional[int] = None
+    ):
+        self.name = name
+        if ratio is None:
+            ratio = getattr(settings, 'ZIBAL_RETRY_BUDGET_RATIO', 0.2)
+        if min_retries is None:
+            min_retries = getattr(settings, 'ZIBAL_RETRY_BUDGET_MIN', 10)
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window or getattr(settings, 'ZIBAL_RETRY_BUDGET_WINDOW', 60)
+        self.cache = _cache()
+
+    def _key(self, template: str) -> str:
+        return template.format(name=self.name, bucket=int(time.time() // self.window))
+
+    def record_call(self) -> None:
+        _incr(self.cache, self._key(self.CALLS_KEY), self.window * 2)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; return False if it is exhausted."""
+        calls = self.cache.get(self._key(self.CALLS_KEY)) or 0
+        retries = _incr(self.cache, self._key(self.RETRIES_KEY), self.window * 2)
+        return retries <= max(self.min_retries, int(calls * self.ratio))
+
+
+class ResiliencePolicy:
+    """Breaker, adaptive timeout and retry budget for one gateway."""
+
+    def __init__(
+        self,
+        name: str,
+        max_timeout: float,
+        max_attempts: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 5.0
+    ):
+        self.breaker = CircuitBreaker(name)
+        self.timeouts = AdaptiveTimeout(maximum=max_timeout)
+        self.budget = RetryBudget(name)
+        self.max_attempts = max_attempts or getattr(settings, 'ZIBAL_RETRY_MAX_ATTEMPTS', 3)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def admit(self) -> str:
+        """Admit a call; raises :class:`CircuitOpenError` when failing fast."""
+        admitted_in = self.breaker.allow()
+        self.budget.record_call()
+        return admitted_in
+
+    def timeout(self, override: Optional[float] = None, admitted_in: str = CLOSED) -> float:
+        """Per-attempt timeout; a half-open probe gets the ceiling so a slow gateway can recover."""
+        if override:
+            return override
+        if admitted_in == HALF_OPEN:
+            return self.timeouts.maximum
+        return self.timeouts.current()
+
+    def on_success(self, admitted_in: str, latency: float) -> None:
+        self.timeouts.record(latency)
+        self.breaker.record_success(admitted_in)
+
+    def on_failure(
+        self,
+        admitted_in: str,
+        latency: Optional[float] = None,
+        timeout: Optional[float] = None
+    ) -> None:
+        """Record a failed attempt; a timed-out attempt is a latency sample at the timeout."""
+        if latency is not None and timeout and latency >= timeout:
+            self.timeouts.record(timeout)
+        self.breaker.record_failure(admitted_in)
+
+    def should_retry(self, admitted_in: str, attempt: int) -> bool:
+        """Retry only closed-circuit calls with attempts and budget left."""
+        if admitted_in != CLOSED or attempt >= self.max_attempts:
+            return False
+        if self.breaker.state != CLOSED:
+            return False
+        return self.budget.try_spend()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry ``attempt + 1``."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
@@ -0,0 +1,100 @@
+"""
+Cache for Zibal verify and inquiry results keyed by track_id.
+
+Results are stored in the Django cache (django-redis in deployments). Final
+results (paid or cancelled) are kept for ``ZIBAL_RESULT_CACHE_FINAL_TTL``;
+anything still pending only for ``ZIBAL_RESULT_CACHE_PENDING_TTL`` so the
+next lookup sees fresh gateway state. Hit/miss counters live in the same
+cache so they are shared by every worker.
+"""
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import zibal_client
+from .zibal_client import ZibalClient
+
+VERIFY = 'verify'
+INQUIRY = 'inquiry'
+
+
+class ZibalResultCache:
+    """Read-through cache for verify and inquiry results."""
+
+    RESULT_KEY = 'billing:zibal:{kind}:{track_id}'
+    COUNTER_KEY = 'billing:zibal:cache:{kind}:{counter}'
+
+    def __init__(self, alias: Optional[str] = None):
+        self.cache = caches[alias or getattr(settings, 'ZIBAL_RESULT_CACHE_ALIAS', 'default')]
+        self.final_ttl = getattr(settings, 'ZIBAL_RESULT_CACHE_FINAL_TTL', 24 * 60 * 60)
+        self.pending_ttl = getattr(settings, 'ZIBAL_RESULT_CACHE_PENDING_TTL', 30)
+
+    @staticmethod
+    def is_final(kind: str, result: Dict[str, Any]) -> bool:
+        """Return True if the gateway will not change this result any more."""
+        status_code = result.get('status')
+        if kind == VERIFY and result.get('success'):
+            return True
+        return status_code in (ZibalClient.STATUS_PAID, ZibalClient.STATUS_CANCELLED)
+
+    def get(self, kind: str, track_id: int) -> Optional[Dict[str, Any]]:
+        result = self.cache.get(self.RESULT_KEY.format(kind=kind, track_id=track_id))
+        self._incr(kind, 'hits' if result is not None else 'misses')
+        return result
+
+    def set(self, kind: str, track_id: int, result: Dict[str, Any]) -> None:
+        timeout = self.final_ttl if self.is_final(kind, result) else self.pending_ttl
+        self.cache.set(self.RESULT_KEY.format(kind=kind, track_id=track_id), result, timeout)
+
+    def delete(self, kind: str, track_id: int) -> None:
+        self.cache.delete(self.RESULT_KEY.format(kind=kind, track_id=track_id))
+
+    def fetch(
+        self,
+        kind: str,
+        track_id: int,
+        loader: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Return the cached result or call ``loader`` and cache what it returns."""
+        result = self.get(kind, track_id)
+        if result is None:
+            result = loader()
+            self.set(kind, track_id, result)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss counters per result kind."""
+        keys = {
+            (kind, counter): self.COUNTER_KEY.format(kind=kind, counter=counter)
+            for kind in (VERIFY, INQUIRY)
+            for counter in ('hits', 'misses')
+        }
+        values = self.cache.get_many(list(keys.values()))
+        return {
+            kind: {
+                counter: int(values.get(keys[(kind, counter)]) or 0)
+                for counter in ('hits', 'misses')
+            }
+            for kind in (VERIFY, INQUIRY)
+        }
+
+    def _incr(self, kind: str, counter: str) -> None:
+        key = self.COUNTER_KEY.format(kind=kind, counter=counter)
+        try:
+            self.cache.add(key, 0, timeout=None)
+            self.cache.incr(key)
+        except ValueError:  # pragma: no cover - evicted between add and incr
+            self.cache.set(key, 1, timeout=None)
+
+
+def cached_verify(track_id: int, client: Optional[ZibalClient] = None) -> Dict[str, Any]:
+    """Verify a payment, reusing a cached result for the same track_id."""
+    client = client or zibal_client.get_zibal_client()
+    return ZibalResultCache().fetch(VERIFY, track_id, lambda: client.verify_payment(track_id))
+
+
+def cached_inquiry(track_id: int, client: Optional[ZibalClient] = None) -> Dict[str, Any]:
+    """Inquire a payment, reusing a cached result for the same track_id."""
+    client = client or zibal_client.get_zibal_client()
+    return ZibalResultCache().fetch(INQUIRY, track_id, lambda: client.inquiry(track_id))
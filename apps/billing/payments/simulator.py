@@ -0,0 +1,344 @@
+"""
+In-process Zibal gateway simulator for load tests.
+
+:class:`ZibalSimulator` implements ``v1/request``, ``v1/verify`` and
+``v1/inquiry`` with the gateway's state transitions (pending -> paid or
+cancelled -> verified), sampled latency and injected server errors. It can
+be reached three ways:
+
+- :class:`SimulatorAdapter`, a ``requests`` transport adapter mounted on a
+  :class:`~.zibal_client.ZibalClient` session (:func:`install_simulator`);
+- :meth:`ZibalSimulator.httpx_transport` for :class:`~.zibal_client.AsyncZibalClient`;
+- the WSGI app (``python manage.py zibal_simulator``), with ``ZIBAL_API_BASE``
+  and ``ZIBAL_GATEWAY_BASE`` pointing at it. Its ``/start/<track_id>`` page
+  settles the payment and redirects to the callback URL like the real
+  gateway.
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+STATUS_PENDING = -1
+STATUS_CANCELLED = -2
+STATUS_PAID = 1
+
+RESULT_SUCCESS = 100
+RESULT_MERCHANT_NOT_FOUND = 102
+RESULT_INVALID_TRACK_ID = 103
+RESULT_INVALID_AMOUNT = 105
+RESULT_ALREADY_VERIFIED = 201
+RESULT_NOT_PAID = 202
+
+MIN_AMOUNT = 1000
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Latency distribution in seconds.
+
+    ``fixed`` always returns ``mean``; ``uniform`` samples
+    ``[mean - spread, mean + spread]``; ``lognormal`` has median ``mean`` and
+    shape ``spread`` (0.5 gives a p99 of about 3x the median).
+    """
+
+    distribution: str = 'fixed'
+    mean: float = 0.0
+    spread: float = 0.0
+
+    DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+    def __post_init__(self):
+        if self.distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f'Unknown latency distribution: {self.distribution}')
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyProfile':
+        """Parse ``distribution[:mean[:spread]]``, e.g. ``lognormal:0.08:0.5``."""
+        parts = spec.split(':')
+        values = [float(value) for value in parts[1:3]]
+        return cls(parts[0], *values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == 'uniform':
+            return max(0.0, rng.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.distribution == 'lognormal' and self.mean > 0:
+            return rng.lognormvariate(0, self.spread) * self.mean
+        return self.mean
+
+
+@dataclass
+class SimulatedPayment:
+    track_id: int
+    order_id: str
+    amount: int
+    callback_url: str
+    status: int = STATUS_PENDING
+    verified: bool = False
+    ref_number: Optional[int] = None
+    paid_at: str = ''
+
+
+class ZibalSimulator:
+    """
+    Thread-safe in-memory gateway.
+
+    Args:
+        latency: Per-call latency distribution
+        error_rate: Share of calls answered with HTTP 500
+        pay_rate: Share of settled payments that succeed
+        track_id_start: First track_id (default: random 9-digit number)
+        seed: Seed for latency, errors and outcomes, for repeatable runs
+    """
+
+    def __init__(
+        self,
+        latency: Optional[LatencyProfile] = None,
+        error_rate: float = 0.0,
+        pay_rate: float = 1.0,
+        track_id_start: Optional[int] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency or LatencyProfile()
+        self.error_rate = error_rate
+        self.pay_rate = pay_rate
+        self._rng = random.Random(seed)
+        self._track_ids = itertools.count(track_id_start or self._rng.randint(10 ** 8, 9 * 10 ** 8))
+        self._payments: Dict[int, SimulatedPayment] = {}
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def next_delay(self) -> float:
+        with self._lock:
+            return self.latency.sample(self._rng)
+
+    def _chance(self, rate: float) -> bool:
+        with self._lock:
+            return self._rng.random() < rate
+
+    def get_payment(self, track_id: int) -> Optional[SimulatedPayment]:
+        return self._payments.get(track_id)
+
+    def handle(self, endpoint: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Answer one API call without latency.
+
+        Returns:
+            HTTP status code and JSON body
+        """
+        endpoint = endpoint.strip('/')
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        if self.error_rate and self._chance(self.error_rate):
+            return 500, {'message': 'simulated gateway error'}
+
+        handlers = {
+            'v1/request': self._request,
+            'v1/verify': self._verify,
+            'v1/inquiry': self._inquiry,
+        }
+        if endpoint not in handlers:
+            return 404, {'message': 'not found'}
+        if not payload.get('merchant'):
+            return 200, {'result': RESULT_MERCHANT_NOT_FOUND, 'message': 'merchant not found'}
+        return 200, handlers[endpoint](payload)
+
+    def _request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        amount = payload.get('amount') or 0
+        if amount < MIN_AMOUNT:
+            return {'result': RESULT_INVALID_AMOUNT, 'message': 'invalid amount', 'trackId': 0}
+
+        with self._lock:
+            track_id = next(self._track_ids)
+            self._payments[track_id] = SimulatedPayment(
+                track_id=track_id,
+                order_id=payload.get('orderId', ''),
+                amount=amount,
+                callback_url=payload.get('callbackUrl', ''),
+            )
+        return {'trackId': track_id, 'result': RESULT_SUCCESS, 'message': 'success'}
+
+    def _verify(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            payment = self._payments.get(payload.get('trackId'))
+            if payment is None:
+                return {'result': RESULT_INVALID_TRACK_ID, 'amount': 0, 'status': STATUS_PENDING,
+                        'message': 'invalid trackId'}
+            if payment.status != STATUS_PAID:
+                return {'result': RESULT_NOT_PAID, 'amount': payment.amount,
+                        'status': payment.status, 'orderId': payment.order_id,
+                        'message': 'not paid'}
+
+            result = RESULT_ALREADY_VERIFIED if payment.verified else RESULT_SUCCESS
+            payment.verified = True
+            return {
+                'result': result,
+                'amount': payment.amount,
+                'status': payment.status,
+                'paidAt': payment.paid_at,
+                'refNumber': payment.ref_number,
+                'cardNumber': '6219-86**-****-1234',
+                'orderId': payment.order_id,
+                'message': 'success',
+            }
+
+    def _inquiry(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        payment = self._payments.get(payload.get('trackId'))
+        if payment is None:
+            return {'result': RESULT_INVALID_TRACK_ID, 'message': 'invalid trackId'}
+        return {
+            'result': RESULT_SUCCESS,
+            'status': payment.status,
+            'amount': payment.amount,
+            'orderId': payment.order_id,
+            'refNumber': payment.ref_number,
+            'verified': payment.verified,
+            'message': 'success',
+        }
+
+    def settle(self, track_id: int, paid: Optional[bool] = None) -> Optional[str]:
+        """
+        Finish a pending payment as the user would on the gateway page.
+
+        Args:
+            track_id: Payment to settle
+            paid: Outcome (default: drawn from ``pay_rate``)
+
+        Returns:
+            Callback URL the gateway would redirect to, or None if unknown
+        """
+        if paid is None:
+            paid = self._chance(self.pay_rate)
+
+        with self._lock:
+            payment = self._payments.get(track_id)
+            if payment is None:
+                return None
+            if payment.status == STATUS_PENDING:
+                payment.status = STATUS_PAID if paid else STATUS_CANCELLED
+                if paid:
+                    payment.ref_number = self._rng.randint(10 ** 8, 10 ** 9 - 1)
+                    payment.paid_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+            query = urlencode({
+                'success': int(payment.status == STATUS_PAID),
+                'trackId': payment.track_id,
+                'orderId': payment.order_id,
+                'status': payment.status,
+            })
+        separator = '&' if '?' in payment.callback_url else '?'
+        return f'{payment.callback_url}{separator}{query}'
+
+    def settle_pending(self) -> int:
+        """Settle every pending payment; return how many were settled."""
+        pending = [track_id for track_id, payment in list(self._payments.items())
+                   if payment.status == STATUS_PENDING]
+        for track_id in pending:
+            self.settle(track_id)
+        return len(pending)
+
+    def httpx_transport(self) -> httpx.MockTransport:
+        """Transport for :class:`~.zibal_client.AsyncZibalClient`."""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(self.next_delay())
+            status_code, body = self.handle(request.url.path, json.loads(request.content or b'{}'))
+            return httpx.Response(status_code, json=body)
+
+        return httpx.MockTransport(handler)
+
+    def __call__(self, environ, start_response):
+        """WSGI entry point."""
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+
+        if method == 'GET' and path.startswith('/start/'):
+            query = parse_qs(environ.get('QUERY_STRING', ''))
+            paid = None
+            if 'paid' in query:
+                paid = query['paid'][0] not in ('0', 'false')
+            try:
+                location = self.settle(int(path.rsplit('/', 1)[-1]), paid=paid)
+            except ValueError:
+                location = None
+            if location is None:
+                return self._wsgi_json(start_response, 404, {'message': 'not found'})
+            start_response('302 Found', [('Location', location)])
+            return [b'']
+
+        if method != 'POST':
+            return self._wsgi_json(start_response, 405, {'message': 'method not allowed'})
+
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        try:
+            payload = json.loads(environ['wsgi.input'].read(length) or b'{}')
+        except ValueError:
+            return self._wsgi_json(start_response, 400, {'message': 'invalid json'})
+
+        time.sleep(self.next_delay())
+        status_code, body = self.handle(path, payload)
+        return self._wsgi_json(start_response, status_code, body)
+
+    @staticmethod
+    def _wsgi_json(start_response, status_code: int, body: Dict[str, Any]):
+        content = json.dumps(body).encode('utf-8')
+        start_response(f'{status_code} {HTTPStatus(status_code).phrase}', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(content))),
+        ])
+        return [content]
+
+
+class SimulatorAdapter(BaseAdapter):
+    """
+    ``requests`` transport that answers from a :class:`ZibalSimulator`.
+
+    A sampled latency longer than the request timeout raises ``ReadTimeout``
+    after waiting out the timeout, like a slow gateway would.
+    """
+
+    def __init__(self, simulator: ZibalSimulator):
+        super().__init__()
+        self.simulator = simulator
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        delay = self.simulator.next_delay()
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout is not None and delay > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(
+                f'Simulated read timeout after {read_timeout}s', request=request
+            )
+        time.sleep(delay)
+
+        status_code, body = self.simulator.handle(
+            urlsplit(request.url).path, json.loads(request.body or b'{}')
+        )
+
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(body).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json'
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install_simulator(client, simulator: ZibalSimulator) -> ZibalSimulator:
+    """Route a :class:`~.zibal_client.ZibalClient`'s API calls to ``simulator``."""
+    client.session.mount(client.config.api_base, SimulatorAdapter(simulator))
+    return simulator
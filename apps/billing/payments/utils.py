@@ -1,19 +1,134 @@
 """
 Payment utilities for order ID generation and helpers.
 """
+import os
+import secrets
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 
+from django.conf import settings
 from django.utils import timezone
+from django.utils.module_loading import import_string
 
 
-def generate_order_id(prefix: str = 'AP', user_id: Optional[int] = None) -> str:
+class RandomOrderIdGenerator:
     """
-    Generate unique order ID for payment transactions.
+    Legacy generator: second-resolution timestamp plus 6 random hex chars.
     
     Format: {prefix}-{timestamp}-{user_id}-{random}
     Example: AP-20251005142530-123-abc123
+    """
+
+    def __call__(self, prefix: str = 'AP', user_id: Optional[int] = None) -> str:
+        timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+        random_part = uuid.uuid4().hex[:6]
+
+        if user_id:
+            return f"{prefix}-{timestamp}-{user_id}-{random_part}"
+        else:
+            return f"{prefix}-{timestamp}-{random_part}"
+
+
+class MonotonicOrderIdGenerator:
+    """
+    Time-ordered, collision-resistant order IDs (ULID/Snowflake-like).
+
+    The ID body is 17 Crockford base32 characters: a 50-bit millisecond
+    timestamp, a 20-bit node id picked at random per process (re-picked
+    after fork) and a 15-bit per-millisecond sequence. Bodies sort in
+    creation order, so inserts land at the right edge of the ``order_id``
+    B-tree. One process can issue 32768 IDs per millisecond; past that it
+    stamps IDs with the next millisecond without sleeping, running ahead of
+    the clock until the clock catches up. IDs only use ``[0-9A-Z-]`` and stay well under
+    Zibal's orderId length limit.
+
+    Format: {prefix}-{body}[-{user_id}]
+    Example: AP-01JA8Z3K7Q4M2X000-123
+    """
+    ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+    TIMESTAMP_CHARS = 10
+    NODE_CHARS = 4
+    SEQUENCE_CHARS = 3
+    SEQUENCE_LIMIT = 32 ** SEQUENCE_CHARS
+
+    def __init__(self, node: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._fixed_node = node
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        node = self._fixed_node
+        if node is None:
+            node = secrets.randbits(5 * self.NODE_CHARS)
+        self._node = self._encode(node, self.NODE_CHARS)
+        self._last_ms = 0
+        self._sequence = 0
+
+    @classmethod
+    def _encode(cls, value: int, width: int) -> str:
+        chars = []
+        for _ in range(width):
+            value, index = divmod(value, 32)
+            chars.append(cls.ALPHABET[index])
+        return ''.join(reversed(chars))
+
+    def _next(self) -> Tuple[int, int]:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            # Never go backwards, even if the wall clock does
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._sequence += 1
+                if self._sequence >= self.SEQUENCE_LIMIT:
+                    # Sequence exhausted: borrow the next millisecond
+                    now_ms += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return now_ms, self._sequence
+
+    def __call__(self, prefix: str = 'AP', user_id: Optional[int] = None) -> str:
+        now_ms, sequence = self._next()
+        body = (
+            self._encode(now_ms, self.TIMESTAMP_CHARS)
+            + self._node
+            + self._encode(sequence, self.SEQUENCE_CHARS)
+        )
+
+        if user_id:
+            return f"{prefix}-{body}-{user_id}"
+        else:
+            return f"{prefix}-{body}"
+
+
+_order_id_generator = None
+
+
+def get_order_id_generator():
+    """Return the generator configured by ``BILLING_ORDER_ID_GENERATOR``."""
+    global _order_id_generator
+    if _order_id_generator is None:
+        path = getattr(
+            settings,
+            'BILLING_ORDER_ID_GENERATOR',
+            'apps.billing.payments.utils.MonotonicOrderIdGenerator'
+        )
+        _order_id_generator = import_string(path)()
+    return _order_id_generator
+
+
+def generate_order_id(prefix: str = 'AP', user_id: Optional[int] = None) -> str:
+    """
+    Generate unique order ID for payment transactions.
+
+    Delegates to the generator configured by ``BILLING_ORDER_ID_GENERATOR``
+    (default: :class:`MonotonicOrderIdGenerator`).
     
     Args:
         prefix: Order ID prefix (default: 'AP' for Apatye)
@@ -22,13 +137,7 @@ def generate_order_id(prefix: str = 'AP', user_id: Optional[int] = None) -> str:
     Returns:
         Unique order ID string
     """
-    timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-    random_part = uuid.uuid4().hex[:6]
-    
-    if user_id:
-        return f"{prefix}-{timestamp}-{user_id}-{random_part}"
-    else:
-        return f"{prefix}-{timestamp}-{random_part}"
+    return get_order_id_generator()(prefix=prefix, user_id=user_id)
 
 
 def format_amount_display(amount_rials: int) -> str:
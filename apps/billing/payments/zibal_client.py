@@ -1,15 +1,34 @@
 """
 Zibal payment gateway client implementation.
+
+Two clients share the same request/verify/inquiry surface:
+
+- :class:`ZibalClient` is synchronous (``requests``) and is shared by every
+  worker thread through :func:`get_zibal_client`.
+- :class:`AsyncZibalClient` is asyncio-native (``httpx``) for high fan-out
+  callers. It is bound to the event loop that uses it, so create one per loop
+  (``async with AsyncZibalClient() as client: ...``).
+
+Both keep HTTP/1.1 connections alive in a bounded per-host pool sized from
+``ZIBAL_POOL_MAXSIZE`` so concurrent calls reuse TCP+TLS connections, and
+both go through the same :class:`~.resilience.ResiliencePolicy`: a circuit
+breaker shared by all workers, latency-driven per-attempt timeouts and a
+retry budget, so calls fail fast while the gateway is down.
 """
+import asyncio
 import logging
+import time
 from typing import Dict, Optional, Any
 from decimal import Decimal
 
+import httpx
 import requests
 from django.conf import settings
-from tenacity import retry, stop_after_attempt, wait_exponential
+from requests.adapters import HTTPAdapter
 from pydantic import BaseModel, Field, ValidationError
 
+from .resilience import CircuitOpenError, ResiliencePolicy
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,6 +46,11 @@ class ZibalConfig:
         self.timeout = getattr(settings, 'ZIBAL_TIMEOUT', 10)
         self.sandbox = getattr(settings, 'ZIBAL_SANDBOX', True)
 
+        # Connection pool (per host; all calls go to a single API host)
+        self.pool_maxsize = getattr(settings, 'ZIBAL_POOL_MAXSIZE', 20)
+        self.pool_block = getattr(settings, 'ZIBAL_POOL_BLOCK', True)
+        self.keepalive_expiry = getattr(settings, 'ZIBAL_KEEPALIVE_EXPIRY', 30)
+
         # For dev/test, use 'zibal' as merchant
         if self.sandbox and self.merchant_id != 'zibal':
             logger.warning("Sandbox mode enabled but merchant is not 'zibal'. Using 'zibal' for testing.")
@@ -58,11 +82,21 @@ class ZibalError(Exception):
     pass
 
 
-class ZibalClient:
+class ZibalCircuitOpenError(ZibalError):
+    """Raised without calling the gateway while the circuit is open."""
+    pass
+
+
+class ZibalClientError(ZibalError):
+    """Raised when the gateway rejects a request with a 4xx status; never retried."""
+    pass
+
+
+class BaseZibalClient:
     """
-    Zibal payment gateway client.
+    Shared payload building and response parsing for Zibal clients.
 
-    Handles payment request, verification, and inquiry operations.
+    Subclasses implement ``_make_request`` for their transport.
     """
 
     # Zibal result codes
@@ -77,30 +111,204 @@ class ZibalClient:
 
     def __init__(self):
         self.config = ZibalConfig()
+        self.resilience = ResiliencePolicy('zibal', max_timeout=self.config.timeout)
+
+    def _admit(self, endpoint: str) -> str:
+        try:
+            return self.resilience.admit()
+        except CircuitOpenError:
+            logger.warning("Zibal circuit open, rejecting %s", endpoint)
+            raise ZibalCircuitOpenError("Gateway unavailable: circuit open")
+
+    def _raise_for_client_error(self, endpoint: str, response) -> None:
+        """Raise :class:`ZibalClientError` if ``response`` has a 4xx status."""
+        if response is not None and 400 <= response.status_code < 500:
+            logger.error(
+                "Zibal rejected request to %s with HTTP %s", endpoint, response.status_code
+            )
+            raise ZibalClientError(f"Gateway rejected request: HTTP {response.status_code}")
+
+    def _build_request_payload(
+        self,
+        amount: int,
+        order_id: str,
+        callback_url: str,
+        mobile: Optional[str] = None,
+        description: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        if amount < 1000:
+            raise ZibalError("Amount must be at least 1000 Rials")
+
+        payload = {
+            'merchant': self.config.merchant_id,
+            'amount': amount,
+            'orderId': order_id,
+            'callbackUrl': callback_url,
+        }
+
+        if mobile:
+            payload['mobile'] = mobile
+        if description:
+            payload['description'] = description
+
+        # Add optional fields
+        payload.update(kwargs)
+        return payload
+
+    def _build_track_payload(self, track_id: int) -> Dict[str, Any]:
+        return {
+            'merchant': self.config.merchant_id,
+            'trackId': track_id,
+        }
+
+    def _parse_request_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            # Validate response
+            validated = ZibalRequestResponse(**result)
+        except ValidationError as e:
+            logger.error("Invalid Zibal response format", exc_info=True)
+            raise ZibalError(f"Invalid response: {str(e)}")
+
+        return {
+            'track_id': validated.trackId,
+            'result': validated.result,
+            'message': validated.message,
+            'success': validated.result == self.RESULT_SUCCESS
+        }
+
+    def _parse_verify_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            validated = ZibalVerifyResponse(**result)
+        except ValidationError as e:
+            logger.error("Invalid Zibal verification response", exc_info=True)
+            raise ZibalError(f"Invalid response: {str(e)}")
+
+        return {
+            'result': validated.result,
+            'amount': validated.amount,
+            'status': validated.status,
+            'paid_at': validated.paidAt,
+            'ref_number': str(validated.refNumber) if validated.refNumber else None,
+            'card_number': validated.cardNumber,
+            'description': validated.description,
+            'message': validated.message,
+            # An already-verified payment (201) is still a successful payment
+            'success': validated.result in (self.RESULT_SUCCESS, self.RESULT_ALREADY_PAID),
+            'is_duplicate': validated.result == self.RESULT_ALREADY_PAID,
+        }
+
+    def _check_inquiry_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if result.get('result') != self.RESULT_SUCCESS:
+            raise ZibalError(f"Inquiry failed: {self.get_result_message(result.get('result'))}")
+        return result
+
+    def create_start_url(self, track_id: int) -> str:
+        """
+        Create payment start URL for redirecting user to gateway.
+
+        Args:
+            track_id: Tracking ID from request_payment
+
+        Returns:
+            Full URL to redirect user to
+        """
+        return f"{self.config.gateway_base}/start/{track_id}"
+
+    @staticmethod
+    def get_result_message(result_code: int) -> str:
+        """Return Persian message for result codes."""
+
+        messages = {
+            100: 'درخواست با موفقیت انجام شد.',
+            102: 'پرداختی یافت نشد.',
+            103: 'شناسه پرداخت نامعتبر است.',
+            104: 'پرداخت نامعتبر است.',
+            105: 'مبلغ پرداخت نامعتبر است.',
+            201: 'این پرداخت قبلاً تایید شده است.',
+            202: 'سفارش پیدا نشد.',
+            203: 'قبلاً درخواست تایید شده است.',
+            205: 'پرداخت لغو شده است.',
+        }
+        return messages.get(result_code, 'خطای ناشناخته رخ داده است.')
+
+
+class ZibalClient(BaseZibalClient):
+    """
+    Zibal payment gateway client.
+
+    Handles payment request, verification, and inquiry operations.
+    """
+
+    def __init__(self):
+        super().__init__()
         self.session = requests.Session()
         self.session.headers.update({
             'Content-Type': 'application/json',
         })
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=5),
-        reraise=True
-    )
-    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Size the keep-alive pool for concurrent worker threads
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.config.pool_maxsize,
+            pool_block=self.config.pool_block,
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _make_request(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Make HTTP request to Zibal API with retry logic.
 
         Args:
             endpoint: API endpoint path
             data: Request payload
+            timeout: Per-attempt timeout in seconds (default: adaptive,
+                at most ZIBAL_TIMEOUT)
 
         Returns:
             Response JSON data
 
         Raises:
+            ZibalCircuitOpenError: If the circuit is open
+            ZibalClientError: If the gateway rejects the request with a 4xx
             ZibalError: If request fails
         """
+        policy = self.resilience
+        admitted_in = self._admit(endpoint)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            attempt_timeout = policy.timeout(timeout, admitted_in)
+            try:
+                result = self._send(endpoint, data, timeout=attempt_timeout)
+            except ZibalClientError:
+                # The gateway answered, so the breaker sees a healthy call
+                policy.on_success(admitted_in, time.monotonic() - started)
+                raise
+            except ZibalError:
+                policy.on_failure(admitted_in, time.monotonic() - started, attempt_timeout)
+                if not policy.should_retry(admitted_in, attempt):
+                    raise
+                time.sleep(policy.backoff(attempt))
+                continue
+
+            policy.on_success(admitted_in, time.monotonic() - started)
+            return result
+
+    def _send(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: float
+    ) -> Dict[str, Any]:
         url = f"{self.config.api_base}/{endpoint}"
 
         logger.info(
@@ -114,11 +322,7 @@ class ZibalClient:
         )
 
         try:
-            response = self.session.post(
-                url,
-                json=data,
-                timeout=self.config.timeout
-            )
+            response = self.session.post(url, json=data, timeout=timeout)
             response.raise_for_status()
 
             result = response.json()
@@ -137,6 +341,10 @@ class ZibalClient:
         except requests.exceptions.Timeout as e:
             logger.error("Zibal timeout on %s", endpoint, exc_info=True)
             raise ZibalError(f"Gateway timeout: {str(e)}")
+        except requests.exceptions.HTTPError as e:
+            self._raise_for_client_error(endpoint, e.response)
+            logger.error("Zibal request error on %s", endpoint, exc_info=True)
+            raise ZibalError(f"Gateway error: {str(e)}")
         except requests.exceptions.RequestException as e:
             logger.error("Zibal request error on %s", endpoint, exc_info=True)
             raise ZibalError(f"Gateway error: {str(e)}")
@@ -151,6 +359,7 @@ class ZibalClient:
         callback_url: str,
         mobile: Optional[str] = None,
         description: Optional[str] = None,
+        timeout: Optional[float] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
@@ -162,6 +371,7 @@ class ZibalClient:
             callback_url: URL to redirect after payment
             mobile: User mobile number (optional)
             description: Payment description (optional)
+            timeout: Per-attempt timeout in seconds (optional)
             **kwargs: Additional parameters
 
         Returns:
@@ -173,124 +383,224 @@ class ZibalClient:
         Raises:
             ZibalError: If request fails
         """
-        if amount < 1000:
-            raise ZibalError("Amount must be at least 1000 Rials")
+        payload = self._build_request_payload(
+            amount, order_id, callback_url, mobile=mobile, description=description, **kwargs
+        )
+        result = self._make_request('v1/request', payload, timeout=timeout)
+        return self._parse_request_response(result)
 
-        payload = {
-            'merchant': self.config.merchant_id,
-            'amount': amount,
-            'orderId': order_id,
-            'callbackUrl': callback_url,
-        }
+    def verify_payment(self, track_id: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Verify a payment with Zibal.
 
-        if mobile:
-            payload['mobile'] = mobile
-        if description:
-            payload['description'] = description
+        This MUST be called after receiving callback to confirm payment.
+        Only the verify response is trustworthy.
 
-        # Add optional fields
-        payload.update(kwargs)
+        Args:
+            track_id: Tracking ID from request_payment
+            timeout: Per-attempt timeout in seconds (optional)
 
-        try:
-            result = self._make_request('v1/request', payload)
+        Returns:
+            Dictionary containing verification result
+        """
+        result = self._make_request(
+            'v1/verify', self._build_track_payload(track_id), timeout=timeout
+        )
+        return self._parse_verify_response(result)
 
-            # Validate response
-            validated = ZibalRequestResponse(**result)
+    def inquiry(self, track_id: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Perform payment inquiry.
+        """
+        result = self._make_request(
+            'v1/inquiry', self._build_track_payload(track_id), timeout=timeout
+        )
+        return self._check_inquiry_response(result)
 
-            return {
-                'track_id': validated.trackId,
-                'result': validated.result,
-                'message': validated.message,
-                'success': validated.result == self.RESULT_SUCCESS
-            }
 
-        except ValidationError as e:
-            logger.error("Invalid Zibal response format", exc_info=True)
-            raise ZibalError(f"Invalid response: {str(e)}")
+class AsyncZibalClient(BaseZibalClient):
+    """
+    Asyncio-native Zibal client with a keep-alive connection pool.
 
-    def create_start_url(self, track_id: int) -> str:
-        """
-        Create payment start URL for redirecting user to gateway.
+    Usage:
+        async with AsyncZibalClient() as client:
+            results = await asyncio.gather(*(client.inquiry(t) for t in track_ids))
 
-        Args:
-            track_id: Tracking ID from request_payment
+    Every call accepts an optional ``deadline`` (seconds) bounding the whole
+    call including retries, on top of the per-attempt ``timeout``.
+    """
 
-        Returns:
-            Full URL to redirect user to
-        """
-        return f"{self.config.gateway_base}/start/{track_id}"
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        super().__init__()
+        max_connections = max_connections or self.config.pool_maxsize
+        self.client = httpx.AsyncClient(
+            base_url=self.config.api_base,
+            transport=transport,
+            headers={'Content-Type': 'application/json'},
+            timeout=self.config.timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=self.config.keepalive_expiry,
+            ),
+        )
 
-    def verify_payment(self, track_id: int) -> Dict[str, Any]:
-        """
-        Verify a payment with Zibal.
+    async def __aenter__(self):
+        return self
 
-        This MUST be called after receiving callback to confirm payment.
-        Only the verify response is trustworthy.
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
-        Args:
-            track_id: Tracking ID from request_payment
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        await self.client.aclose()
 
-        Returns:
-            Dictionary containing verification result
-        """
-        payload = {
-            'merchant': self.config.merchant_id,
-            'trackId': track_id,
-        }
+    async def _send(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: float
+    ) -> Dict[str, Any]:
+        logger.info(
+            "Zibal request to %s",
+            endpoint,
+            extra={
+                'endpoint': endpoint,
+                'merchant': self.config.merchant_id,
+                'sandbox': self.config.sandbox,
+            },
+        )
 
         try:
-            result = self._make_request('v1/verify', payload)
-            validated = ZibalVerifyResponse(**result)
+            response = await self.client.post(f"/{endpoint}", json=data, timeout=timeout)
+            response.raise_for_status()
 
-            return {
-                'result': validated.result,
-                'amount': validated.amount,
-                'status': validated.status,
-                'paid_at': validated.paidAt,
-                'ref_number': str(validated.refNumber) if validated.refNumber else None,
-                'card_number': validated.cardNumber,
-                'description': validated.description,
-                'message': validated.message,
-                'success': validated.result == self.RESULT_SUCCESS,
-                'is_duplicate': validated.result == self.RESULT_ALREADY_PAID,
-            }
+            result = response.json()
+            logger.info(
+                "Zibal response from %s",
+                endpoint,
+                extra={
+                    'endpoint': endpoint,
+                    'result': result.get('result'),
+                    'gateway_message': result.get('message', ''),
+                },
+            )
 
-        except ValidationError as e:
-            logger.error("Invalid Zibal verification response", exc_info=True)
-            raise ZibalError(f"Invalid response: {str(e)}")
+            return result
 
-    def inquiry(self, track_id: int) -> Dict[str, Any]:
-        """
-        Perform payment inquiry.
+        except httpx.TimeoutException as e:
+            logger.error("Zibal timeout on %s", endpoint, exc_info=True)
+            raise ZibalError(f"Gateway timeout: {str(e)}")
+        except httpx.HTTPStatusError as e:
+            self._raise_for_client_error(endpoint, e.response)
+            logger.error("Zibal request error on %s", endpoint, exc_info=True)
+            raise ZibalError(f"Gateway error: {str(e)}")
+        except httpx.HTTPError as e:
+            logger.error("Zibal request error on %s", endpoint, exc_info=True)
+            raise ZibalError(f"Gateway error: {str(e)}")
+        except Exception as e:
+            logger.error("Unexpected error on %s", endpoint, exc_info=True)
+            raise ZibalError(f"Unexpected error: {str(e)}")
+
+    async def _send_with_retries(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: Optional[float]
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`ZibalClient._make_request`'s retry loop."""
+        policy = self.resilience
+        admitted_in = self._admit(endpoint)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            attempt_timeout = policy.timeout(timeout, admitted_in)
+            try:
+                result = await self._send(endpoint, data, timeout=attempt_timeout)
+            except ZibalClientError:
+                # The gateway answered, so the breaker sees a healthy call
+                policy.on_success(admitted_in, time.monotonic() - started)
+                raise
+            except ZibalError:
+                policy.on_failure(admitted_in, time.monotonic() - started, attempt_timeout)
+                if not policy.should_retry(admitted_in, attempt):
+                    raise
+                await asyncio.sleep(policy.backoff(attempt))
+                continue
+
+            policy.on_success(admitted_in, time.monotonic() - started)
+            return result
+
+    async def _make_request(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
-        payload = {
-            'merchant': self.config.merchant_id,
-            'trackId': track_id,
-        }
+        Make HTTP request to Zibal API with retry logic and an overall deadline.
 
-        result = self._make_request('v1/inquiry', payload)
+        Raises:
+            ZibalClientError: If the gateway rejects the request with a 4xx
+            ZibalError: If request fails or the deadline passes
+        """
+        try:
+            return await asyncio.wait_for(
+                self._send_with_retries(endpoint, data, timeout), deadline
+            )
+        except asyncio.TimeoutError:
+            logger.error("Zibal deadline exceeded on %s", endpoint)
+            raise ZibalError(f"Gateway timeout: deadline of {deadline}s exceeded")
 
-        if result.get('result') != self.RESULT_SUCCESS:
-            raise ZibalError(f"Inquiry failed: {self.get_result_message(result.get('result'))}")
+    async def request_payment(
+        self,
+        amount: int,
+        order_id: str,
+        callback_url: str,
+        mobile: Optional[str] = None,
+        description: Optional[str] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Request a new payment from Zibal. See :meth:`ZibalClient.request_payment`."""
+        payload = self._build_request_payload(
+            amount, order_id, callback_url, mobile=mobile, description=description, **kwargs
+        )
+        result = await self._make_request('v1/request', payload, timeout=timeout, deadline=deadline)
+        return self._parse_request_response(result)
 
-        return result
+    async def verify_payment(
+        self,
+        track_id: int,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Verify a payment with Zibal. See :meth:`ZibalClient.verify_payment`."""
+        result = await self._make_request(
+            'v1/verify', self._build_track_payload(track_id), timeout=timeout, deadline=deadline
+        )
+        return self._parse_verify_response(result)
 
-    @staticmethod
-    def get_result_message(result_code: int) -> str:
-        """Return Persian message for result codes."""
+    async def inquiry(
+        self,
+        track_id: int,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Perform payment inquiry. See :meth:`ZibalClient.inquiry`."""
+        result = await self._make_request(
+            'v1/inquiry', self._build_track_payload(track_id), timeout=timeout, deadline=deadline
+        )
+        return self._check_inquiry_response(result)
 
-        messages = {
-            100: 'درخواست با موفقیت انجام شد.',
-            102: 'پرداختی یافت نشد.',
-            103: 'شناسه پرداخت نامعتبر است.',
-            104: 'پرداخت نامعتبر است.',
-            105: 'مبلغ پرداخت نامعتبر است.',
-            201: 'این پرداخت قبلاً تایید شده است.',
-            202: 'سفارش پیدا نشد.',
-            203: 'قبلاً درخواست تایید شده است.',
-            205: 'پرداخت لغو شده است.',
-        }
-        return messages.get(result_code, 'خطای ناشناخته رخ داده است.')
 
 _zibal_client_instance = None
 
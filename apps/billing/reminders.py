@@ -0,0 +1,134 @@
+"""
+Subscription expiry reminders.
+
+Each cohort (7 days and 1 day before expiry) is a range query on
+``(status, expires_at)`` walked in id-ordered chunks, so memory stays bounded
+however many subscriptions expire on a day. Every chunk locks its
+subscriptions, is deduped against
+:class:`~apps.billing.models.SubscriptionReminder` under that lock, recorded
+together with its notifications in one transaction, and then handed to the
+batched SMS sender. Overlapping runs therefore never notify or text a user
+twice: on PostgreSQL a run skips rows another run holds, elsewhere runs are
+serialized.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.notifications.models import Notification
+from apps.notifications.services import send_bulk_notifications
+from apps.notifications.sms import BatchSMSSender, SMSError
+
+from .models import Subscription, SubscriptionReminder
+
+logger = logging.getLogger(__name__)
+
+ReminderKind = SubscriptionReminder.ReminderKind
+
+# Reminder kind -> (days before expiry, message)
+REMINDER_COHORTS = {
+    ReminderKind.SEVEN_DAYS: (7, 'اشتراک پلن تجاری شما ۷ روز دیگر به پایان می‌رسد.'),
+    ReminderKind.ONE_DAY: (1, 'اشتراک پلن تجاری شما فردا به پایان می‌رسد.'),
+}
+REMINDER_TITLE = 'یادآوری تمدید اشتراک'
+
+
+def cohort_chunks(kind: str, now, chunk_size: int) -> Iterator[List[Dict]]:
+    """Yield id-ordered chunks of active subscriptions in a reminder cohort."""
+    days, _ = REMINDER_COHORTS[kind]
+    window_end = now + timedelta(days=days)
+    window_start = window_end - timedelta(days=1)
+
+    queryset = Subscription.objects.filter(
+        status=Subscription.SubscriptionStatus.ACTIVE,
+        expires_at__gte=window_start,
+        expires_at__lt=window_end
+    ).order_by('id').values('id', 'user_id', 'user__mobile')
+
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]['id']
+
+
+def _lock_chunk(subscription_ids: List[int]) -> List[int]:
+    """Lock a chunk's subscriptions and return the ids this run now owns."""
+    queryset = Subscription.objects.filter(id__in=subscription_ids)
+    if connection.features.has_select_for_update_skip_locked:
+        # Rows another run is reminding right now are left to that run
+        return list(queryset.select_for_update(skip_locked=True).values_list('id', flat=True))
+    if connection.vendor == 'sqlite':
+        # A write takes SQLite's database lock, serializing overlapping runs
+        queryset.update(status=F('status'))
+        return subscription_ids
+    return list(queryset.select_for_update().values_list('id', flat=True))
+
+
+def remind_chunk(kind: str, chunk: List[Dict], now) -> List[Dict]:
+    """Record reminders and notifications for a chunk; return the new rows."""
+    _, message = REMINDER_COHORTS[kind]
+    with transaction.atomic():
+        locked = _lock_chunk([row['id'] for row in chunk])
+        already_sent = set(
+            SubscriptionReminder.objects.filter(
+                kind=kind,
+                subscription_id__in=locked
+            ).values_list('subscription_id', flat=True)
+        )
+        locked = set(locked) - already_sent
+        rows = [row for row in chunk if row['id'] in locked]
+        if not rows:
+            return []
+
+        SubscriptionReminder.objects.bulk_create(
+            [
+                SubscriptionReminder(subscription_id=row['id'], kind=kind, sent_at=now)
+                for row in rows
+            ]
+        )
+        send_bulk_notifications(
+            recipient_ids=[row['user_id'] for row in rows],
+            title=REMINDER_TITLE,
+            message=message,
+            notification_type=Notification.NotificationType.REMINDER
+        )
+    return rows
+
+
+def send_expiry_reminders(
+    now=None,
+    chunk_size: Optional[int] = None,
+    sms_sender: Optional[BatchSMSSender] = None
+) -> Dict[str, int]:
+    """
+    Send 7-day and 1-day expiry reminders that have not been sent yet.
+
+    Returns:
+        Number of reminders sent per cohort
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'BILLING_REMINDER_CHUNK_SIZE', 1000)
+    sms_sender = sms_sender or BatchSMSSender()
+    counts = {}
+
+    for kind in REMINDER_COHORTS:
+        _, message = REMINDER_COHORTS[kind]
+        counts[kind.value] = 0
+        for chunk in cohort_chunks(kind, now, chunk_size):
+            rows = remind_chunk(kind, chunk, now)
+            counts[kind.value] += len(rows)
+            try:
+                sms_sender.send_many((row['user__mobile'], message) for row in rows)
+            except SMSError as e:
+                # In-app notifications are recorded; SMS is best effort
+                logger.error(f'Reminder SMS failed: {str(e)}', exc_info=True)
+
+    return counts
@@ -2,6 +2,7 @@
 Billing serializers.
 """
 from rest_framework import serializers
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from .models import Subscription, PaymentTransaction
@@ -54,6 +55,101 @@ class PaymentTransactionSerializer(serializers.ModelSerializer):
         return format_amount_display(obj.amount_irr)
 
 
+class FastValuesSerializer:
+    """
+    Read-only fast path for list endpoints.
+
+    Works on ``.values()`` rows instead of model instances and produces the
+    same output as the matching ModelSerializer: choice labels come from
+    dicts built once per call and datetimes go through a single shared DRF
+    field, so no per-row field binding or method dispatch happens.
+    Subclasses list the ``.values()`` columns in ``value_fields`` and build
+    each output dict in ``to_representation``.
+    """
+    value_fields = ()
+
+    def __init__(self):
+        self.datetime_field = serializers.DateTimeField()
+
+    @staticmethod
+    def labels(choices):
+        """Map choice values to their (translated) display labels."""
+        return {value: str(label) for value, label in choices}
+
+    def format_datetime(self, value):
+        return None if value is None else self.datetime_field.to_representation(value)
+
+    def serialize(self, rows):
+        """Serialize an iterable of ``.values()`` rows."""
+        return [self.to_representation(row) for row in rows]
+
+
+class FastPaymentTransactionSerializer(FastValuesSerializer):
+    """Fast path matching PaymentTransactionSerializer."""
+    value_fields = (
+        'id', 'order_id', 'gateway', 'purpose', 'amount_irr', 'status',
+        'track_id', 'result_code', 'message', 'paid_at',
+        'card_pan_masked', 'ref_number', 'created_at'
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.purpose_labels = self.labels(PaymentTransaction.PaymentPurpose.choices)
+        self.status_labels = self.labels(PaymentTransaction.PaymentStatus.choices)
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'order_id': row['order_id'],
+            'gateway': row['gateway'],
+            'purpose': row['purpose'],
+            'purpose_display': self.purpose_labels.get(row['purpose'], row['purpose']),
+            'amount_irr': row['amount_irr'],
+            'amount_display': format_amount_display(row['amount_irr']),
+            'status': row['status'],
+            'status_display': self.status_labels.get(row['status'], row['status']),
+            'track_id': row['track_id'],
+            'result_code': row['result_code'],
+            'message': row['message'],
+            'paid_at': self.format_datetime(row['paid_at']),
+            'card_pan_masked': row['card_pan_masked'],
+            'ref_number': row['ref_number'],
+            'created_at': self.format_datetime(row['created_at']),
+        }
+
+
+class FastSubscriptionSerializer(FastValuesSerializer):
+    """Fast path matching SubscriptionSerializer."""
+    value_fields = (
+        'id', 'plan_type', 'status', 'amount_paid', 'duration_months',
+        'starts_at', 'expires_at', 'created_at', 'updated_at'
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.now = timezone.now()
+
+    def to_representation(self, row):
+        expires_at = row['expires_at']
+        return {
+            'id': row['id'],
+            'plan_type': row['plan_type'],
+            'status': row['status'],
+            'amount_paid': row['amount_paid'],
+            'amount_display': format_amount_display(row['amount_paid']),
+            'duration_months': row['duration_months'],
+            'starts_at': self.format_datetime(row['starts_at']),
+            'expires_at': self.format_datetime(expires_at),
+            # Same rule as Subscription.is_active()
+            'is_active': (
+                row['status'] == Subscription.SubscriptionStatus.ACTIVE
+                and not (expires_at and expires_at < self.now)
+            ),
+            'created_at': self.format_datetime(row['created_at']),
+            'updated_at': self.format_datetime(row['updated_at']),
+        }
+
+
 class SubscriptionStartRequestSerializer(serializers.Serializer):
     """Serializer for starting subscription payment."""
     
@@ -103,6 +199,49 @@ class PaymentStartResponseSerializer(serializers.Serializer):
     subscription_id = serializers.IntegerField(help_text=_('Subscription ID'))
 
 
+class BillingExportQuerySerializer(serializers.Serializer):
+    """Query parameters for streaming billing exports."""
+
+    # Not "format": DRF reserves that query parameter for renderer selection
+    output = serializers.ChoiceField(
+        choices=('csv', 'jsonl'),
+        default='csv',
+        help_text=_('Output format')
+    )
+    start = serializers.DateField(required=False, help_text=_('Created on or after (inclusive)'))
+    end = serializers.DateField(required=False, help_text=_('Created before (exclusive)'))
+    status = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        help_text=_('Only include these statuses')
+    )
+
+
+class RevenueReportQuerySerializer(serializers.Serializer):
+    """Query parameters for the revenue report."""
+
+    start = serializers.DateField(help_text=_('First day (inclusive)'))
+    end = serializers.DateField(help_text=_('Last day (exclusive)'))
+    group_by = serializers.ChoiceField(
+        choices=('day', 'vendor', 'purpose', 'status'),
+        default='day',
+        help_text=_('Dimension to group by')
+    )
+    vendor_id = serializers.IntegerField(required=False, help_text=_('Only this vendor'))
+    purpose = serializers.ChoiceField(
+        choices=PaymentTransaction.PaymentPurpose.choices,
+        required=False,
+        help_text=_('Only this payment purpose')
+    )
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError(_('end must be after start'))
+        if (attrs['end'] - attrs['start']).days > 366:
+            raise serializers.ValidationError(_('Range cannot exceed one year'))
+        return attrs
+
+
 class PaymentCallbackSerializer(serializers.Serializer):
     """Serializer for payment callback parameters."""
     
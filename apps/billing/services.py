@@ -0,0 +1,299 @@
+"""
+Billing service layer.
+
+Payment start runs as a two-phase pipeline so no database transaction is held
+open across gateway I/O:
+
+1. :func:`create_checkout` commits the pending Subscription and
+   PaymentTransaction rows in one short transaction.
+2. :func:`register_checkout` calls the gateway outside any transaction.
+3. :func:`record_gateway_registration` / :func:`record_gateway_failure` store
+   the result with a short, idempotent conditional UPDATE.
+
+Gateway callbacks go through :func:`process_callback`, which serves final
+transactions without locking, lets only one verify per track_id reach the
+gateway at a time, and applies the verify result in a short locked
+transaction.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Subscription, PaymentTransaction
+from .payments import zibal_client
+from .payments.result_cache import cached_verify
+from .payments.utils import generate_order_id
+
+logger = logging.getLogger(__name__)
+
+
+@transaction.atomic
+def create_checkout(
+    *,
+    user,
+    vendor,
+    plan_type: str,
+    months: int,
+    amount: int,
+    callback_url: str
+) -> Tuple[Subscription, PaymentTransaction]:
+    """Phase one: commit the pending subscription and its payment transaction."""
+
+    # Generate unique order ID
+    order_id = generate_order_id(user_id=user.id)
+
+    # Create subscription (pending payment)
+    subscription = Subscription.objects.create(
+        user=user,
+        vendor=vendor,
+        plan_type=plan_type,
+        status=Subscription.SubscriptionStatus.PENDING,
+        amount_paid=0,
+        duration_months=months
+    )
+
+    # Create payment transaction
+    payment = PaymentTransaction.objects.create(
+        user=user,
+        vendor=vendor,
+        purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+        amount_irr=amount,
+        order_id=order_id,
+        gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+        status=PaymentTransaction.PaymentStatus.INITIATED,
+        callback_url=callback_url,
+        meta={
+            'subscription_id': subscription.id,
+            'plan_type': plan_type,
+            'months': months,
+        }
+    )
+
+    return subscription, payment
+
+
+def register_checkout(
+    payment: PaymentTransaction,
+    *,
+    mobile: Optional[str] = None,
+    description: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Register the payment with the gateway. Must run outside any transaction.
+
+    Raises:
+        ZibalError: If the gateway call fails or is rejected
+    """
+    client = zibal_client.get_zibal_client()
+
+    result = client.request_payment(
+        amount=payment.amount_irr,
+        order_id=payment.order_id,
+        callback_url=payment.callback_url,
+        mobile=mobile,
+        description=description
+    )
+
+    if not result['success']:
+        raise zibal_client.ZibalError(f"Payment request failed: {result.get('message')}")
+
+    result['redirect_url'] = client.create_start_url(result['track_id'])
+    return result
+
+
+def record_gateway_registration(payment: PaymentTransaction, track_id: int) -> bool:
+    """
+    Phase two: store the gateway track_id on an initiated transaction.
+
+    Idempotent: returns False if the transaction already left INITIATED.
+    The transaction is scheduled for its first reconciliation check.
+    """
+    now = timezone.now()
+    first_check = getattr(settings, 'ZIBAL_RECONCILE_FIRST_CHECK', 5 * 60)
+    next_check_at = now + timedelta(seconds=first_check)
+
+    updated = PaymentTransaction.objects.filter(
+        pk=payment.pk,
+        status=PaymentTransaction.PaymentStatus.INITIATED
+    ).update(
+        track_id=track_id,
+        status=PaymentTransaction.PaymentStatus.PENDING,
+        next_check_at=next_check_at,
+        updated_at=now
+    )
+
+    if updated:
+        payment.track_id = track_id
+        payment.status = PaymentTransaction.PaymentStatus.PENDING
+        payment.next_check_at = next_check_at
+    return bool(updated)
+
+
+def record_gateway_failure(payment: PaymentTransaction, message: str) -> bool:
+    """
+    Phase two (failure): mark an initiated transaction as failed.
+
+    Idempotent: returns False if the transaction already left INITIATED.
+    """
+    updated = PaymentTransaction.objects.filter(
+        pk=payment.pk,
+        status=PaymentTransaction.PaymentStatus.INITIATED
+    ).update(
+        status=PaymentTransaction.PaymentStatus.FAILED,
+        message=message[:500],
+        updated_at=timezone.now()
+    )
+
+    if updated:
+        payment.status = PaymentTransaction.PaymentStatus.FAILED
+        payment.message = message[:500]
+    return bool(updated)
+
+
+# FAILED and EXPIRED are not final: a late verify may still prove the
+# payment (see PaymentTransaction.PAYABLE_STATUSES)
+FINAL_PAYMENT_STATUSES = (
+    PaymentTransaction.PaymentStatus.PAID,
+    PaymentTransaction.PaymentStatus.REFUNDED,
+)
+
+CALLBACK_INFLIGHT_KEY = 'billing:callback:inflight:{track_id}'
+
+
+def process_callback(track_id: int) -> PaymentTransaction:
+    """
+    Verify a gateway callback and apply the result.
+
+    Raises:
+        PaymentTransaction.DoesNotExist: If no transaction matches track_id
+    """
+    # Fast path: already-final transactions are served without a lock
+    payment = PaymentTransaction.objects.get(
+        track_id=track_id,
+        gateway=PaymentTransaction.PaymentGateway.ZIBAL
+    )
+    if payment.status in FINAL_PAYMENT_STATUSES:
+        logger.info(f"Payment already processed: {payment.order_id}")
+        return payment
+
+    # In-flight dedup: only one verify per track_id goes to the gateway
+    lock_key = CALLBACK_INFLIGHT_KEY.format(track_id=track_id)
+    lock_token = uuid.uuid4().hex
+    lock_ttl = getattr(settings, 'ZIBAL_CALLBACK_LOCK_TTL', 60)
+    if not cache.add(lock_key, lock_token, timeout=lock_ttl):
+        return _wait_for_inflight_callback(payment, lock_key)
+
+    try:
+        payment.refresh_from_db()
+        if payment.status in FINAL_PAYMENT_STATUSES:
+            return payment
+
+        try:
+            verify_result = cached_verify(track_id)
+        except zibal_client.ZibalError as e:
+            # Leave the transaction pending; reconciliation will retry it
+            logger.error(f"Zibal verify error: {str(e)}", exc_info=True)
+            return payment
+
+        logger.info(
+            f"Verify result: order_id={payment.order_id}, result={verify_result['result']}",
+            extra={
+                'order_id': payment.order_id,
+                'result': verify_result['result'],
+                'amount': verify_result['amount']
+            }
+        )
+
+        return apply_verify_result(payment.pk, verify_result)
+    finally:
+        _release_inflight_lock(lock_key, lock_token)
+
+
+def _release_inflight_lock(lock_key: str, lock_token: str) -> None:
+    """Release the in-flight lock only if this caller still owns it."""
+    # The lock may have expired and been taken by another worker meanwhile
+    if cache.get(lock_key) == lock_token:
+        cache.delete(lock_key)
+
+
+def _wait_for_inflight_callback(payment: PaymentTransaction, lock_key: str) -> PaymentTransaction:
+    """Wait for the in-flight verify of the same track_id and return its result."""
+    wait_timeout = getattr(settings, 'ZIBAL_CALLBACK_WAIT_TIMEOUT', 10)
+    deadline = time.monotonic() + wait_timeout
+
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        current_status = PaymentTransaction.objects.filter(pk=payment.pk).values_list(
+            'status', flat=True
+        ).first()
+        if current_status in FINAL_PAYMENT_STATUSES or cache.get(lock_key) is None:
+            break
+
+    payment.refresh_from_db()
+    return payment
+
+
+def apply_verify_result(payment_id: int, verify_result: Dict[str, Any]) -> PaymentTransaction:
+    """Apply a gateway verify result under a short row lock."""
+    with transaction.atomic():
+        payment = PaymentTransaction.objects.select_for_update().get(pk=payment_id)
+
+        # Another worker may have finished while we were verifying
+        if payment.status in FINAL_PAYMENT_STATUSES:
+            return payment
+
+        if verify_result['success']:
+            paid = payment.mark_as_paid(
+                result_code=verify_result['result'],
+                ref_number=verify_result['ref_number'] or '',
+                card_pan=verify_result['card_number'] or '',
+                meta={
+                    'verified_at': verify_result['paid_at'],
+                    'verify_amount': verify_result['amount'],
+                }
+            )
+
+            # Activate subscription if this is a subscription payment
+            if paid and payment.purpose == PaymentTransaction.PaymentPurpose.SUBSCRIPTION:
+                activate_subscription_for_payment(payment)
+
+            logger.info(f"Payment completed: {payment.order_id}")
+        else:
+            # Payment failed or cancelled
+            payment.mark_as_failed(
+                result_code=verify_result['result'],
+                message=verify_result.get('message') or 'پرداخت ناموفق'
+            )
+            logger.warning(f"Payment failed: {payment.order_id}")
+
+    return payment
+
+
+def activate_subscription_for_payment(payment: PaymentTransaction) -> Optional[Subscription]:
+    """Activate the subscription referenced by a paid transaction."""
+    subscription_id = payment.meta.get('subscription_id')
+    if not subscription_id:
+        return None
+
+    try:
+        subscription = Subscription.objects.get(id=subscription_id)
+    except Subscription.DoesNotExist:
+        logger.error(f"Subscription {subscription_id} not found")
+        return None
+
+    if not subscription.activate(duration_months=payment.meta.get('months', 1), payment=payment):
+        logger.warning(f"Subscription {subscription.id} already active, skipping activation")
+        return subscription
+
+    logger.info(
+        f"Subscription activated: {subscription.id}",
+        extra={'subscription_id': subscription.id}
+    )
+    return subscription
@@ -0,0 +1,15 @@
+"""
+Signal handlers for billing models.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .entitlements import invalidate_entitlements
+from .models import Subscription
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription_owner(sender, instance, **kwargs):
+    """Drop cached entitlements when a subscription is saved or deleted outside the transitions."""
+    invalidate_entitlements(user_ids=[instance.user_id], vendor_ids=[instance.vendor_id])
@@ -1,6 +1,8 @@
 """
 Pytest fixtures for billing tests.
 """
+import itertools
+
 import pytest
 from unittest.mock import Mock, patch
 from django.contrib.auth import get_user_model
@@ -8,6 +10,16 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Isolate cached gateway results and locks between tests."""
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def user(db):
     """Create test user."""
@@ -39,6 +51,50 @@ def vendor(db, user):
     )
 
 
+@pytest.fixture
+def payment_factory(user_factory):
+    """Factory for creating pending Zibal payment transactions."""
+    from apps.billing.models import PaymentTransaction
+
+    sequence = itertools.count(1)
+
+    def create_payment(**kwargs):
+        user = kwargs.pop('user', None) or user_factory()
+        defaults = {
+            'purpose': PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            'amount_irr': 500000,
+            'order_id': f'AP-TEST-{next(sequence)}',
+            'gateway': PaymentTransaction.PaymentGateway.ZIBAL,
+            'status': PaymentTransaction.PaymentStatus.PENDING,
+        }
+        defaults.update(kwargs)
+        return PaymentTransaction.objects.create(user=user, **defaults)
+
+    return create_payment
+
+
+@pytest.fixture
+def subscription_factory(user_factory):
+    """Factory for creating active one-month subscriptions expiring after `expires_in`."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.billing.models import Subscription
+
+    def create_subscription(expires_in=timedelta(days=1), **kwargs):
+        user = kwargs.pop('user', None) or user_factory()
+        now = timezone.now()
+        defaults = {
+            'status': Subscription.SubscriptionStatus.ACTIVE,
+            'duration_months': 1,
+            'starts_at': now - timedelta(days=30),
+            'expires_at': now + expires_in,
+        }
+        defaults.update(kwargs)
+        return Subscription.objects.create(user=user, **defaults)
+
+    return create_subscription
+
+
 @pytest.fixture
 def zibal_mock():
     """Mock Zibal client responses."""
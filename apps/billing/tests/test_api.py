@@ -3,10 +3,12 @@ Tests for billing API endpoints.
 """
 import pytest
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from apps.billing.models import Subscription, PaymentTransaction
+from apps.billing.payments.zibal_client import ZibalCircuitOpenError, ZibalError
 
 
 @pytest.fixture
@@ -48,6 +50,109 @@ class TestSubscriptionAPI:
         assert subscription.user == user
         assert subscription.status == Subscription.SubscriptionStatus.PENDING
     
+    def test_subscription_start_idempotency_key_replays(self, api_client, user, zibal_mock):
+        """Test a retry with the same key replays the response without new rows."""
+        api_client.force_authenticate(user=user)
+        url = reverse('subscription-start')
+        data = {'plan_type': 'business', 'months': 3}
+
+        first = api_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        second = api_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert second.data == first.data
+        assert second['Idempotent-Replayed'] == 'true'
+        assert zibal_mock.request_payment.call_count == 1
+        assert PaymentTransaction.objects.count() == 1
+        assert Subscription.objects.count() == 1
+
+        zibal_mock.request_payment.return_value = {
+            **zibal_mock.request_payment.return_value, 'track_id': 2
+        }
+        other = api_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-2')
+        assert other.data['order_id'] != first.data['order_id']
+
+    def test_subscription_start_idempotency_key_reused_with_other_payload(
+        self, api_client, user, zibal_mock
+    ):
+        """Test a key cannot be reused for a different request."""
+        api_client.force_authenticate(user=user)
+        url = reverse('subscription-start')
+
+        api_client.post(
+            url, {'plan_type': 'business', 'months': 1}, format='json', HTTP_IDEMPOTENCY_KEY='k'
+        )
+        response = api_client.post(
+            url, {'plan_type': 'business', 'months': 6}, format='json', HTTP_IDEMPOTENCY_KEY='k'
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert zibal_mock.request_payment.call_count == 1
+
+    def test_subscription_start_idempotency_waits_for_in_flight(
+        self, api_client, user, zibal_mock, settings
+    ):
+        """Test a duplicate of an in-flight request gets 409 once the wait times out."""
+        from django.core.cache import cache
+        from apps.billing.idempotency import IDEMPOTENCY_KEY, IN_FLIGHT, request_fingerprint
+
+        settings.BILLING_IDEMPOTENCY_WAIT_TIMEOUT = 0.1
+        api_client.force_authenticate(user=user)
+        data = {'plan_type': 'business', 'months': 1}
+        cache.set(
+            IDEMPOTENCY_KEY.format(scope='subscription-start', user_id=user.id, key='busy'),
+            {'state': IN_FLIGHT, 'fingerprint': request_fingerprint(data)}
+        )
+
+        response = api_client.post(
+            reverse('subscription-start'), data, format='json', HTTP_IDEMPOTENCY_KEY='busy'
+        )
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        zibal_mock.request_payment.assert_not_called()
+
+    def test_subscription_start_server_error_is_not_replayed(self, api_client, user, zibal_mock):
+        """Test a retry after a gateway failure runs again."""
+        api_client.force_authenticate(user=user)
+        zibal_mock.request_payment.side_effect = ZibalError('Gateway timeout')
+        url = reverse('subscription-start')
+        data = {'plan_type': 'business', 'months': 1}
+
+        response = api_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='k')
+        assert response.status_code == status.HTTP_502_BAD_GATEWAY
+        zibal_mock.request_payment.side_effect = None
+        response = api_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='k')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert zibal_mock.request_payment.call_count == 2
+
+    def test_subscription_start_gateway_error(self, api_client, user, zibal_mock):
+        """Test gateway failure marks the committed transaction as failed."""
+        api_client.force_authenticate(user=user)
+        zibal_mock.request_payment.side_effect = ZibalError('Gateway timeout')
+
+        url = reverse('subscription-start')
+        response = api_client.post(url, {'plan_type': 'business', 'months': 1}, format='json')
+
+        assert response.status_code == status.HTTP_502_BAD_GATEWAY
+        transaction = PaymentTransaction.objects.get(user=user)
+        assert transaction.status == PaymentTransaction.PaymentStatus.FAILED
+        assert transaction.track_id is None
+
+    def test_subscription_start_circuit_open(self, api_client, user, zibal_mock):
+        """Test an open gateway circuit answers 503 and fails the transaction."""
+        api_client.force_authenticate(user=user)
+        zibal_mock.request_payment.side_effect = ZibalCircuitOpenError(
+            'Gateway unavailable: circuit open'
+        )
+
+        url = reverse('subscription-start')
+        response = api_client.post(url, {'plan_type': 'business', 'months': 1}, format='json')
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        transaction = PaymentTransaction.objects.get(user=user)
+        assert transaction.status == PaymentTransaction.PaymentStatus.FAILED
+
     def test_subscription_start_unauthenticated(self, api_client):
         """Test subscription start without authentication."""
         url = reverse('subscription-start')
@@ -93,6 +198,34 @@ class TestSubscriptionAPI:
         assert response.data[0]['id'] == subscription.id
 
 
+@pytest.mark.django_db(transaction=True)
+def test_subscription_start_gateway_call_outside_transaction(api_client, user, zibal_mock):
+    """Test phase one is committed before the gateway round trip starts."""
+    from django.db import connection
+
+    seen = {}
+
+    def request_payment(**kwargs):
+        seen['in_atomic_block'] = connection.in_atomic_block
+        seen['committed'] = PaymentTransaction.objects.filter(
+            order_id=kwargs['order_id'],
+            status=PaymentTransaction.PaymentStatus.INITIATED
+        ).exists()
+        return {'track_id': 555, 'result': 100, 'message': 'success', 'success': True}
+
+    zibal_mock.request_payment.side_effect = request_payment
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(
+        reverse('subscription-start'), {'plan_type': 'business', 'months': 1}, format='json'
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert seen == {'in_atomic_block': False, 'committed': True}
+    payment = PaymentTransaction.objects.get(track_id=555)
+    assert payment.status == PaymentTransaction.PaymentStatus.PENDING
+
+
 @pytest.mark.django_db
 class TestPaymentCallback:
     """Tests for payment callback endpoint."""
@@ -182,6 +315,102 @@ class TestPaymentCallback:
         transaction.refresh_from_db()
         assert transaction.status == PaymentTransaction.PaymentStatus.PAID
     
+    def test_duplicate_callbacks_verify_once(self, api_client, user, zibal_mock):
+        """Test GET + POST callbacks for one track_id hit the gateway once."""
+        PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000,
+            order_id='AP-20251005-1-dup',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.PENDING,
+            track_id=123456789
+        )
+
+        url = reverse('zibal-callback')
+        first = api_client.get(url, {'trackId': 123456789})
+        second = api_client.post(f'{url}?trackId=123456789')
+
+        assert first.data['status'] == PaymentTransaction.PaymentStatus.PAID
+        assert second.data['status'] == PaymentTransaction.PaymentStatus.PAID
+        assert zibal_mock.verify_payment.call_count == 1
+
+    def test_callback_waits_for_inflight_verify(self, api_client, user, zibal_mock, settings):
+        """Test a concurrent duplicate is served from the in-flight result."""
+        from django.core.cache import cache
+        from apps.billing.services import CALLBACK_INFLIGHT_KEY
+
+        settings.ZIBAL_CALLBACK_WAIT_TIMEOUT = 0.2
+        PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000,
+            order_id='AP-20251005-1-inflight',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.PENDING,
+            track_id=123456789
+        )
+        cache.set(CALLBACK_INFLIGHT_KEY.format(track_id=123456789), 1)
+
+        try:
+            response = api_client.get(reverse('zibal-callback'), {'trackId': 123456789})
+        finally:
+            cache.delete(CALLBACK_INFLIGHT_KEY.format(track_id=123456789))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == PaymentTransaction.PaymentStatus.PENDING
+        zibal_mock.verify_payment.assert_not_called()
+
+    def test_callback_verify_error_keeps_pending(self, api_client, user, zibal_mock):
+        """Test transient verify errors leave the transaction for reconciliation."""
+        zibal_mock.verify_payment.side_effect = ZibalError('Gateway timeout')
+        transaction = PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000,
+            order_id='AP-20251005-1-error',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.PENDING,
+            track_id=123456789
+        )
+
+        response = api_client.get(reverse('zibal-callback'), {'trackId': 123456789})
+
+        assert response.status_code == status.HTTP_200_OK
+        transaction.refresh_from_db()
+        assert transaction.status == PaymentTransaction.PaymentStatus.PENDING
+
+    def test_callback_pays_expired_transaction(self, api_client, user, zibal_mock):
+        """Test a late callback still records a payment reconciliation expired."""
+        transaction = PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000,
+            order_id='AP-20251005-1-late',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.EXPIRED,
+            track_id=123456789
+        )
+
+        response = api_client.get(reverse('zibal-callback'), {'trackId': 123456789})
+
+        assert response.status_code == status.HTTP_200_OK
+        zibal_mock.verify_payment.assert_called_once()
+        transaction.refresh_from_db()
+        assert transaction.status == PaymentTransaction.PaymentStatus.PAID
+
+    def test_inflight_lock_released_only_by_owner(self):
+        """Test a caller never deletes an in-flight lock another worker took over."""
+        from django.core.cache import cache
+        from apps.billing.services import _release_inflight_lock
+
+        cache.set('billing:callback:inflight:1', 'other-worker')
+        _release_inflight_lock('billing:callback:inflight:1', 'expired-owner')
+        assert cache.get('billing:callback:inflight:1') == 'other-worker'
+
+        _release_inflight_lock('billing:callback:inflight:1', 'other-worker')
+        assert cache.get('billing:callback:inflight:1') is None
+
     def test_callback_not_found(self, api_client):
         """Test callback with non-existent track_id."""
         url = reverse('zibal-callback')
@@ -214,6 +443,39 @@ class TestPaymentTransactionAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 1
     
+    def test_transactions_cursor_pagination(self, api_client, user):
+        """Test keyset pages cover all rows once and skip the COUNT query."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        api_client.force_authenticate(user=user)
+
+        created_at = timezone.now()
+        for i in range(5):
+            PaymentTransaction.objects.create(
+                user=user,
+                purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+                amount_irr=500000,
+                order_id=f'AP-20251005-1-page{i}',
+                gateway=PaymentTransaction.PaymentGateway.ZIBAL
+            )
+        # Identical timestamps exercise the id tie-breaker
+        PaymentTransaction.objects.update(created_at=created_at)
+
+        url = reverse('transaction-list') + '?page_size=2'
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = api_client.get(url)
+                assert response.status_code == status.HTTP_200_OK
+                assert 'count' not in response.data
+                seen += [item['order_id'] for item in response.data['results']]
+                url = response.data['next']
+
+        assert sorted(seen) == sorted(f'AP-20251005-1-page{i}' for i in range(5))
+        assert len(seen) == 5
+        assert not any('COUNT(' in query['sql'].upper() for query in queries.captured_queries)
+
     def test_get_transaction_by_order_id(self, api_client, user):
         """Test getting transaction by order ID."""
         api_client.force_authenticate(user=user)
@@ -0,0 +1,130 @@
+"""
+Tests for the subscription entitlement cache.
+"""
+import pytest
+from datetime import timedelta
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.billing.entitlements import (
+    EntitlementCache,
+    VENDOR,
+    get_user_entitlement,
+    get_vendor_entitlements,
+    is_vendor_boosted,
+)
+from apps.billing.models import Subscription
+from apps.billing.tasks import check_expired_subscriptions
+
+
+@pytest.mark.django_db
+class TestEntitlementCache:
+    """Tests for entitlement lookups and invalidation."""
+
+    def test_lookup_is_cached(self, user, vendor, django_assert_num_queries):
+        """Test a second lookup is served without a query."""
+        subscription = Subscription.objects.create(user=user, vendor=vendor, duration_months=1)
+        subscription.activate()
+
+        with django_assert_num_queries(1):
+            assert is_vendor_boosted(vendor.id)
+        with django_assert_num_queries(0):
+            assert is_vendor_boosted(vendor.id)
+
+        entitlement = get_user_entitlement(user.id)
+        assert entitlement['subscription_id'] == subscription.id
+        assert entitlement['expires_at'] == subscription.expires_at
+
+    def test_activate_and_cancel_invalidate(self, user, vendor, django_capture_on_commit_callbacks):
+        """Test a cached negative answer is dropped on activation and cancel."""
+        subscription = Subscription.objects.create(user=user, vendor=vendor, duration_months=1)
+        assert not is_vendor_boosted(vendor.id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            subscription.activate()
+        assert is_vendor_boosted(vendor.id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            subscription.cancel()
+        assert not is_vendor_boosted(vendor.id)
+        assert not get_user_entitlement(user.id)['active']
+
+    def test_invalidation_waits_for_commit(self, user, vendor, django_capture_on_commit_callbacks):
+        """Test a lookup before commit cannot re-cache the old entitlement."""
+        subscription = Subscription.objects.create(user=user, vendor=vendor, duration_months=1)
+        assert not is_vendor_boosted(vendor.id)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            subscription.activate()
+            # Still the cached pre-commit answer
+            assert not is_vendor_boosted(vendor.id)
+
+        for callback in callbacks:
+            callback()
+        assert is_vendor_boosted(vendor.id)
+
+    def test_expire_task_invalidates(self, user, vendor, django_capture_on_commit_callbacks):
+        """Test the expiry task drops cached entitlements."""
+        subscription = Subscription.objects.create(user=user, vendor=vendor, duration_months=1)
+        subscription.activate()
+        assert is_vendor_boosted(vendor.id)
+
+        Subscription.objects.filter(pk=subscription.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            check_expired_subscriptions()
+
+        assert not is_vendor_boosted(vendor.id)
+
+    def test_save_and_delete_invalidate(
+        self, api_client, user, vendor, django_capture_on_commit_callbacks
+    ):
+        """Test plain saves and deletes, as the admin does them, drop cached entries."""
+        api_client.force_authenticate(user=user)
+        assert api_client.get(reverse('subscription-me')).data == []
+
+        with django_capture_on_commit_callbacks(execute=True):
+            subscription = Subscription.objects.create(
+                user=user,
+                vendor=vendor,
+                status=Subscription.SubscriptionStatus.ACTIVE,
+                duration_months=1,
+                expires_at=timezone.now() + timedelta(days=30)
+            )
+
+        assert [row['id'] for row in api_client.get(reverse('subscription-me')).data] == [
+            subscription.id
+        ]
+        assert is_vendor_boosted(vendor.id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            subscription.delete()
+
+        assert not is_vendor_boosted(vendor.id)
+        assert api_client.get(reverse('subscription-me')).data == []
+
+    def test_bulk_lookup(self, user, vendor, django_assert_num_queries):
+        """Test a page of vendors resolves with one query for the misses."""
+        Subscription.objects.create(user=user, vendor=vendor, duration_months=1).activate()
+        EntitlementCache().invalidate(vendor_ids=[vendor.id])
+
+        with django_assert_num_queries(1):
+            entitlements = get_vendor_entitlements([vendor.id, 999999])
+
+        assert entitlements[vendor.id]['active']
+        assert not entitlements[999999]['active']
+
+        with django_assert_num_queries(0):
+            get_vendor_entitlements([vendor.id, 999999])
+
+    def test_ttl_follows_expiry(self):
+        """Test positive entries expire with the subscription."""
+        cache = EntitlementCache()
+        expires_at = timezone.now() + timedelta(minutes=10)
+
+        ttl = cache._ttl({'active': True, 'expires_at': expires_at})
+
+        assert 590 <= ttl <= 600
+        assert cache._ttl({'active': False, 'expires_at': None}) == cache.negative_ttl
+        assert cache.get_many(VENDOR, []) == {}
@@ -0,0 +1,65 @@
+"""
+Tests for chunked subscription expiry.
+"""
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+
+from apps.billing.entitlements import is_vendor_boosted
+from apps.billing.expiry import expire_subscriptions
+from apps.billing.models import Subscription
+from apps.billing.tasks import check_expired_subscriptions
+from apps.notifications.models import Notification
+
+
+@pytest.mark.django_db
+class TestExpireSubscriptions:
+    """Tests for expire_subscriptions."""
+
+    def test_expires_in_chunks_and_emits_rows(self, user, subscription_factory):
+        """Test lapsed subscriptions expire chunk by chunk and reach consumers."""
+        lapsed = [subscription_factory(user=user, expires_in=-timedelta(days=1)) for _ in range(5)]
+        running = subscription_factory(user=user, expires_in=timedelta(days=1))
+        seen = []
+
+        stats = expire_subscriptions(chunk_size=2, consumers=[seen.append])
+
+        assert stats.expired == 5
+        assert stats.chunk_sizes == [2, 2, 1]
+        assert len(stats.as_dict()['chunk_ms']) == 3
+        assert sorted(row['id'] for chunk in seen for row in chunk) == [s.id for s in lapsed]
+        assert Subscription.objects.filter(
+            status=Subscription.SubscriptionStatus.EXPIRED
+        ).count() == 5
+        running.refresh_from_db()
+        assert running.status == Subscription.SubscriptionStatus.ACTIVE
+
+    def test_failing_consumer_does_not_stop_run(self, user, subscription_factory):
+        """Test a consumer error is logged and the remaining chunks still expire."""
+        subscription_factory(user=user, expires_in=-timedelta(days=1))
+        subscription_factory(user=user, expires_in=-timedelta(days=1))
+
+        def broken(rows):
+            raise RuntimeError('boom')
+
+        stats = expire_subscriptions(chunk_size=1, consumers=[broken])
+
+        assert stats.expired == 2
+
+    def test_task_notifies_and_invalidates(
+        self, user, vendor, subscription_factory, django_capture_on_commit_callbacks
+    ):
+        """Test the task drives the default consumers."""
+        subscription = subscription_factory(user=user, expires_in=timedelta(days=1), vendor=vendor)
+        assert is_vendor_boosted(vendor.id)
+        Subscription.objects.filter(pk=subscription.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            result = check_expired_subscriptions()
+
+        assert result['expired'] == 1
+        assert result['stats']['chunks'] == 1
+        assert not is_vendor_boosted(vendor.id)
+        assert Notification.objects.filter(recipient=user).count() == 1
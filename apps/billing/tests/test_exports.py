@@ -0,0 +1,122 @@
+"""
+Tests for streaming billing exports.
+"""
+import csv
+import io
+import json
+import pytest
+from datetime import date, timedelta
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from apps.billing.exports import ExportError, stream_export
+from apps.billing.models import Subscription, PaymentTransaction
+
+
+@pytest.mark.django_db
+class TestStreamExport:
+    """Tests for stream_export."""
+
+    def test_csv_with_status_filter(self, user, payment_factory):
+        """Test CSV output has a header and only the filtered rows."""
+        payment_factory(
+            user=user,
+            order_id='AP-EXP-1',
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+        payment_factory(
+            user=user,
+            order_id='AP-EXP-2',
+            status=PaymentTransaction.PaymentStatus.FAILED
+        )
+
+        rows = list(csv.DictReader(io.StringIO(''.join(
+            stream_export('transactions', 'csv', statuses=['paid'], chunk_size=1)
+        ))))
+
+        assert [row['order_id'] for row in rows] == ['AP-EXP-1']
+        assert rows[0]['vendor_id'] == ''
+        assert rows[0]['created_at']
+
+    def test_jsonl_with_date_range(self, user, payment_factory):
+        """Test JSONL output honours the creation date range."""
+        old = payment_factory(
+            user=user,
+            order_id='AP-EXP-1',
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+        payment_factory(
+            user=user,
+            order_id='AP-EXP-2',
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+        PaymentTransaction.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+        lines = list(stream_export(
+            'transactions',
+            'jsonl',
+            start=date.today() - timedelta(days=1),
+            end=date.today() + timedelta(days=1)
+        ))
+
+        assert [json.loads(line)['order_id'] for line in lines] == ['AP-EXP-2']
+
+    def test_invalid_filters_raise_before_streaming(self, user):
+        """Test bad input fails on the call, not mid-stream."""
+        with pytest.raises(ExportError):
+            stream_export('transactions', 'csv', statuses=['bogus'])
+        with pytest.raises(ExportError):
+            stream_export('invoices', 'csv')
+        with pytest.raises(ExportError):
+            stream_export('transactions', 'xml')
+
+
+@pytest.mark.django_db
+class TestExportEndpoint:
+    """Tests for the export view and command."""
+
+    def test_export_requires_admin(self, api_client, user):
+        """Test non-staff users cannot export."""
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(reverse('billing-export', args=['transactions']))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_export_streams_jsonl(self, api_client, user):
+        """Test staff users get a streaming JSONL attachment."""
+        user.is_staff = True
+        user.save(update_fields=['is_staff'])
+        api_client.force_authenticate(user=user)
+        Subscription.objects.create(user=user)
+
+        url = reverse('billing-export', args=['subscriptions'])
+        response = api_client.get(url, {'output': 'jsonl', 'status': ['pending']})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response['Content-Disposition'] == 'attachment; filename="subscriptions.jsonl"'
+        body = b''.join(response.streaming_content).decode()
+        assert json.loads(body)['status'] == 'pending'
+
+        response = api_client.get(url, {'status': 'bogus'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_command_writes_file(self, user, tmp_path, payment_factory):
+        """Test the management command writes the export to a file."""
+        payment_factory(
+            user=user,
+            order_id='AP-EXP-1',
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+        output = tmp_path / 'transactions.csv'
+        stdout = io.StringIO()
+
+        call_command('billing_export', 'transactions', f'--output={output}', stdout=stdout)
+
+        assert 'Exported 1 transactions rows' in stdout.getvalue()
+        assert 'AP-EXP-1' in output.read_text(encoding='utf-8')
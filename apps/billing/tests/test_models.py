@@ -63,7 +63,7 @@ class TestSubscription:
         subscription = Subscription.objects.create(
             user=user,
             plan_type=Subscription.PlanType.BUSINESS,
-            status=Subscription.SubscriptionStatus.ACTIVE,
+            status=Subscription.SubscriptionStatus.PENDING,
             amount_paid=500000,
             duration_months=1
         )
@@ -75,6 +75,53 @@ class TestSubscription:
         
         assert subscription.expires_at > old_expires_at
 
+    def test_activate_is_compare_and_set(self, user):
+        """Test a running subscription is not restarted by a second activate."""
+        subscription = Subscription.objects.create(user=user, duration_months=1)
+
+        assert subscription.activate() is True
+        first_expiry = subscription.expires_at
+
+        stale = Subscription.objects.get(pk=subscription.pk)
+        assert stale.activate(duration_months=6) is False
+
+        subscription.refresh_from_db()
+        assert subscription.expires_at == first_expiry
+        assert subscription.duration_months == 1
+
+    def test_activate_skips_cancelled_subscription(self, user):
+        """Test a cancelled subscription that never started is not activated."""
+        subscription = Subscription.objects.create(
+            user=user,
+            status=Subscription.SubscriptionStatus.CANCELLED,
+            duration_months=1
+        )
+
+        assert subscription.activate() is False
+
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.SubscriptionStatus.CANCELLED
+        assert subscription.starts_at is None
+
+    def test_extend_detects_concurrent_update(self, user):
+        """Test an extend based on a stale expiry does not overwrite another."""
+        subscription = Subscription.objects.create(user=user, duration_months=1)
+        subscription.activate()
+        stale = Subscription.objects.get(pk=subscription.pk)
+
+        assert subscription.extend(months=1) is True
+        assert stale.extend(months=1) is False
+
+    def test_activate_does_not_rewrite_notes(self, user):
+        """Test activation only writes the columns it changes."""
+        subscription = Subscription.objects.create(user=user, duration_months=1)
+        Subscription.objects.filter(pk=subscription.pk).update(notes='edited elsewhere')
+
+        subscription.activate()
+
+        subscription.refresh_from_db()
+        assert subscription.notes == 'edited elsewhere'
+
 
 @pytest.mark.django_db
 class TestPaymentTransaction:
@@ -142,6 +189,27 @@ class TestPaymentTransaction:
         assert transaction.message == 'Payment cancelled'
         assert not transaction.is_successful()
     
+    def test_transitions_are_compare_and_set(self, user):
+        """Test a paid transaction cannot be failed by a late writer."""
+        transaction = PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000,
+            order_id='AP-20251005-1-test',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.PENDING,
+            meta={'subscription_id': 1}
+        )
+        stale = PaymentTransaction.objects.get(pk=transaction.pk)
+
+        assert transaction.mark_as_paid(result_code=100, meta={'verified_at': 'now'}) is True
+        assert stale.mark_as_failed(result_code=202) is False
+        assert transaction.mark_as_paid(result_code=100) is False
+
+        transaction.refresh_from_db()
+        assert transaction.status == PaymentTransaction.PaymentStatus.PAID
+        assert transaction.meta == {'subscription_id': 1, 'verified_at': 'now'}
+
     def test_unique_order_id(self, user):
         """Test order_id uniqueness constraint."""
         order_id = 'AP-20251005-1-unique'
@@ -162,3 +230,102 @@ class TestPaymentTransaction:
                 order_id=order_id,
                 gateway=PaymentTransaction.PaymentGateway.ZIBAL
             )
+
+
+@pytest.mark.django_db
+class TestBulkTransitions:
+    """Tests for the set-based queryset transitions."""
+
+    def test_bulk_mark_paid(self, user, payment_factory):
+        """Test per-row verify data is written and final rows are skipped."""
+        pending = payment_factory(user=user, order_id='AP-BULK-1')
+        refunded = payment_factory(
+            user=user,
+            order_id='AP-BULK-2',
+            status=PaymentTransaction.PaymentStatus.REFUNDED
+        )
+
+        ids = PaymentTransaction.objects.bulk_mark_paid({
+            pending.id: {
+                'result_code': 100,
+                'ref_number': '111',
+                'card_pan': '6219-86**-****-1234',
+            },
+            refunded.id: {'result_code': 100, 'ref_number': '222', 'card_pan': ''},
+        })
+
+        assert ids == [pending.id]
+        pending.refresh_from_db()
+        refunded.refresh_from_db()
+        assert pending.status == PaymentTransaction.PaymentStatus.PAID
+        assert pending.ref_number == '111'
+        assert pending.paid_at is not None
+        assert refunded.status == PaymentTransaction.PaymentStatus.REFUNDED
+
+    def test_bulk_mark_failed_and_expire(self, user, payment_factory):
+        """Test only pending transactions are closed."""
+        first = payment_factory(user=user, order_id='AP-BULK-1')
+        second = payment_factory(
+            user=user,
+            order_id='AP-BULK-2',
+            status=PaymentTransaction.PaymentStatus.INITIATED
+        )
+        paid = payment_factory(
+            user=user,
+            order_id='AP-BULK-3',
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+
+        failed_ids = PaymentTransaction.objects.filter(
+            id__in=[first.id, paid.id]
+        ).bulk_mark_failed(message='cancelled', result_code=100)
+        expired_ids = PaymentTransaction.objects.all().bulk_expire(message='expired')
+
+        assert failed_ids == [first.id]
+        assert expired_ids == [second.id]
+        first.refresh_from_db()
+        paid.refresh_from_db()
+        assert first.status == PaymentTransaction.PaymentStatus.FAILED
+        assert first.result_code == 100
+        assert paid.status == PaymentTransaction.PaymentStatus.PAID
+        assert PaymentTransaction.objects.pending().count() == 0
+
+    def test_bulk_activate_subscriptions(self, user, payment_factory):
+        """Test activation links payments and skips already active rows."""
+        pending = Subscription.objects.create(user=user, duration_months=1)
+        active = Subscription.objects.create(
+            user=user,
+            status=Subscription.SubscriptionStatus.ACTIVE,
+            duration_months=1
+        )
+        payment = payment_factory(
+            user=user,
+            order_id='AP-BULK-1',
+            status=PaymentTransaction.PaymentStatus.PAID,
+            meta={'months': 3}
+        )
+
+        ids = Subscription.objects.filter(
+            id__in=[pending.id, active.id]
+        ).bulk_activate_subscriptions({pending.id: payment})
+
+        assert ids == [pending.id]
+        pending.refresh_from_db()
+        assert pending.status == Subscription.SubscriptionStatus.ACTIVE
+        assert pending.payment_transaction_id == payment.id
+        assert pending.amount_paid == 500000
+        assert pending.duration_months == 3
+        assert pending.is_active()
+
+    def test_bulk_expire_subscriptions(self, user):
+        """Test only active subscriptions are expired."""
+        active = Subscription.objects.create(
+            user=user,
+            status=Subscription.SubscriptionStatus.ACTIVE,
+            duration_months=1
+        )
+        Subscription.objects.create(user=user, duration_months=1)
+
+        assert Subscription.objects.all().bulk_expire() == [active.id]
+        active.refresh_from_db()
+        assert active.status == Subscription.SubscriptionStatus.EXPIRED
@@ -0,0 +1,83 @@
+"""
+Tests for order ID generation.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from apps.billing.payments import utils
+from apps.billing.payments.utils import (
+    MonotonicOrderIdGenerator,
+    RandomOrderIdGenerator,
+    generate_order_id,
+)
+
+ORDER_ID_PATTERN = re.compile(r'^AP-[0-9A-HJKMNP-TV-Z]{17}(-\d+)?$')
+
+
+class TestMonotonicOrderIdGenerator:
+    """Tests for MonotonicOrderIdGenerator."""
+
+    def test_format(self):
+        """Test IDs use the Zibal-safe alphabet and keep the user id."""
+        generator = MonotonicOrderIdGenerator()
+
+        assert ORDER_ID_PATTERN.match(generator(user_id=42))
+        assert generator(user_id=42).endswith('-42')
+        assert ORDER_ID_PATTERN.match(generator())
+
+    def test_ids_sort_in_creation_order(self):
+        """Test string order equals generation order within a process."""
+        generator = MonotonicOrderIdGenerator()
+
+        ids = [generator() for _ in range(5000)]
+
+        assert ids == sorted(ids)
+
+    def test_clock_going_backwards_stays_monotonic(self):
+        """Test a wall clock step back does not reorder or repeat IDs."""
+        generator = MonotonicOrderIdGenerator(node=1)
+
+        with patch.object(utils.time, 'time_ns', return_value=2_000_000_000_000_000):
+            first = generator()
+        with patch.object(utils.time, 'time_ns', return_value=1_000_000_000_000_000):
+            second = generator()
+
+        assert second > first
+
+    def test_sequence_overflow_borrows_next_millisecond(self):
+        """Test more IDs than the sequence holds in one millisecond stay unique."""
+        generator = MonotonicOrderIdGenerator(node=1)
+        count = MonotonicOrderIdGenerator.SEQUENCE_LIMIT + 10
+
+        with patch.object(utils.time, 'time_ns', return_value=1_000_000_000_000_000):
+            ids = [generator() for _ in range(count)]
+
+        assert len(set(ids)) == count
+        assert ids == sorted(ids)
+
+    def test_collision_stress(self):
+        """Test concurrent bursts across threads and processes-like nodes never collide."""
+        generators = [MonotonicOrderIdGenerator() for _ in range(4)]
+
+        def burst(index):
+            generator = generators[index % len(generators)]
+            return [generator(user_id=7) for _ in range(5000)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = [order_id for batch in executor.map(burst, range(16)) for order_id in batch]
+
+        assert len(ids) == 80000
+        assert len(set(ids)) == len(ids)
+
+
+class TestGenerateOrderId:
+    """Tests for the pluggable generate_order_id entry point."""
+
+    def test_uses_configured_generator(self, settings):
+        """Test BILLING_ORDER_ID_GENERATOR selects the implementation."""
+        settings.BILLING_ORDER_ID_GENERATOR = 'apps.billing.payments.utils.RandomOrderIdGenerator'
+
+        with patch.object(utils, '_order_id_generator', None):
+            assert isinstance(utils.get_order_id_generator(), RandomOrderIdGenerator)
+            assert re.match(r'^AP-\d{14}-5-[0-9a-f]{6}$', generate_order_id(user_id=5))
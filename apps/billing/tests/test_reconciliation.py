@@ -0,0 +1,181 @@
+"""
+Tests for the concurrent reconciliation engine.
+"""
+import pytest
+from datetime import timedelta
+from unittest.mock import Mock
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.billing.models import Subscription, PaymentTransaction, ReconciliationCursor
+from apps.billing.payments.reconciliation import (
+    ReconciliationEngine,
+    admit_new_transactions,
+    due_zibal_transactions,
+    next_check_delay,
+    pending_zibal_transactions,
+)
+from apps.billing.payments.zibal_client import ZibalError
+
+
+def make_client(statuses):
+    """Build a fake gateway client answering inquiry by track_id."""
+    client = Mock()
+
+    def inquiry(track_id):
+        status_code = statuses[track_id]
+        if isinstance(status_code, Exception):
+            raise status_code
+        return {'result': 100, 'status': status_code, 'message': 'ok'}
+
+    client.inquiry = Mock(side_effect=inquiry)
+    client.verify_payment = Mock(return_value={
+        'result': 100,
+        'ref_number': '987654321',
+        'card_number': '6219-86**-****-1234',
+        'success': True,
+    })
+    return client
+
+
+@pytest.mark.django_db
+class TestReconciliationEngine:
+    """Tests for ReconciliationEngine."""
+
+    def test_applies_gateway_outcomes(self, user, payment_factory):
+        """Test paid, cancelled, expired and pending transitions in one run."""
+        subscription = Subscription.objects.create(user=user, duration_months=1)
+        paid = payment_factory(
+            user=user,
+            track_id=1,
+            meta={'subscription_id': subscription.id, 'months': 1}
+        )
+        cancelled = payment_factory(user=user, track_id=2)
+        expired = payment_factory(user=user, track_id=3)
+        PaymentTransaction.objects.filter(pk=expired.pk).update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+        pending = payment_factory(user=user, track_id=4)
+
+        client = make_client({1: 1, 2: -2, 3: -1, 4: -1})
+        engine = ReconciliationEngine(client=client, max_workers=4, batch_size=2)
+        stats = engine.run(pending_zibal_transactions(timezone.now() - timedelta(days=1)))
+
+        assert stats.total == 4
+        assert stats.reconciled == 3
+        assert stats.still_pending == 1
+        assert stats.batches == 2
+        client.verify_payment.assert_called_once_with(1)
+
+        for payment in (paid, cancelled, expired, pending):
+            payment.refresh_from_db()
+        subscription.refresh_from_db()
+
+        assert paid.status == PaymentTransaction.PaymentStatus.PAID
+        assert cancelled.status == PaymentTransaction.PaymentStatus.FAILED
+        assert expired.status == PaymentTransaction.PaymentStatus.EXPIRED
+        assert (cancelled.message, expired.message) == ('Payment cancelled', 'Payment expired')
+        assert pending.status == PaymentTransaction.PaymentStatus.PENDING
+        assert subscription.status == Subscription.SubscriptionStatus.ACTIVE
+
+    def test_gateway_errors_are_counted(self, user, payment_factory):
+        """Test that a gateway error fails only the affected transaction."""
+        payment_factory(user=user, track_id=1)
+        payment_factory(user=user, track_id=2)
+
+        client = make_client({1: ZibalError('timeout'), 2: -2})
+        engine = ReconciliationEngine(client=client, max_workers=2)
+        stats = engine.run(pending_zibal_transactions(timezone.now() - timedelta(days=1)))
+
+        assert stats.failed == 1
+        assert stats.reconciled == 1
+        summary = stats.as_dict()
+        assert summary['total'] == 2
+        assert 'p95' in summary['gateway_latency_ms']
+
+    def test_dry_run_does_not_verify_or_write(self, user, payment_factory):
+        """Test dry run only performs inquiries."""
+        payment = payment_factory(user=user, track_id=1)
+
+        client = make_client({1: 1})
+        stats = ReconciliationEngine(client=client, dry_run=True).run(
+            pending_zibal_transactions(timezone.now() - timedelta(days=1))
+        )
+
+        assert stats.reconciled == 1
+        client.verify_payment.assert_not_called()
+        payment.refresh_from_db()
+        assert payment.status == PaymentTransaction.PaymentStatus.PENDING
+
+
+@pytest.mark.django_db
+def test_reconcile_task_returns_stats(user, monkeypatch, payment_factory):
+    """Test the Celery task and management command share the engine."""
+    from apps.billing.payments import reconciliation
+    from apps.billing.tasks import reconcile_pending_payments
+
+    payment_factory(user=user, track_id=1, next_check_at=timezone.now() - timedelta(minutes=1))
+    monkeypatch.setattr(reconciliation, 'get_zibal_client', lambda: make_client({1: -2}))
+
+    result = reconcile_pending_payments()
+
+    assert result['total'] == 1
+    assert result['reconciled'] == 1
+    assert result['stats']['throughput_per_sec'] >= 0
+
+    payment_factory(user=user, track_id=2)
+    monkeypatch.setattr(reconciliation, 'get_zibal_client', lambda: make_client({2: -2}))
+    call_command('zibal_reconcile', '--hours=1', stdout=Mock())
+    failed = PaymentTransaction.objects.get(track_id=2)
+    assert failed.status == PaymentTransaction.PaymentStatus.FAILED
+
+
+@pytest.mark.django_db
+class TestIncrementalReconciliation:
+    """Tests for the high-water mark and next-check schedule."""
+
+    def test_admit_advances_high_water_mark(self, user, payment_factory):
+        """Test transactions past the mark are scheduled once."""
+        old = payment_factory(user=user, track_id=1)
+        recent = payment_factory(user=user, track_id=2)
+        PaymentTransaction.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+        assert admit_new_transactions() == 1
+        old.refresh_from_db()
+        recent.refresh_from_db()
+        assert old.next_check_at is not None
+        assert recent.next_check_at is None
+
+        cursor = ReconciliationCursor.objects.get(name='zibal')
+        assert cursor.last_id == old.id
+        assert admit_new_transactions() == 0
+
+    def test_only_due_transactions_are_checked(self, user, payment_factory):
+        """Test a run skips transactions whose next check is in the future."""
+        due = payment_factory(
+            user=user, track_id=1, next_check_at=timezone.now() - timedelta(minutes=1)
+        )
+        payment_factory(user=user, track_id=2, next_check_at=timezone.now() + timedelta(hours=1))
+
+        assert list(due_zibal_transactions().values_list('id', flat=True)) == [due.id]
+
+    def test_pending_outcome_is_rescheduled_with_backoff(self, user, payment_factory):
+        """Test still-pending transactions get a later next check."""
+        payment = payment_factory(
+            user=user, track_id=1, next_check_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        ReconciliationEngine(client=make_client({1: -1})).run(due_zibal_transactions())
+
+        payment.refresh_from_db()
+        assert payment.check_attempts == 1
+        assert payment.next_check_at > timezone.now()
+
+    def test_next_check_delay_grows(self):
+        """Test backoff grows with attempts and age and is capped."""
+        young = timedelta(minutes=1)
+        assert next_check_delay(young, 2) > next_check_delay(young, 1)
+        assert next_check_delay(timedelta(hours=8), 1) == timedelta(hours=2)
+        assert next_check_delay(young, 30) == timedelta(hours=6)
@@ -0,0 +1,75 @@
+"""
+Tests for subscription expiry reminders.
+"""
+import pytest
+from datetime import timedelta
+from unittest.mock import Mock
+from django.utils import timezone
+
+from apps.billing.models import SubscriptionReminder
+from apps.billing.reminders import cohort_chunks, remind_chunk, send_expiry_reminders
+from apps.notifications.models import Notification
+from apps.notifications.sms import SMSError
+
+
+@pytest.mark.django_db
+class TestExpiryReminders:
+    """Tests for send_expiry_reminders."""
+
+    def test_cohorts_are_reminded_once(self, user, subscription_factory):
+        """Test 7-day and 1-day cohorts are notified and reruns are deduped."""
+        subscription_factory(user=user, expires_in=timedelta(days=6, hours=12))
+        subscription_factory(user=user, expires_in=timedelta(hours=12))
+        subscription_factory(user=user, expires_in=timedelta(days=3))
+        sms_sender = Mock()
+
+        counts = send_expiry_reminders(chunk_size=1, sms_sender=sms_sender)
+
+        assert counts == {'7d': 1, '1d': 1}
+        assert SubscriptionReminder.objects.count() == 2
+        assert Notification.objects.filter(
+            recipient=user,
+            notification_type=Notification.NotificationType.REMINDER
+        ).count() == 2
+        messages = [
+            message
+            for call in sms_sender.send_many.call_args_list
+            for message in call.args[0]
+        ]
+        assert [mobile for mobile, _ in messages] == [user.mobile, user.mobile]
+
+        assert send_expiry_reminders(sms_sender=Mock()) == {'7d': 0, '1d': 0}
+        assert Notification.objects.filter(recipient=user).count() == 2
+
+    def test_stale_chunk_is_not_reminded_twice(self, user, subscription_factory):
+        """Test a chunk another run reminded meanwhile sends nothing."""
+        subscription_factory(user=user, expires_in=timedelta(hours=12))
+        now = timezone.now()
+        kind = SubscriptionReminder.ReminderKind.ONE_DAY
+        chunk = next(cohort_chunks(kind, now, 100))
+
+        assert len(remind_chunk(kind, chunk, now)) == 1
+        assert remind_chunk(kind, chunk, now) == []
+        assert Notification.objects.filter(recipient=user).count() == 1
+
+    def test_sms_failure_keeps_notifications(self, user, subscription_factory):
+        """Test a failing SMS batch does not roll back in-app reminders."""
+        subscription_factory(user=user, expires_in=timedelta(hours=12))
+        sms_sender = Mock()
+        sms_sender.send_many.side_effect = SMSError('down')
+
+        counts = send_expiry_reminders(sms_sender=sms_sender)
+
+        assert counts['1d'] == 1
+        assert Notification.objects.filter(recipient=user).count() == 1
+
+    def test_task_reports_cohorts(self, user, subscription_factory):
+        """Test the Celery task returns the per-cohort counts."""
+        from apps.billing.tasks import send_subscription_expiry_reminders
+
+        subscription_factory(user=user, expires_in=timedelta(days=6, hours=12))
+
+        result = send_subscription_expiry_reminders()
+
+        assert result['reminded'] == 1
+        assert result['cohorts'] == {'7d': 1, '1d': 0}
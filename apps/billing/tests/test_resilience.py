@@ -0,0 +1,220 @@
+"""
+Tests for the gateway circuit breaker, adaptive timeouts and retry budget.
+"""
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+from apps.billing.payments.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AdaptiveTimeout,
+    CircuitBreaker,
+    CircuitOpenError,
+    ResiliencePolicy,
+    RetryBudget,
+)
+from apps.billing.payments.zibal_client import (
+    ZibalCircuitOpenError,
+    ZibalClient,
+    ZibalClientError,
+    ZibalError,
+)
+
+
+class TestCircuitBreaker:
+    """Tests for the shared circuit breaker."""
+
+    def test_opens_after_threshold(self):
+        """Test the circuit opens after enough failures in the window."""
+        breaker = CircuitBreaker('test', failure_threshold=3, window=30, recovery_timeout=30)
+
+        for _ in range(2):
+            breaker.record_failure(breaker.allow())
+        assert breaker.state == CLOSED
+
+        breaker.record_failure(breaker.allow())
+
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+    def test_state_shared_between_instances(self):
+        """Test another worker's breaker sees the open circuit."""
+        CircuitBreaker('test', failure_threshold=1)._open()
+
+        with pytest.raises(CircuitOpenError):
+            CircuitBreaker('test').allow()
+        assert CircuitBreaker('other').allow() == CLOSED
+
+    def test_half_open_single_probe(self):
+        """Test only one probe is admitted after the recovery timeout."""
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=30)
+
+        with patch('apps.billing.payments.resilience.time.time', return_value=1000.0):
+            breaker._open()
+        with patch('apps.billing.payments.resilience.time.time', return_value=1031.0):
+            assert breaker.state == HALF_OPEN
+            assert breaker.allow() == HALF_OPEN
+            with pytest.raises(CircuitOpenError):
+                breaker.allow()
+
+    def test_probe_success_closes(self):
+        """Test a successful probe closes the circuit."""
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=30)
+
+        with patch('apps.billing.payments.resilience.time.time', return_value=1000.0):
+            breaker._open()
+        with patch('apps.billing.payments.resilience.time.time', return_value=1031.0):
+            breaker.record_success(breaker.allow())
+
+        assert breaker.state == CLOSED
+        assert breaker.allow() == CLOSED
+
+    def test_probe_failure_reopens(self):
+        """Test a failed probe restarts the recovery timeout."""
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=30)
+
+        with patch('apps.billing.payments.resilience.time.time', return_value=1000.0):
+            breaker._open()
+        with patch('apps.billing.payments.resilience.time.time', return_value=1031.0):
+            breaker.record_failure(breaker.allow())
+            assert breaker.state == OPEN
+
+
+class TestAdaptiveTimeout:
+    """Tests for latency-driven timeouts."""
+
+    def test_uses_maximum_until_warm(self):
+        """Test the configured timeout is used without enough samples."""
+        timeouts = AdaptiveTimeout(maximum=10, min_samples=5)
+        timeouts.record(0.1)
+
+        assert timeouts.current() == 10
+
+    def test_follows_percentile_within_bounds(self):
+        """Test the timeout tracks the latency percentile, clamped."""
+        timeouts = AdaptiveTimeout(
+            maximum=10, minimum=0.5, percentile=0.99, multiplier=2, min_samples=5
+        )
+        for _ in range(99):
+            timeouts.record(0.2)
+        timeouts.record(1.5)
+
+        assert timeouts.current() == pytest.approx(3.0)
+
+        for _ in range(200):
+            timeouts.record(0.01)
+        assert timeouts.current() == 0.5
+
+
+class TestResiliencePolicy:
+    """Tests for how the policy feeds the adaptive timeout."""
+
+    def test_timeouts_raise_the_adaptive_timeout(self):
+        """Test attempts that time out push the timeout up instead of pinning it."""
+        policy = ResiliencePolicy('test-timeouts', max_timeout=10)
+        for _ in range(100):
+            policy.on_success(CLOSED, 0.2)
+        short = policy.timeout()
+        assert short == policy.timeouts.minimum
+
+        for _ in range(3):
+            policy.on_failure(CLOSED, latency=short, timeout=short)
+
+        assert policy.timeout() > short
+
+    def test_connection_errors_are_not_samples(self):
+        """Test fast failures leave the latency samples alone."""
+        policy = ResiliencePolicy('test-fast-failures', max_timeout=10)
+
+        policy.on_failure(CLOSED, latency=0.01, timeout=2)
+
+        assert not policy.timeouts._latencies
+
+    def test_half_open_probe_gets_ceiling(self):
+        """Test a recovery probe is not cut off by a learned short timeout."""
+        policy = ResiliencePolicy('test-probe', max_timeout=10)
+        for _ in range(100):
+            policy.on_success(CLOSED, 0.2)
+
+        assert policy.timeout(admitted_in=CLOSED) < 10
+        assert policy.timeout(admitted_in=HALF_OPEN) == 10
+        assert policy.timeout(3, admitted_in=HALF_OPEN) == 3
+
+
+class TestRetryBudget:
+    """Tests for the windowed retry budget."""
+
+    def test_budget_is_share_of_calls(self):
+        """Test retries stop once they exceed the share of calls."""
+        budget = RetryBudget('test', ratio=0.5, min_retries=1, window=60)
+        for _ in range(4):
+            budget.record_call()
+
+        spent = [budget.try_spend() for _ in range(3)]
+
+        assert spent == [True, True, False]
+
+
+class TestClientResilience:
+    """Tests for the breaker and budget inside ZibalClient."""
+
+    @patch('apps.billing.payments.zibal_client.time.sleep')
+    @patch('apps.billing.payments.zibal_client.requests.Session.post')
+    def test_open_circuit_fails_fast(self, mock_post, mock_sleep):
+        """Test calls are rejected without a request once the circuit opens."""
+        mock_post.side_effect = requests.exceptions.ConnectionError()
+        client = ZibalClient()
+        client.resilience.breaker.failure_threshold = 3
+
+        with pytest.raises(ZibalError):
+            client.inquiry(1)
+        assert mock_post.call_count == 3
+
+        with pytest.raises(ZibalCircuitOpenError):
+            client.inquiry(1)
+        assert mock_post.call_count == 3
+
+    @patch('apps.billing.payments.zibal_client.time.sleep')
+    @patch('apps.billing.payments.zibal_client.requests.Session.post')
+    def test_exhausted_budget_stops_retries(self, mock_post, mock_sleep):
+        """Test a call is not retried once the retry budget is spent."""
+        mock_post.side_effect = requests.exceptions.ConnectionError()
+        client = ZibalClient()
+        client.resilience.budget.min_retries = 0
+
+        with pytest.raises(ZibalError):
+            client.inquiry(1)
+
+        assert mock_post.call_count == 1
+
+    @patch('apps.billing.payments.zibal_client.time.sleep')
+    @patch('apps.billing.payments.zibal_client.requests.Session.post')
+    def test_client_error_fails_without_retry(self, mock_post, mock_sleep):
+        """Test a 4xx response is raised at once and is not a breaker failure."""
+        response = requests.Response()
+        response.status_code = 403
+        mock_post.return_value = response
+        client = ZibalClient()
+        client.resilience.breaker.failure_threshold = 1
+
+        with pytest.raises(ZibalClientError, match='HTTP 403'):
+            client.inquiry(1)
+
+        assert mock_post.call_count == 1
+        mock_sleep.assert_not_called()
+        assert client.resilience.breaker.state == CLOSED
+
+    @patch('apps.billing.payments.zibal_client.requests.Session.post')
+    def test_success_records_latency(self, mock_post):
+        """Test successful calls feed the adaptive timeout."""
+        mock_post.return_value = Mock(json=Mock(return_value={'result': 100, 'status': 1}))
+        client = ZibalClient()
+
+        client.inquiry(1)
+
+        assert len(client.resilience.timeouts._latencies) == 1
+        assert mock_post.call_args.kwargs['timeout'] == client.config.timeout
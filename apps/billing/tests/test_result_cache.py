@@ -0,0 +1,49 @@
+"""
+Tests for the Zibal verify/inquiry result cache.
+"""
+from unittest.mock import Mock
+
+from django.test import override_settings
+
+from apps.billing.payments.result_cache import (
+    INQUIRY,
+    VERIFY,
+    ZibalResultCache,
+    cached_inquiry,
+    cached_verify,
+)
+
+
+class TestZibalResultCache:
+    """Tests for ZibalResultCache."""
+
+    def test_final_verify_is_served_from_cache(self):
+        """Test a paid verify result is fetched from the gateway once."""
+        client = Mock()
+        client.verify_payment.return_value = {'result': 100, 'status': 1, 'success': True}
+
+        first = cached_verify(111, client=client)
+        second = cached_verify(111, client=client)
+
+        assert first == second
+        client.verify_payment.assert_called_once_with(111)
+        assert ZibalResultCache().stats()[VERIFY] == {'hits': 1, 'misses': 1}
+
+    @override_settings(ZIBAL_RESULT_CACHE_PENDING_TTL=0)
+    def test_pending_inquiry_uses_short_ttl(self):
+        """Test pending inquiry results expire with the pending TTL."""
+        client = Mock()
+        client.inquiry.return_value = {'result': 100, 'status': -1}
+
+        cached_inquiry(222, client=client)
+        cached_inquiry(222, client=client)
+
+        assert client.inquiry.call_count == 2
+        assert ZibalResultCache().stats()[INQUIRY] == {'hits': 0, 'misses': 2}
+
+    def test_is_final(self):
+        """Test status-based finality rules."""
+        assert ZibalResultCache.is_final(VERIFY, {'success': True, 'status': 1})
+        assert ZibalResultCache.is_final(INQUIRY, {'status': -2})
+        assert not ZibalResultCache.is_final(INQUIRY, {'status': -1})
+        assert not ZibalResultCache.is_final(VERIFY, {'success': False, 'status': -1})
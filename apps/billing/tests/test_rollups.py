@@ -0,0 +1,174 @@
+"""
+Tests for daily revenue rollups.
+"""
+import pytest
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from apps.billing.models import DailyRevenueRollup, PaymentTransaction
+from apps.billing.rollups import (
+    REFRESH_LOCK_KEY,
+    rebuild_days,
+    rebuild_rollups,
+    refresh_rollups,
+    revenue_report,
+)
+
+
+@pytest.mark.django_db
+class TestRevenueRollups:
+    """Tests for refresh, rebuild and the report."""
+
+    def test_refresh_follows_transitions(self, user, vendor, payment_factory):
+        """Test a status change moves the amount between status rows."""
+        today = timezone.localdate()
+        payment = payment_factory(user=user, order_id='AP-ROLL-1', amount_irr=500000, vendor=vendor)
+        payment_factory(
+            user=user,
+            order_id='AP-ROLL-2',
+            amount_irr=300000,
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+
+        refresh_rollups()
+        report = revenue_report(today, today + timedelta(days=1))
+        assert report == [{
+            'day': today,
+            'transaction_count': 2,
+            'amount_irr': 800000,
+            'paid_count': 1,
+            'paid_amount_irr': 300000,
+            'success_ratio': 0.5,
+        }]
+
+        payment.mark_as_paid(result_code=100)
+        refresh_rollups()
+
+        by_status = revenue_report(today, today + timedelta(days=1), group_by='status')
+        assert by_status == [{
+            'status': 'paid',
+            'transaction_count': 2,
+            'amount_irr': 800000,
+            'paid_count': 2,
+            'paid_amount_irr': 800000,
+            'success_ratio': 1.0,
+        }]
+        by_vendor = revenue_report(today, today + timedelta(days=1), vendor_id=vendor.id)
+        assert by_vendor[0]['amount_irr'] == 500000
+
+    def test_refresh_only_touches_changed_days(self, user, payment_factory):
+        """Test a refresh with no changes rewrites nothing."""
+        payment_factory(user=user, order_id='AP-ROLL-1', amount_irr=500000)
+        refresh_rollups()
+
+        later = timezone.now() + timedelta(hours=1)
+        assert refresh_rollups(now=later) == {'days': 1, 'rows': 1}
+        assert refresh_rollups(now=later + timedelta(hours=1)) == {'days': 0, 'rows': 0}
+
+    def test_rebuild_range(self, user, payment_factory):
+        """Test a rebuild recomputes old days and drops stale rows."""
+        old = payment_factory(user=user, order_id='AP-ROLL-1', amount_irr=500000)
+        PaymentTransaction.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=3)
+        )
+        old_day = timezone.localdate() - timedelta(days=3)
+        DailyRevenueRollup.objects.create(
+            day=old_day - timedelta(days=1),
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            status=PaymentTransaction.PaymentStatus.PAID,
+            transaction_count=9,
+            amount_irr=9
+        )
+
+        written = rebuild_rollups(
+            old_day - timedelta(days=7), timezone.localdate(), days_per_batch=2
+        )
+
+        assert written == 1
+        assert list(DailyRevenueRollup.objects.values_list('day', flat=True)) == [old_day]
+        call_command('billing_rollup', '--rebuild', stdout=None)
+
+    def test_first_refresh_seeds_history(self, user, payment_factory):
+        """Test the first refresh rebuilds old days and later ones are incremental."""
+        old = payment_factory(user=user, order_id='AP-ROLL-1', amount_irr=500000)
+        PaymentTransaction.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=40),
+            updated_at=timezone.now() - timedelta(days=40)
+        )
+        payment_factory(user=user, order_id='AP-ROLL-2', amount_irr=300000)
+
+        result = refresh_rollups()
+
+        assert result['rows'] == 2
+        assert DailyRevenueRollup.objects.count() == 2
+        assert refresh_rollups() == {'days': 1, 'rows': 1}
+
+    def test_rebuild_days_scans_only_touched_days(self, user, payment_factory):
+        """Test two far apart days are aggregated without the days between."""
+        today = timezone.localdate()
+        for offset, order_id in ((0, 'AP-ROLL-1'), (30, 'AP-ROLL-2'), (60, 'AP-ROLL-3')):
+            payment = payment_factory(user=user, order_id=order_id, amount_irr=100000)
+            PaymentTransaction.objects.filter(pk=payment.pk).update(
+                created_at=timezone.now() - timedelta(days=offset)
+            )
+
+        assert rebuild_days([today, today - timedelta(days=60)]) == 2
+        assert sorted(DailyRevenueRollup.objects.values_list('day', flat=True)) == [
+            today - timedelta(days=60), today
+        ]
+
+    def test_overlapping_refresh_is_skipped(self, user, payment_factory):
+        """Test a refresh does nothing while another one holds the lock."""
+        payment_factory(user=user, order_id='AP-ROLL-1', amount_irr=500000)
+        cache.set(REFRESH_LOCK_KEY, 'other-run')
+
+        try:
+            assert refresh_rollups()['skipped']
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+        assert not DailyRevenueRollup.objects.exists()
+
+    def test_rollup_group_is_unique(self):
+        """Test a second row for the same group, even without a vendor, is rejected."""
+        values = {
+            'day': timezone.localdate(),
+            'purpose': PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            'status': PaymentTransaction.PaymentStatus.PAID,
+        }
+        DailyRevenueRollup.objects.create(**values)
+
+        with pytest.raises(IntegrityError), transaction.atomic():
+            DailyRevenueRollup.objects.create(**values)
+
+    def test_report_endpoint(self, api_client, user, payment_factory):
+        """Test the admin report endpoint validates and serves rollups."""
+        user.is_staff = True
+        user.save(update_fields=['is_staff'])
+        api_client.force_authenticate(user=user)
+        payment_factory(
+            user=user,
+            order_id='AP-ROLL-1',
+            amount_irr=500000,
+            status=PaymentTransaction.PaymentStatus.PAID
+        )
+        refresh_rollups()
+        today = timezone.localdate()
+        url = reverse('revenue-report')
+
+        response = api_client.get(url, {
+            'start': today.isoformat(),
+            'end': (today + timedelta(days=1)).isoformat(),
+            'group_by': 'purpose',
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0]['purpose'] == 'subscription'
+        assert response.data['results'][0]['paid_amount_irr'] == 500000
+
+        response = api_client.get(url, {'start': today.isoformat(), 'end': today.isoformat()})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,69 @@
+"""
+Tests for the fast list serializers.
+"""
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+
+from apps.billing.models import Subscription, PaymentTransaction
+from apps.billing.serializers import (
+    FastPaymentTransactionSerializer,
+    FastSubscriptionSerializer,
+    PaymentTransactionSerializer,
+    SubscriptionSerializer,
+)
+
+
+@pytest.mark.django_db
+class TestFastSerializers:
+    """Fast serializers must match the DRF serializers field for field."""
+
+    def test_payment_transaction_output_matches(self, user):
+        """Test paid and unpaid transactions serialize identically."""
+        PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=1500000,
+            order_id='AP-FAST-1',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.PAID,
+            track_id=123,
+            result_code=100,
+            paid_at=timezone.now(),
+            card_pan_masked='6219-86**-****-1234',
+            ref_number='987'
+        )
+        PaymentTransaction.objects.create(
+            user=user,
+            purpose=PaymentTransaction.PaymentPurpose.DELIVERY_FEE,
+            amount_irr=0,
+            order_id='AP-FAST-2',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL
+        )
+        queryset = PaymentTransaction.objects.order_by('id')
+        fast = FastPaymentTransactionSerializer()
+
+        expected = PaymentTransactionSerializer(queryset, many=True).data
+        actual = fast.serialize(queryset.values(*fast.value_fields))
+
+        assert actual == [dict(row) for row in expected]
+        assert list(actual[0]) == list(PaymentTransactionSerializer.Meta.fields)
+
+    def test_subscription_output_matches(self, user):
+        """Test active, lapsed and pending subscriptions serialize identically."""
+        Subscription.objects.create(user=user, duration_months=1).activate()
+        Subscription.objects.create(
+            user=user,
+            status=Subscription.SubscriptionStatus.ACTIVE,
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+        Subscription.objects.create(user=user)
+        queryset = Subscription.objects.order_by('id')
+        fast = FastSubscriptionSerializer()
+
+        expected = SubscriptionSerializer(queryset, many=True).data
+        actual = fast.serialize(queryset.values(*fast.value_fields))
+
+        assert actual == [dict(row) for row in expected]
+        assert list(actual[0]) == list(SubscriptionSerializer.Meta.fields)
+        assert [row['is_active'] for row in actual] == [True, False, False]
@@ -0,0 +1,167 @@
+"""
+Tests for the Zibal gateway simulator.
+"""
+import asyncio
+import io
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from apps.billing.models import PaymentTransaction
+from apps.billing.payments.simulator import (
+    LatencyProfile,
+    ZibalSimulator,
+    install_simulator,
+)
+from apps.billing.payments.zibal_client import AsyncZibalClient, ZibalClient, ZibalError
+from apps.billing.services import process_callback
+
+
+@pytest.fixture
+def simulated_client():
+    client = ZibalClient()
+    simulator = install_simulator(client, ZibalSimulator(track_id_start=1000, seed=1))
+    return client, simulator
+
+
+class TestLatencyProfile:
+    """Tests for latency distributions."""
+
+    def test_parse(self):
+        """Test parsing distribution specs."""
+        profile = LatencyProfile.parse('lognormal:0.08:0.5')
+
+        assert profile == LatencyProfile('lognormal', 0.08, 0.5)
+        assert LatencyProfile.parse('fixed').mean == 0.0
+        with pytest.raises(ValueError):
+            LatencyProfile.parse('gaussian:1')
+
+
+class TestZibalSimulator:
+    """Tests for simulated gateway state transitions."""
+
+    def test_request_settle_verify(self, simulated_client):
+        """Test a payment goes pending -> paid -> verified."""
+        client, simulator = simulated_client
+
+        result = client.request_payment(
+            amount=100000, order_id='ORD-1', callback_url='https://x.test/cb'
+        )
+        assert result['track_id'] == 1000
+        assert client.inquiry(1000)['status'] == ZibalClient.STATUS_PENDING
+        assert client.verify_payment(1000)['success'] is False
+
+        callback = simulator.settle(1000, paid=True)
+
+        query = parse_qs(urlsplit(callback).query)
+        assert query['trackId'] == ['1000'] and query['success'] == ['1']
+        first = client.verify_payment(1000)
+        second = client.verify_payment(1000)
+        assert first['success'] is True and first['is_duplicate'] is False
+        assert second['is_duplicate'] is True
+        assert simulator.calls['v1/verify'] == 3
+
+    def test_cancelled_payment(self, simulated_client):
+        """Test a cancelled payment never verifies."""
+        client, simulator = simulated_client
+        client.request_payment(amount=100000, order_id='ORD-1', callback_url='https://x.test/cb')
+
+        simulator.settle(1000, paid=False)
+
+        assert client.inquiry(1000)['status'] == ZibalClient.STATUS_CANCELLED
+        assert client.verify_payment(1000)['success'] is False
+
+    def test_error_rate(self):
+        """Test injected errors surface as gateway errors."""
+        client = ZibalClient()
+        install_simulator(client, ZibalSimulator(error_rate=1.0))
+        client.resilience.max_attempts = 1
+
+        with pytest.raises(ZibalError, match='Gateway error'):
+            client.inquiry(1)
+
+    def test_latency_over_timeout(self):
+        """Test latency above the request timeout raises a timeout."""
+        client = ZibalClient()
+        install_simulator(client, ZibalSimulator(latency=LatencyProfile('fixed', 0.2)))
+        client.resilience.max_attempts = 1
+
+        with pytest.raises(ZibalError, match='timeout'):
+            client.inquiry(1, timeout=0.01)
+
+    def test_httpx_transport(self):
+        """Test the async client against the simulator."""
+        simulator = ZibalSimulator(track_id_start=1)
+
+        async def main():
+            async with AsyncZibalClient(transport=simulator.httpx_transport()) as client:
+                await client.request_payment(
+                    amount=5000, order_id='A', callback_url='https://x.test/cb'
+                )
+                simulator.settle(1, paid=True)
+                return await client.verify_payment(1)
+
+        assert asyncio.run(main())['success'] is True
+
+    def test_wsgi_app(self):
+        """Test the WSGI app answers API calls and redirects from the start page."""
+        simulator = ZibalSimulator(track_id_start=7)
+        responses = []
+
+        def call(method, path, body=b'', query=''):
+            environ = {
+                'REQUEST_METHOD': method,
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': io.BytesIO(body),
+            }
+
+            def start_response(status, headers):
+                responses.append((status, dict(headers)))
+
+            content = b''.join(simulator(environ, start_response))
+            return responses[-1], content
+
+        payload = json.dumps({
+            'merchant': 'zibal',
+            'amount': 5000,
+            'orderId': 'A',
+            'callbackUrl': 'https://x.test/cb',
+        })
+        (status, _), content = call('POST', '/v1/request', payload.encode())
+        assert status == '200 OK'
+        assert json.loads(content)['trackId'] == 7
+
+        (status, headers), _ = call('GET', '/start/7', query='paid=0')
+        assert status == '302 Found'
+        assert 'success=0' in headers['Location']
+
+
+@pytest.mark.django_db
+def test_callback_against_simulator(user, vendor):
+    """Test the callback flow verifies a payment settled on the simulator."""
+    client = ZibalClient()
+    simulator = install_simulator(client, ZibalSimulator(track_id_start=500))
+    track_id = client.request_payment(
+        amount=500000, order_id='ORD-SIM', callback_url='https://x.test/cb'
+    )['track_id']
+    PaymentTransaction.objects.create(
+        user=user,
+        vendor=vendor,
+        purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+        amount_irr=500000,
+        order_id='ORD-SIM',
+        gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+        status=PaymentTransaction.PaymentStatus.PENDING,
+        track_id=track_id,
+    )
+    simulator.settle(track_id, paid=True)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr('apps.billing.payments.zibal_client.get_zibal_client', lambda: client)
+        payment = process_callback(track_id)
+
+    assert payment.status == PaymentTransaction.PaymentStatus.PAID
+    assert payment.ref_number == str(simulator.get_payment(track_id).ref_number)
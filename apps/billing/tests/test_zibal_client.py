@@ -1,12 +1,18 @@
 """
 Tests for Zibal payment gateway client.
 """
+import asyncio
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+import httpx
 import requests
+from django.test import override_settings
 
+from apps.billing.payments.resilience import CLOSED
 from apps.billing.payments.zibal_client import (
+    AsyncZibalClient,
     ZibalClient,
+    ZibalClientError,
     ZibalError,
     ZibalConfig,
 )
@@ -184,3 +190,96 @@ class TestZibalClient:
         assert 'یافت نشد' in ZibalClient.get_result_message(102)
         assert 'قبلاً تایید' in ZibalClient.get_result_message(201)
         assert 'ناشناخته' in ZibalClient.get_result_message(9999)
+
+
+class TestZibalConnectionPool:
+    """Tests for connection pool configuration."""
+
+    @override_settings(ZIBAL_POOL_MAXSIZE=7, ZIBAL_POOL_BLOCK=False)
+    def test_sync_pool_size_from_settings(self):
+        """Test sync client mounts an adapter sized from settings."""
+        client = ZibalClient()
+
+        adapter = client.session.get_adapter('https://gateway.zibal.ir/v1/request')
+
+        assert adapter._pool_maxsize == 7
+        assert adapter._pool_block is False
+
+
+class TestAsyncZibalClient:
+    """Tests for the asyncio Zibal client."""
+
+    @staticmethod
+    def _run(handler, coro_factory, **kwargs):
+        async def main():
+            async with AsyncZibalClient(transport=httpx.MockTransport(handler), **kwargs) as client:
+                return await coro_factory(client)
+        return asyncio.run(main())
+
+    def test_inquiry_and_verify(self):
+        """Test async inquiry and verify share response parsing."""
+        def handler(request):
+            if request.url.path == '/v1/inquiry':
+                return httpx.Response(200, json={'result': 100, 'status': 1, 'message': 'paid'})
+            return httpx.Response(200, json={
+                'result': 100,
+                'paidAt': '2025-10-05 12:30:45',
+                'amount': 100000,
+                'status': 1,
+                'refNumber': 987654321,
+                'cardNumber': '6219-86**-****-1234',
+            })
+
+        async def calls(client):
+            return await asyncio.gather(client.inquiry(1), client.verify_payment(1))
+
+        inquiry, verify = self._run(handler, calls)
+
+        assert inquiry['status'] == 1
+        assert verify['success'] is True
+        assert verify['ref_number'] == '987654321'
+
+    def test_request_payment_http_error(self):
+        """Test HTTP errors are raised as ZibalError after retries."""
+        handler = Mock(return_value=httpx.Response(500))
+
+        async def call(client):
+            return await client.request_payment(
+                amount=100000,
+                order_id='TEST-001',
+                callback_url='https://example.com/callback'
+            )
+
+        with patch('asyncio.sleep', new=AsyncMock()):
+            with pytest.raises(ZibalError, match='Gateway error'):
+                self._run(handler, call)
+
+        assert handler.call_count == 3
+
+    def test_client_error_is_not_retried(self):
+        """Test a 4xx response raises at once without a breaker failure."""
+        handler = Mock(return_value=httpx.Response(400))
+
+        async def call(client):
+            client.resilience.breaker.failure_threshold = 1
+            with pytest.raises(ZibalClientError, match='HTTP 400'):
+                await client.inquiry(1)
+            return client.resilience.breaker.state
+
+        with patch('asyncio.sleep', new=AsyncMock()) as mock_sleep:
+            assert self._run(handler, call) == CLOSED
+
+        assert handler.call_count == 1
+        mock_sleep.assert_not_called()
+
+    def test_deadline_exceeded(self):
+        """Test per-call deadline bounds the whole call."""
+        async def slow_handler(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={'result': 100, 'status': 1})
+
+        async def call(client):
+            return await client.inquiry(1, deadline=0.05)
+
+        with pytest.raises(ZibalError, match='deadline'):
+            self._run(slow_handler, call)
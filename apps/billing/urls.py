@@ -8,6 +8,8 @@ from .views import (
     SubscriptionViewSet,
     PaymentTransactionViewSet,
     PaymentCallbackView,
+    BillingExportView,
+    RevenueReportView,
 )
 
 router = DefaultRouter()
@@ -18,6 +20,10 @@ urlpatterns = [
     # Payment callback (separate from router)
     path('payments/zibal/callback/', PaymentCallbackView.as_view(), name='zibal-callback'),
     
+    # Finance exports
+    path('exports/<str:export>/', BillingExportView.as_view(), name='billing-export'),
+    path('reports/revenue/', RevenueReportView.as_view(), name='revenue-report'),
+
     # Router URLs
     path('', include(router.urls)),
 ]
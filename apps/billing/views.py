@@ -2,36 +2,76 @@
 Billing views and API endpoints.
 """
 import logging
-from django.db import transaction
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from .models import Subscription, PaymentTransaction
 from .serializers import (
     SubscriptionSerializer,
     PaymentTransactionSerializer,
+    FastSubscriptionSerializer,
+    FastPaymentTransactionSerializer,
     SubscriptionStartRequestSerializer,
     PaymentStartResponseSerializer,
     PaymentCallbackSerializer,
     PaymentCallbackResponseSerializer,
+    BillingExportQuerySerializer,
+    RevenueReportQuerySerializer,
+)
+from .entitlements import get_user_entitlement
+from .exports import CONTENT_TYPES, ExportError, stream_export
+from .idempotency import IDEMPOTENCY_HEADER, run_idempotent
+from .pagination import BillingCursorPagination
+from .rollups import revenue_report
+from .payments.zibal_client import ZibalCircuitOpenError, ZibalClient, ZibalError
+from .payments.utils import calculate_subscription_amount, format_amount_display
+from .services import (
+    create_checkout,
+    register_checkout,
+    record_gateway_registration,
+    record_gateway_failure,
+    process_callback,
 )
-from .payments.zibal_client import get_zibal_client, ZibalError
-from .payments.utils import generate_order_id, calculate_subscription_amount, format_amount_display
 
 logger = logging.getLogger(__name__)
 
 
-class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
+class FastListMixin:
+    """
+    Serve ``list`` from ``.values()`` rows through a fast serializer.
+
+    The output matches ``serializer_class``; retrieve and other actions are
+    unchanged.
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        fast_serializer = self.fast_serializer_class()
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *fast_serializer.value_fields
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast_serializer.serialize(page))
+
+        return Response(fast_serializer.serialize(queryset))
+
+
+class SubscriptionViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for managing subscriptions.
     """
     serializer_class = SubscriptionSerializer
+    fast_serializer_class = FastSubscriptionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BillingCursorPagination
     
     def get_queryset(self):
         """Get subscriptions for current user."""
@@ -46,6 +86,10 @@ class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Get current user's subscriptions."""
+        # Users without an entitlement have nothing active to list
+        if not get_user_entitlement(request.user.id)['active']:
+            return Response([])
+
         subscriptions = self.get_queryset().filter(
             status=Subscription.SubscriptionStatus.ACTIVE
         )
@@ -55,6 +99,17 @@ class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
     @extend_schema(
         request=SubscriptionStartRequestSerializer,
         responses={201: PaymentStartResponseSerializer},
+        parameters=[
+            OpenApiParameter(
+                IDEMPOTENCY_HEADER,
+                str,
+                location=OpenApiParameter.HEADER,
+                required=False,
+                description=(
+                    'Client-generated key; retries with the same key replay the first response'
+                )
+            ),
+        ],
         summary="Start subscription payment",
         description=(
             "Initiates a new subscription payment process. "
@@ -67,7 +122,13 @@ class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
         Start subscription payment process.
         
         Creates a PaymentTransaction and returns redirect URL to gateway.
+        No DB transaction is held open during the gateway round trip.
+        Retries carrying the same Idempotency-Key replay the first response.
         """
+        return run_idempotent(request, 'subscription-start', lambda: self._start(request))
+
+    def _start(self, request):
+        """Run the payment start pipeline for one request."""
         serializer = SubscriptionStartRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
@@ -84,100 +145,81 @@ class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
             from apps.vendors.models import Vendor
             vendor = get_object_or_404(Vendor, id=vendor_id, is_active=True)
         
+        # Build callback URL
+        callback_url = request.build_absolute_uri('/api/payments/zibal/callback/')
+
         try:
-            with transaction.atomic():
-                # Generate unique order ID
-                order_id = generate_order_id(user_id=request.user.id)
-                
-                # Create subscription (pending payment)
-                subscription = Subscription.objects.create(
-                    user=request.user,
-                    vendor=vendor,
-                    plan_type=plan_type,
-                    status=Subscription.SubscriptionStatus.PENDING,
-                    amount_paid=0,
-                    duration_months=months
-                )
-                
-                # Build callback URL
-                callback_url = request.build_absolute_uri('/api/payments/zibal/callback/')
-                
-                # Create payment transaction
-                payment = PaymentTransaction.objects.create(
-                    user=request.user,
-                    vendor=vendor,
-                    purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
-                    amount_irr=amount,
-                    order_id=order_id,
-                    gateway=PaymentTransaction.PaymentGateway.ZIBAL,
-                    status=PaymentTransaction.PaymentStatus.INITIATED,
-                    callback_url=callback_url,
-                    meta={
-                        'subscription_id': subscription.id,
-                        'plan_type': plan_type,
-                        'months': months,
-                    }
-                )
-                
-                # Request payment from Zibal
-                zibal_client = get_zibal_client()
-                
-                try:
-                    result = zibal_client.request_payment(
-                        amount=amount,
-                        order_id=order_id,
-                        callback_url=callback_url,
-                        mobile=request.user.mobile,
-                        description=f"اشتراک {months} ماهه {subscription.get_plan_type_display()}"
-                    )
-                    
-                    if not result['success']:
-                        raise ZibalError(f"Payment request failed: {result.get('message')}")
-                    
-                    # Update payment with track_id
-                    payment.track_id = result['track_id']
-                    payment.status = PaymentTransaction.PaymentStatus.PENDING
-                    payment.save()
-                    
-                    # Create redirect URL
-                    redirect_url = zibal_client.create_start_url(result['track_id'])
-                    
-                    logger.info(
-                        f"Payment started: order_id={order_id}, track_id={result['track_id']}",
-                        extra={
-                            'user_id': request.user.id,
-                            'order_id': order_id,
-                            'track_id': result['track_id'],
-                            'amount': amount
-                        }
-                    )
-                    
-                    response_data = {
-                        'order_id': order_id,
-                        'track_id': result['track_id'],
-                        'redirect_url': redirect_url,
-                        'amount': amount,
-                        'amount_display': format_amount_display(amount),
-                        'subscription_id': subscription.id,
-                    }
-                    
-                    return Response(response_data, status=status.HTTP_201_CREATED)
-                    
-                except ZibalError as e:
-                    logger.error(f"Zibal error: {str(e)}", exc_info=True)
-                    payment.mark_as_failed(message=str(e))
-                    return Response(
-                        {'error': f'خطا در اتصال به درگاه پرداخت: {str(e)}'},
-                        status=status.HTTP_502_BAD_GATEWAY
-                    )
-                    
+            # Phase 1: commit pending rows quickly
+            subscription, payment = create_checkout(
+                user=request.user,
+                vendor=vendor,
+                plan_type=plan_type,
+                months=months,
+                amount=amount,
+                callback_url=callback_url
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error in payment start: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'خطای داخلی سرور'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        order_id = payment.order_id
+
+        try:
+            # Gateway registration runs outside any DB transaction
+            result = register_checkout(
+                payment,
+                mobile=request.user.mobile,
+                description=f"اشتراک {months} ماهه {subscription.get_plan_type_display()}"
+            )
+        except ZibalCircuitOpenError as e:
+            logger.warning(f"Zibal circuit open, payment not started: order_id={order_id}")
+            record_gateway_failure(payment, message=str(e))
+            return Response(
+                {'error': 'درگاه پرداخت موقتاً در دسترس نیست، لطفاً چند دقیقه دیگر تلاش کنید'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except ZibalError as e:
+            logger.error(f"Zibal error: {str(e)}", exc_info=True)
+            record_gateway_failure(payment, message=str(e))
+            return Response(
+                {'error': f'خطا در اتصال به درگاه پرداخت: {str(e)}'},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
         except Exception as e:
             logger.error(f"Unexpected error in payment start: {str(e)}", exc_info=True)
+            record_gateway_failure(payment, message='خطای داخلی سرور')
             return Response(
                 {'error': 'خطای داخلی سرور'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # Phase 2: short idempotent update with the gateway track_id
+        record_gateway_registration(payment, result['track_id'])
+
+        logger.info(
+            f"Payment started: order_id={order_id}, track_id={result['track_id']}",
+            extra={
+                'user_id': request.user.id,
+                'order_id': order_id,
+                'track_id': result['track_id'],
+                'amount': amount
+            }
+        )
+
+        response_data = {
+            'order_id': order_id,
+            'track_id': result['track_id'],
+            'redirect_url': result['redirect_url'],
+            'amount': amount,
+            'amount_display': format_amount_display(amount),
+            'subscription_id': subscription.id,
+        }
+
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
 
 class PaymentCallbackView(views.APIView):
     """
@@ -215,6 +257,7 @@ class PaymentCallbackView(views.APIView):
         
         This is the critical path where payment is verified.
         Only trust the verify response, not callback parameters.
+        Duplicate callbacks are served from the finished result.
         """
         serializer = PaymentCallbackSerializer(data=request.query_params or request.data)
         serializer.is_valid(raise_exception=True)
@@ -227,81 +270,8 @@ class PaymentCallbackView(views.APIView):
         )
         
         try:
-            # Find transaction by track_id
-            payment = PaymentTransaction.objects.select_for_update().get(
-                track_id=track_id,
-                gateway=PaymentTransaction.PaymentGateway.ZIBAL
-            )
-            
-            # Check if already processed (idempotency)
-            if payment.status == PaymentTransaction.PaymentStatus.PAID:
-                logger.info(f"Payment already processed: {payment.order_id}")
-                return self._build_response(payment)
-            
-            # Verify payment with Zibal
-            zibal_client = get_zibal_client()
-            
-            try:
-                verify_result = zibal_client.verify_payment(track_id)
-                
-                logger.info(
-                    f"Verify result: order_id={payment.order_id}, result={verify_result['result']}",
-                    extra={
-                        'order_id': payment.order_id,
-                        'result': verify_result['result'],
-                        'amount': verify_result['amount']
-                    }
-                )
-                
-                if verify_result['success']:
-                    # Payment successful
-                    with transaction.atomic():
-                        payment.mark_as_paid(
-                            result_code=verify_result['result'],
-                            ref_number=verify_result['ref_number'],
-                            card_pan=verify_result['card_number']
-                        )
-                        
-                        # Update meta with verify data
-                        payment.meta.update({
-                            'verified_at': verify_result['paid_at'],
-                            'verify_amount': verify_result['amount'],
-                        })
-                        payment.save()
-                        
-                        # Activate subscription if this is a subscription payment
-                        if payment.purpose == PaymentTransaction.PaymentPurpose.SUBSCRIPTION:
-                            subscription_id = payment.meta.get('subscription_id')
-                            if subscription_id:
-                                try:
-                                    subscription = Subscription.objects.get(id=subscription_id)
-                                    subscription.payment_transaction = payment
-                                    subscription.amount_paid = payment.amount_irr
-                                    subscription.activate(duration_months=payment.meta.get('months', 1))
-                                    
-                                    logger.info(
-                                        f"Subscription activated: {subscription.id}",
-                                        extra={'subscription_id': subscription.id}
-                                    )
-                                except Subscription.DoesNotExist:
-                                    logger.error(f"Subscription {subscription_id} not found")
-                        
-                        logger.info(f"Payment completed: {payment.order_id}")
-                else:
-                    # Payment failed or cancelled
-                    payment.mark_as_failed(
-                        result_code=verify_result['result'],
-                        message=verify_result.get('message', 'پرداخت ناموفق')
-                    )
-                    logger.warning(f"Payment failed: {payment.order_id}")
-                
-                return self._build_response(payment)
-                
-            except ZibalError as e:
-                logger.error(f"Zibal verify error: {str(e)}", exc_info=True)
-                payment.mark_as_failed(message=f"خطای تأیید پرداخت: {str(e)}")
-                return self._build_response(payment)
-                
+            payment = process_callback(track_id)
+            return self._build_response(payment)
         except PaymentTransaction.DoesNotExist:
             logger.error(f"Payment transaction not found for track_id: {track_id}")
             return Response(
@@ -321,7 +291,7 @@ class PaymentCallbackView(views.APIView):
             'order_id': payment.order_id,
             'status': payment.status,
             'result_code': payment.result_code,
-            'message': payment.message or zibal_client.get_result_message(payment.result_code or 0),
+            'message': payment.message or ZibalClient.get_result_message(payment.result_code or 0),
             'paid_at': payment.paid_at,
             'subscription_id': payment.meta.get('subscription_id'),
         }
@@ -338,12 +308,14 @@ class PaymentCallbackView(views.APIView):
         return Response(response_data, status=status.HTTP_200_OK)
 
 
-class PaymentTransactionViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentTransactionViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing payment transactions.
     """
     serializer_class = PaymentTransactionSerializer
+    fast_serializer_class = FastPaymentTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BillingCursorPagination
     
     def get_queryset(self):
         """Get transactions for current user."""
@@ -362,3 +334,80 @@ class PaymentTransactionViewSet(viewsets.ReadOnlyModelViewSet):
         )
         serializer = self.get_serializer(transaction)
         return Response(serializer.data)
+
+
+class BillingExportView(views.APIView):
+    """
+    Streaming export of payment transactions or subscriptions for finance.
+
+    Rows are streamed from a server-side cursor, so memory use does not
+    depend on the size of the export.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        parameters=[BillingExportQuerySerializer],
+        responses={(200, 'text/csv'): str, (200, 'application/x-ndjson'): str},
+        summary="Export billing data",
+        description=(
+            "Streams transactions or subscriptions as CSV or JSONL, filtered by creation "
+            "date and status."
+        )
+    )
+    def get(self, request, export):
+        """Stream the requested export."""
+        serializer = BillingExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        fmt = params['output']
+
+        try:
+            lines = stream_export(
+                export,
+                fmt,
+                start=params.get('start'),
+                end=params.get('end'),
+                statuses=params.get('status', ())
+            )
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{export}.{fmt}"'
+        return response
+
+
+class RevenueReportView(views.APIView):
+    """
+    Revenue dashboard data served from the daily rollup table.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        parameters=[RevenueReportQuerySerializer],
+        summary="Revenue report",
+        description=(
+            "Transaction counts, amounts and success ratio per day, vendor, "
+            "purpose or status, aggregated from daily rollups."
+        )
+    )
+    def get(self, request):
+        """Return the aggregated report."""
+        serializer = RevenueReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        report = revenue_report(
+            params['start'],
+            params['end'],
+            group_by=params['group_by'],
+            vendor_id=params.get('vendor_id'),
+            purpose=params.get('purpose')
+        )
+
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'group_by': params['group_by'],
+            'results': report,
+        })
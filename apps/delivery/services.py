@@ -1,4 +1,6 @@
 """Delivery domain services."""
+from typing import Dict, Iterable, List
+
 from django.db import transaction
 
 from .models import DeliveryOrder
@@ -16,6 +18,26 @@ def schedule_delivery(*, appointment, address: str, scheduled_for=None) -> Deliv
     )
 
 
+def schedule_deliveries(deliveries: Iterable[Dict], batch_size: int = 500) -> List[DeliveryOrder]:
+    """Create delivery orders in batched inserts, skipping appointments that have one.
+
+    Each item holds ``appointment_id``, ``address`` and ``scheduled_for``.
+    """
+
+    return DeliveryOrder.objects.bulk_create(
+        [
+            DeliveryOrder(
+                appointment_id=item['appointment_id'],
+                address=item['address'],
+                scheduled_for=item['scheduled_for'],
+            )
+            for item in deliveries
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
 @transaction.atomic
 def mark_delivery_in_transit(delivery: DeliveryOrder) -> DeliveryOrder:
     """Mark the delivery as in transit."""
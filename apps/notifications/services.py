@@ -1,4 +1,6 @@
 """Service layer for notifications."""
+from typing import Dict, Iterable, List
+
 from django.db import transaction
 
 from .models import Notification
@@ -14,3 +16,50 @@ def send_notification(*, recipient, title: str, message: str, notification_type:
         message=message,
         notification_type=notification_type,
     )
+
+
+def send_bulk_notifications(
+    *,
+    recipient_ids: Iterable[int],
+    title: str,
+    message: str,
+    notification_type: str = Notification.NotificationType.GENERAL,
+    batch_size: int = 500,
+) -> List[Notification]:
+    """Create the same notification for many recipients with batched inserts."""
+
+    return Notification.objects.bulk_create(
+        [
+            Notification(
+                recipient_id=recipient_id,
+                title=title,
+                message=message,
+                notification_type=notification_type,
+            )
+            for recipient_id in recipient_ids
+        ],
+        batch_size=batch_size,
+    )
+
+
+def send_notifications(notifications: Iterable[Dict], batch_size: int = 500) -> List[Notification]:
+    """Create notifications with their own recipients and texts in batched inserts.
+
+    Each item holds ``recipient_id``, ``title``, ``message`` and optionally
+    ``notification_type``.
+    """
+
+    return Notification.objects.bulk_create(
+        [
+            Notification(
+                recipient_id=item['recipient_id'],
+                title=item['title'],
+                message=item['message'],
+                notification_type=item.get(
+                    'notification_type', Notification.NotificationType.GENERAL
+                ),
+            )
+            for item in notifications
+        ],
+        batch_size=batch_size,
+    )
@@ -0,0 +1,79 @@
+"""Batched SMS delivery through Kavenegar."""
+import logging
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SMSError(Exception):
+    """Raised when the SMS provider rejects a batch."""
+
+
+class BatchSMSSender:
+    """
+    Send many SMS messages with as few provider calls as possible.
+
+    Messages are grouped into ``sendarray`` calls of up to ``batch_size``
+    receptors. When ``SMS_ENABLED`` is off, messages are only logged.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        sender: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.api_key = api_key or settings.KAVENEGAR_API_KEY
+        self.sender = sender or getattr(settings, 'KAVENEGAR_SENDER', '')
+        self.batch_size = batch_size or getattr(settings, 'SMS_BATCH_SIZE', 200)
+        self.enabled = settings.SMS_ENABLED if enabled is None else enabled
+        self._api = None
+
+    @property
+    def api(self):
+        if self._api is None:
+            from kavenegar import KavenegarAPI
+
+            self._api = KavenegarAPI(self.api_key)
+        return self._api
+
+    def send_many(self, messages: Iterable[Tuple[str, str]]) -> int:
+        """
+        Send ``(mobile, text)`` pairs in batches.
+
+        Returns:
+            Number of messages handed to the provider (or logged)
+
+        Raises:
+            SMSError: If the provider rejects a batch
+        """
+        sent = 0
+        batch = []
+        for mobile, text in messages:
+            if not mobile:
+                continue
+            batch.append((mobile, text))
+            if len(batch) >= self.batch_size:
+                sent += self._send_batch(batch)
+                batch = []
+        if batch:
+            sent += self._send_batch(batch)
+        return sent
+
+    def _send_batch(self, batch) -> int:
+        if not self.enabled:
+            logger.info(f'SMS disabled, skipping batch of {len(batch)} messages')
+            return len(batch)
+
+        try:
+            self.api.sms_sendarray({
+                'receptor': [mobile for mobile, _ in batch],
+                'sender': [self.sender] * len(batch),
+                'message': [text for _, text in batch],
+            })
+        except Exception as e:
+            raise SMSError(f'SMS batch of {len(batch)} failed: {str(e)}') from e
+        return len(batch)
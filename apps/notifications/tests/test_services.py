@@ -1,7 +1,8 @@
 """Service tests for notifications."""
 import pytest
 
-from apps.notifications.services import send_notification
+from apps.notifications.models import Notification
+from apps.notifications.services import send_bulk_notifications, send_notification
 
 
 @pytest.mark.django_db
@@ -15,3 +16,16 @@ def test_send_notification_creates_record(user_factory):
     )
     assert notification.recipient == recipient
     assert notification.title == 'System Alert'
+
+
+@pytest.mark.django_db
+def test_send_bulk_notifications_creates_records(user_factory):
+    recipients = [user_factory(), user_factory()]
+    notifications = send_bulk_notifications(
+        recipient_ids=[recipient.id for recipient in recipients],
+        title='System Alert',
+        message='Subscription expired.',
+        batch_size=1,
+    )
+    assert len(notifications) == 2
+    assert Notification.objects.filter(title='System Alert').count() == 2
@@ -0,0 +1,36 @@
+"""SMS sender tests for notifications."""
+from unittest.mock import Mock
+
+import pytest
+
+from apps.notifications.sms import BatchSMSSender, SMSError
+
+
+def test_send_many_batches_receptors():
+    sender = BatchSMSSender(api_key='key', sender='1000', batch_size=2, enabled=True)
+    sender._api = Mock()
+
+    sent = sender.send_many([('0912', 'a'), ('0913', 'b'), ('', 'skipped'), ('0914', 'c')])
+
+    assert sent == 3
+    assert sender._api.sms_sendarray.call_count == 2
+    first_batch = sender._api.sms_sendarray.call_args_list[0].args[0]
+    assert first_batch['receptor'] == ['0912', '0913']
+    assert first_batch['sender'] == ['1000', '1000']
+
+
+def test_send_many_disabled_only_logs():
+    sender = BatchSMSSender(enabled=False)
+    sender._api = Mock()
+
+    assert sender.send_many([('0912', 'a')]) == 1
+    sender._api.sms_sendarray.assert_not_called()
+
+
+def test_send_many_wraps_provider_errors():
+    sender = BatchSMSSender(api_key='key', enabled=True)
+    sender._api = Mock()
+    sender._api.sms_sendarray.side_effect = RuntimeError('down')
+
+    with pytest.raises(SMSError):
+        sender.send_many([('0912', 'a')])
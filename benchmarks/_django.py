@@ -0,0 +1,17 @@
+"""Shared Django bootstrap for benchmark scripts."""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup(settings_module: str = 'config.settings.test'):
+    """Configure Django so benchmarks can import apps without manage.py."""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+
+    django.setup()
@@ -0,0 +1,292 @@
+"""
+End-to-end billing throughput against the Zibal simulator.
+
+Seeds synthetic users and vendors in a fresh test database, then drives:
+
+- ``checkout``: ``POST /api/billing/subscriptions/start/`` through the full
+  view stack (two-phase checkout, gateway request);
+- ``callback``: the gateway callback for every checkout, after the simulator
+  settles it (verify, state transition, subscription activation);
+- ``reconciliation``: :class:`ReconciliationEngine` over N pending rows that
+  were paid or cancelled on the gateway without a callback.
+
+Each scenario reports throughput, latency percentiles and queries per
+request. Results are printed and optionally written as JSON; ``--compare``
+prints the change against an earlier result file.
+
+The database is ``config.settings.test``'s (in-memory SQLite unless
+``TEST_DATABASE_URL`` is set); a PostgreSQL URL gives production-like numbers.
+
+Usage:
+    python -m benchmarks.billing_e2e --checkouts 500 --pending 2000
+    python -m benchmarks.billing_e2e --latency lognormal:0.05:0.5 --output results.json
+    python -m benchmarks.billing_e2e --compare results.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import _django
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    return {
+        'p50': round(pick(50) * 1000, 3),
+        'p90': round(pick(90) * 1000, 3),
+        'p99': round(pick(99) * 1000, 3),
+        'max': round(ordered[-1] * 1000, 3),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def summarize(latencies, queries, elapsed, errors=0):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': percentiles(latencies),
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else 0,
+            'max': max(queries, default=0),
+        },
+    }
+
+
+def timed_request(send):
+    """Run one request; return (response, seconds, query count)."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - started
+    return response, elapsed, len(captured)
+
+
+def seed_users(count):
+    from django.contrib.auth import get_user_model
+
+    from apps.vendors.models import Vendor
+
+    User = get_user_model()
+    users = User.objects.bulk_create([
+        User(mobile=f'0912{i:07d}', first_name='Bench', last_name=str(i))
+        for i in range(count)
+    ])
+    vendor_user = User.objects.create(mobile='09190000000', user_type=User.UserType.VENDOR)
+    vendor = Vendor.objects.create(
+        user=vendor_user,
+        name='Bench Clinic',
+        vendor_type=Vendor.VendorType.DOCTOR,
+        is_verified=True,
+        is_active=True,
+    )
+    return list(User.objects.filter(pk__in=[user.pk for user in users])), vendor
+
+
+def run_checkout(users, count, vendor):
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    url = reverse('subscription-start')
+    client = APIClient()
+    latencies, queries, track_ids, errors = [], [], [], 0
+
+    started = time.perf_counter()
+    for i in range(count):
+        client.force_authenticate(user=users[i % len(users)])
+        payload = {'plan_type': 'business', 'months': 1 + i % 12, 'vendor_id': vendor.id}
+        response, elapsed, query_count = timed_request(
+            lambda: client.post(url, payload, format='json')
+        )
+        latencies.append(elapsed)
+        queries.append(query_count)
+        if response.status_code == 201:
+            track_ids.append(response.data['track_id'])
+        else:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, queries, elapsed, errors), track_ids
+
+
+def run_callback(simulator, track_ids):
+    from django.test import Client
+    from django.urls import reverse
+
+    url = reverse('zibal-callback')
+    client = Client()
+    latencies, queries, errors = [], [], 0
+
+    started = time.perf_counter()
+    for track_id in track_ids:
+        callback = simulator.settle(track_id)
+        query = callback.split('?', 1)[1]
+        response, elapsed, query_count = timed_request(lambda: client.get(f'{url}?{query}'))
+        latencies.append(elapsed)
+        queries.append(query_count)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, queries, elapsed, errors)
+
+
+def run_reconciliation(simulator, users, vendor, count, workers, batch_size):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+
+    from apps.billing.models import PaymentTransaction
+    from apps.billing.payments.reconciliation import (
+        ReconciliationEngine,
+        pending_zibal_transactions,
+    )
+
+    # Register on the gateway without callbacks, as if users closed the browser
+    rows = []
+    for i in range(count):
+        order_id = f'BENCH-REC-{i:08d}'
+        _, body = simulator.handle('v1/request', {
+            'merchant': 'zibal',
+            'amount': 500000,
+            'orderId': order_id,
+            'callbackUrl': 'http://bench/cb',
+        })
+        simulator.settle(body['trackId'])
+        rows.append(PaymentTransaction(
+            user=users[i % len(users)],
+            vendor=vendor,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000,
+            order_id=order_id,
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            status=PaymentTransaction.PaymentStatus.PENDING,
+            track_id=body['trackId'],
+        ))
+    PaymentTransaction.objects.bulk_create(rows, batch_size=1000)
+
+    since = timezone.now() - timedelta(days=1)
+    engine = ReconciliationEngine(max_workers=workers, batch_size=batch_size)
+    with CaptureQueriesContext(connection) as captured:
+        stats = engine.run(pending_zibal_transactions(since))
+
+    result = stats.as_dict()
+    result['queries'] = len(captured)
+    result['queries_per_row'] = round(len(captured) / count, 2) if count else 0
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=_django.ROOT,
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Print throughput and p99 changes against a baseline result."""
+    for name, scenario in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        throughput_key = (
+            'throughput_per_s' if 'throughput_per_s' in scenario else 'throughput_per_sec'
+        )
+        latency_key = 'latency_ms' if 'latency_ms' in scenario else 'gateway_latency_ms'
+        old, new = before.get(throughput_key) or 0, scenario.get(throughput_key) or 0
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+        old_p99 = before.get(latency_key, {}).get('p99')
+        new_p99 = scenario.get(latency_key, {}).get('p99')
+        print(
+            f"{name:15} throughput {old:>10} -> {new:>10} ({change}), "
+            f"p99 {old_p99} -> {new_p99} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--checkouts', type=int, default=500)
+    parser.add_argument('--pending', type=int, default=2000, help='Pending rows for reconciliation')
+    parser.add_argument(
+        '--latency',
+        default='fixed:0',
+        help='Simulated gateway latency distribution[:mean[:spread]]'
+    )
+    parser.add_argument('--pay-rate', type=float, default=0.8)
+    parser.add_argument('--workers', type=int, default=8, help='Reconciliation gateway workers')
+    parser.add_argument('--batch-size', type=int, default=100, help='Reconciliation batch size')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    _django.setup()
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from apps.billing.payments import zibal_client
+    from apps.billing.payments.simulator import LatencyProfile, ZibalSimulator, install_simulator
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    cache.clear()
+
+    simulator = ZibalSimulator(
+        latency=LatencyProfile.parse(args.latency),
+        pay_rate=args.pay_rate,
+        track_id_start=1,
+        seed=args.seed,
+    )
+    install_simulator(zibal_client.get_zibal_client(), simulator)
+
+    users, vendor = seed_users(args.users)
+    checkout, track_ids = run_checkout(users, args.checkouts, vendor)
+    result = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'params': vars(args),
+        },
+        'scenarios': {
+            'checkout': checkout,
+            'callback': run_callback(simulator, track_ids),
+            'reconciliation': run_reconciliation(
+                simulator, users, vendor, args.pending, args.workers, args.batch_size
+            ),
+        },
+        'gateway_calls': simulator.calls,
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fileobj:
+            json.dump(result, fileobj, indent=2)
+    if args.compare:
+        with open(args.compare) as fileobj:
+            compare(result, json.load(fileobj))
+
+
+if __name__ == '__main__':
+    main()
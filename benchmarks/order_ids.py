@@ -0,0 +1,54 @@
+"""
+Order ID generator throughput and insert locality.
+
+For each generator, reports IDs per second and the share of IDs that sort
+after every ID generated before them ("append ratio"). An append ratio of 1.0
+means every insert lands on the right edge of the ``order_id`` index.
+
+Usage:
+    python -m benchmarks.order_ids --count 200000
+"""
+import argparse
+import json
+import time
+
+from benchmarks import _django
+
+
+def measure(generator, count):
+    started = time.perf_counter()
+    ids = [generator(user_id=123) for _ in range(count)]
+    elapsed = time.perf_counter() - started
+
+    appends = 0
+    highest = ''
+    for order_id in ids:
+        if order_id > highest:
+            appends += 1
+            highest = order_id
+
+    return {
+        'ids_per_sec': round(count / elapsed),
+        'append_ratio': round(appends / count, 4),
+        'unique': len(set(ids)) == count,
+        'example': ids[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args()
+
+    _django.setup()
+    from apps.billing.payments.utils import MonotonicOrderIdGenerator, RandomOrderIdGenerator
+
+    print(json.dumps({
+        'count': args.count,
+        'random': measure(RandomOrderIdGenerator(), args.count),
+        'monotonic': measure(MonotonicOrderIdGenerator(), args.count),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Per-row cost of the billing list serializers.
+
+Compares the DRF ModelSerializers with the fast ``.values()`` path on
+in-memory rows, so only serialization is measured (no database).
+
+Usage:
+    python -m benchmarks.serializers --rows 5000 --repeat 5
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+
+from benchmarks import _django
+
+
+def build_rows(count):
+    from django.utils import timezone
+
+    from apps.billing.models import PaymentTransaction
+
+    now = timezone.now()
+    instances = []
+    for i in range(count):
+        instances.append(PaymentTransaction(
+            id=i + 1,
+            user_id=1,
+            order_id=f'AP-20251005142530-1-{i:06x}',
+            gateway=PaymentTransaction.PaymentGateway.ZIBAL,
+            purpose=PaymentTransaction.PaymentPurpose.SUBSCRIPTION,
+            amount_irr=500000 * (i % 12 + 1),
+            status=PaymentTransaction.PaymentStatus.PAID,
+            track_id=100000 + i,
+            result_code=100,
+            message='',
+            paid_at=now,
+            card_pan_masked='6219-86**-****-1234',
+            ref_number=str(900000 + i),
+            created_at=now - timedelta(minutes=i),
+        ))
+    return instances
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    _django.setup()
+    from apps.billing.serializers import (
+        FastPaymentTransactionSerializer,
+        PaymentTransactionSerializer,
+    )
+
+    instances = build_rows(args.rows)
+    fast = FastPaymentTransactionSerializer()
+    rows = [{name: getattr(obj, name) for name in fast.value_fields} for obj in instances]
+
+    assert fast.serialize(rows[:10]) == [
+        dict(row) for row in PaymentTransactionSerializer(instances[:10], many=True).data
+    ]
+
+    drf = best_of(args.repeat, lambda: PaymentTransactionSerializer(instances, many=True).data)
+    values = best_of(args.repeat, lambda: FastPaymentTransactionSerializer().serialize(rows))
+
+    print(json.dumps({
+        'rows': args.rows,
+        'drf_us_per_row': round(drf / args.rows * 1e6, 2),
+        'fast_us_per_row': round(values / args.rows * 1e6, 2),
+        'speedup': round(drf / values, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
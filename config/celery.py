@@ -31,11 +31,15 @@ def debug_task(self):
 app.conf.beat_schedule = {
     'cleanup-expired-appointments': {
         'task': 'apps.appointments.tasks.cleanup_expired_appointments',
-        'schedule': crontab(hour=2, minute=0),  # Every day at 2:00 AM
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes (chunked, resumable)
+    },
+    'dispatch-appointment-outbox': {
+        'task': 'apps.appointments.tasks.dispatch_appointment_outbox',
+        'schedule': crontab(minute='*'),  # Every minute (sweeps undispatched bookings)
     },
     'reconcile-pending-payments': {
         'task': 'apps.billing.tasks.reconcile_pending_payments',
-        'schedule': crontab(hour='*/4', minute=0),  # Every 4 hours
+        'schedule': crontab(minute='*/10'),  # Every 10 minutes (incremental)
     },
     'check-expired-subscriptions': {
         'task': 'apps.billing.tasks.check_expired_subscriptions',
@@ -45,4 +49,8 @@ app.conf.beat_schedule = {
         'task': 'apps.billing.tasks.send_subscription_expiry_reminders',
         'schedule': crontab(hour=9, minute=0),  # Every day at 9:00 AM
     },
+    'refresh-revenue-rollups': {
+        'task': 'apps.billing.tasks.refresh_revenue_rollups',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes (touched days only)
+    },
 }
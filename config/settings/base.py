@@ -5,6 +5,7 @@ import os
 from pathlib import Path
 
 import environ
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -168,6 +169,7 @@ SPECTACULAR_SETTINGS = {
 # CORS
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[])
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Redis Configuration
 REDIS_URL = env('REDIS_URL', default='redis://localhost:6379/0')
@@ -199,11 +201,40 @@ CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 # Kavenegar SMS Configuration
 KAVENEGAR_API_KEY = env('KAVENEGAR_API_KEY', default='')
 SMS_ENABLED = env.bool('SMS_ENABLED', default=False)
+KAVENEGAR_SENDER = env('KAVENEGAR_SENDER', default='')
+SMS_BATCH_SIZE = env.int('SMS_BATCH_SIZE', default=200)  # Kavenegar sendarray limit
 
 # Business Configuration
 BUSINESS_PLAN_BOOST_ENABLED = True
+BILLING_ENTITLEMENT_CACHE_ALIAS = 'default'
+BILLING_ENTITLEMENT_MAX_TTL = env.int('BILLING_ENTITLEMENT_MAX_TTL', default=24 * 60 * 60)
+BILLING_ENTITLEMENT_NEGATIVE_TTL = env.int('BILLING_ENTITLEMENT_NEGATIVE_TTL', default=5 * 60)
+BILLING_EXPIRY_CHUNK_SIZE = env.int('BILLING_EXPIRY_CHUNK_SIZE', default=500)
+BILLING_REMINDER_CHUNK_SIZE = env.int('BILLING_REMINDER_CHUNK_SIZE', default=1000)
+BILLING_EXPORT_CHUNK_SIZE = env.int('BILLING_EXPORT_CHUNK_SIZE', default=2000)
+BILLING_ROLLUP_OVERLAP = 5 * 60  # seconds re-scanned before the rollup watermark
+BILLING_ROLLUP_LOCK_TTL = 15 * 60  # seconds a refresh may hold the rollup lock
+BILLING_ORDER_ID_GENERATOR = 'apps.billing.payments.utils.MonotonicOrderIdGenerator'
+BILLING_IDEMPOTENCY_TTL = env.int('BILLING_IDEMPOTENCY_TTL', default=60 * 60)
+BILLING_IDEMPOTENCY_LOCK_TTL = 60  # seconds an in-flight request holds its key
+BILLING_IDEMPOTENCY_WAIT_TIMEOUT = 10  # seconds a duplicate waits for the original
 TRANSACTION_COMMISSION_ENABLED = False
 
+# Appointment availability (local time; weekday() numbers, Saturday to Thursday)
+APPOINTMENT_WORKING_WEEKDAYS = (5, 6, 0, 1, 2, 3)
+APPOINTMENT_DAY_START = env('APPOINTMENT_DAY_START', default='09:00')
+APPOINTMENT_DAY_END = env('APPOINTMENT_DAY_END', default='17:00')
+APPOINTMENT_SLOT_MINUTES = env.int('APPOINTMENT_SLOT_MINUTES', default=30)
+APPOINTMENT_AVAILABILITY_HORIZON_DAYS = 30
+APPOINTMENT_AVAILABILITY_CACHE_ALIAS = 'default'
+APPOINTMENT_AVAILABILITY_CACHE_TTL = env.int('APPOINTMENT_AVAILABILITY_CACHE_TTL', default=60 * 60)
+APPOINTMENT_OUTBOX_BATCH_SIZE = env.int('APPOINTMENT_OUTBOX_BATCH_SIZE', default=200)
+APPOINTMENT_OUTBOX_MAX_ATTEMPTS = 5
+APPOINTMENT_OUTBOX_RETRY_DELAY = env.int('APPOINTMENT_OUTBOX_RETRY_DELAY', default=60)
+APPOINTMENT_EXPIRY_CHUNK_SIZE = env.int('APPOINTMENT_EXPIRY_CHUNK_SIZE', default=1000)
+APPOINTMENT_EXPIRY_MAX_SECONDS = 60
+APPOINTMENT_EXPIRY_CACHE_ALIAS = 'default'
+
 # Zibal Payment Gateway Configuration
 ZIBAL_MERCHANT_ID = env('ZIBAL_MERCHANT_ID', default='zibal')
 ZIBAL_GATEWAY_BASE = env('ZIBAL_GATEWAY_BASE', default='https://gateway.zibal.ir')
@@ -211,3 +242,33 @@ ZIBAL_API_BASE = env('ZIBAL_API_BASE', default='https://gateway.zibal.ir')
 ZIBAL_TIMEOUT = env.int('ZIBAL_TIMEOUT', default=10)
 ZIBAL_SANDBOX = env.bool('ZIBAL_SANDBOX', default=True)
 ZIBAL_CALLBACK_BASE = env('ZIBAL_CALLBACK_BASE', default='http://localhost:3000')
+ZIBAL_POOL_MAXSIZE = env.int('ZIBAL_POOL_MAXSIZE', default=20)
+ZIBAL_POOL_BLOCK = env.bool('ZIBAL_POOL_BLOCK', default=True)
+ZIBAL_KEEPALIVE_EXPIRY = env.float('ZIBAL_KEEPALIVE_EXPIRY', default=30.0)
+ZIBAL_CALLBACK_LOCK_TTL = env.int('ZIBAL_CALLBACK_LOCK_TTL', default=60)
+ZIBAL_CALLBACK_WAIT_TIMEOUT = env.int('ZIBAL_CALLBACK_WAIT_TIMEOUT', default=10)
+ZIBAL_RESULT_CACHE_ALIAS = 'default'
+ZIBAL_RESULT_CACHE_FINAL_TTL = env.int('ZIBAL_RESULT_CACHE_FINAL_TTL', default=24 * 60 * 60)
+ZIBAL_RESULT_CACHE_PENDING_TTL = env.int('ZIBAL_RESULT_CACHE_PENDING_TTL', default=30)
+
+# Gateway circuit breaker, adaptive timeouts and retry budget (shared through the cache)
+ZIBAL_RESILIENCE_CACHE_ALIAS = 'default'
+ZIBAL_BREAKER_FAILURE_THRESHOLD = env.int('ZIBAL_BREAKER_FAILURE_THRESHOLD', default=5)
+ZIBAL_BREAKER_WINDOW = env.int('ZIBAL_BREAKER_WINDOW', default=30)  # seconds
+ZIBAL_BREAKER_RECOVERY_TIMEOUT = env.int('ZIBAL_BREAKER_RECOVERY_TIMEOUT', default=30)  # seconds
+ZIBAL_ADAPTIVE_TIMEOUT_MIN = env.float('ZIBAL_ADAPTIVE_TIMEOUT_MIN', default=2.0)
+ZIBAL_ADAPTIVE_TIMEOUT_PERCENTILE = 0.99
+ZIBAL_ADAPTIVE_TIMEOUT_MULTIPLIER = 2.0
+ZIBAL_RETRY_MAX_ATTEMPTS = env.int('ZIBAL_RETRY_MAX_ATTEMPTS', default=3)
+ZIBAL_RETRY_BUDGET_RATIO = env.float('ZIBAL_RETRY_BUDGET_RATIO', default=0.2)
+ZIBAL_RETRY_BUDGET_MIN = env.int('ZIBAL_RETRY_BUDGET_MIN', default=10)
+ZIBAL_RETRY_BUDGET_WINDOW = env.int('ZIBAL_RETRY_BUDGET_WINDOW', default=60)  # seconds
+
+# Zibal reconciliation
+ZIBAL_RECONCILE_WORKERS = env.int('ZIBAL_RECONCILE_WORKERS', default=8)
+ZIBAL_RECONCILE_BATCH_SIZE = env.int('ZIBAL_RECONCILE_BATCH_SIZE', default=100)
+ZIBAL_RECONCILE_MAX_PER_RUN = env.int('ZIBAL_RECONCILE_MAX_PER_RUN', default=5000)
+ZIBAL_RECONCILE_FIRST_CHECK = 5 * 60  # seconds after registration
+ZIBAL_RECONCILE_BASE_BACKOFF = 2 * 60  # seconds, doubled per inconclusive check
+ZIBAL_RECONCILE_MAX_BACKOFF = 6 * 60 * 60  # seconds
+ZIBAL_RECONCILE_ADMIT_LAG = 15 * 60  # seconds before the high-water mark passes a row